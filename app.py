@@ -1,62 +1,39 @@
+import json
+import os
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import pyxirr
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 import traceback
 import sys
 
-# --- Utility Functions ---
-cooloff_period = datetime(1970, 1, 1, 0, 0)
-def perform_buy(date, portfolio, allocation, price, buy_type, maintenance_fee, initial_capital, trade_history):
-    units = int(allocation / price)
-    if units >= 1:
-        portfolio['units'] += units
-        buy_amt = units * price
-        portfolio['cash'] -= buy_amt
-        portfolio['last_buy_price'] = price
-        
-        cash_rounded = int(portfolio['cash'])
-        cash_pct = int(100 * portfolio['cash'] / (price * portfolio['units'] + portfolio['cash'])) if (price * portfolio['units'] + portfolio['cash']) != 0 else 0
-        cash_pos = f"{cash_rounded} ( {cash_pct}% )"
-        
-        trade_history.append((date, 'Buy', buy_type, units, price, cash_pos))
-        
-        # Maintenance fee
-        fee = (buy_amt * maintenance_fee) / 100
-        portfolio['cash'] -= fee
-        cash_rounded = int(portfolio['cash'])
-        cash_pct = int(100 * portfolio['cash'] / (price * portfolio['units'] + portfolio['cash'])) if (price * portfolio['units'] + portfolio['cash']) != 0 else 0
-        cash_pos = f"{cash_rounded} ( {cash_pct}% )"
-        trade_history.append((date, 'Maintenance', 'Fees', 1, fee, cash_pos))
-        
-    return portfolio, trade_history
-
-def perform_sell(date, portfolio, sell_pct, price, trade_history, sell_type='Profit_Taking'):
-    global cooloff_period
-    if date < cooloff_period:
-        return portfolio, trade_history
-    cooloff_period =  date + timedelta(days=5) #Don't allow sale till next 5 days.
-    
-    units_to_sell = int(portfolio['units'] * sell_pct)
-    if units_to_sell >= 1:
-        portfolio['units'] -= units_to_sell
-        sell_amt = units_to_sell * price
-        portfolio['cash'] += sell_amt
-        
-        cash_rounded = int(portfolio['cash'])
-        cash_pct = int(100 * portfolio['cash'] / (price * portfolio['units'] + portfolio['cash'])) if (price * portfolio['units'] + portfolio['cash']) != 0 else 0
-        cash_pos = f"{cash_rounded} ( {cash_pct}% )"
-        
-        trade_history.append((date, 'Sell', sell_type, units_to_sell, price, cash_pos))
-        
-    return portfolio, trade_history
-
-
+import cache
+from charts import DEFAULT_BUDGET, equity_figure, lines_figure, payload_bytes, price_figure
+from checkpoints import CheckpointStore
+from engine import DEFAULT_PARAMS, close_position, run_backtest, summarize
+from export import Exporter, equity_table, ledger_table, scan_status_table, scan_table
+from indicators import store as indicator_store
+from portfolio import POOL, aligned_indicators, ledger_frame, run_portfolio, summarize_portfolio
+from price_store import PriceStore
+from returns import returns_table
+from rules import compile_rules
+from scheduler import (LOOKBACK_DAYS, MARKET_TZ, TodayStore, is_stale, scan_key, scan_symbols, stale_symbols,
+                       universe_capital)
+from profiling import Profiler
+from sweep import param_grid, parse_range, run_sweep
+from stress import METHODS as STRESS_METHODS, bands, run_stress
+from tickers import ticker_options
+from walkforward import distribution, walk_forward
+
+# Local OHLCV store; only bars missing from disk are fetched from Yahoo
+price_store = PriceStore(os.environ.get("PRICE_STORE_DIR", ".price_store"))
+# Per-ticker TradeToday state, so a scan only steps the bars since the last one
+checkpoints = CheckpointStore(os.path.join(price_store.root, "checkpoints"))
+# Latest TradeToday entry per ticker, written by scheduler.py or the refresh button
+today_store = TodayStore(os.path.join(price_store.root, "today"))
 
 # Set page config
 st.set_page_config(page_title="Learn python in 1 hour.", layout="wide")
@@ -71,122 +48,6 @@ Adjust the parameters below and click 'Run Analysis' to see the results.
 # Sidebar for parameters
 st.sidebar.header("Strategy Parameters")
 
-# Predefined tickers
-ticker_options = {
-  "Abbott India": {"symbol": "ABBOTINDIA.NS", "percent": 2},
-  "Adani Enterprises": {"symbol": "ADANIENT.NS", "percent": 0.60},
-  "Adani Ports & SEZ": {"symbol": "ADANIPORTS.NS", "percent": 0.57},
-  "Amber Enterprises India Limited": {"symbol": "AMBER.NS", "percent": 3.54},
-  "Angel One Limited": {"symbol": "ANGELONE.NS", "percent": 1.96},
-  "Apar Industries Limited": {"symbol": "APARINDS.NS", "percent": 3.21},
-  "Apollo Hospitals": {"symbol": "APOLLOHOSP.NS", "percent": 1.25},
-  "Ashok Leyland": {"symbol": "ASHOKLEY.NS", "percent": 2},
-  "Asian Paints": {"symbol": "ASIANPAINT.NS", "percent": 1.50},
-  "Axis Bank": {"symbol": "AXISBANK.NS", "percent": 2.25},
-  "Bajaj Auto": {"symbol": "BAJAJ-AUTO.NS", "percent": 1.30},
-  "Bajaj Finance": {"symbol": "BAJFINANCE.NS", "percent": 3.20},
-  "Bharat Dynamics Limited": {"symbol": "BDL.NS", "percent": 2.78},
-  "Bharat Electronics": {"symbol": "BEL.NS", "percent": 4.29},
-  "Bharti Airtel": {"symbol": "BHARTIARTL.NS", "percent": 4.61},
-  "CG Power and Industrial Solutions Limited": {"symbol": "CGPOWER.NS", "percent": 3.97},
-  "Cholamandalam Investment and Finance Company Ltd": {"symbol": "CHOLAFIN.NS", "percent": 3.29},
-  "Cipla": {"symbol": "CIPLA.NS", "percent": 1.30},
-  "Data Patterns": {"symbol": "DATAPATTNS.NS", "percent": 2},
-  "Deepak Fertilisers": {"symbol": "DEEPAKFERT.NS", "percent": 2},
-  "Dixon Technologies (India) Limited": {"symbol": "DIXON.NS", "percent": 2.32},
-  "Eicher Motors": {"symbol": "EICHERMOT.NS", "percent": 2.00},
-  "Godrej Industries": {"symbol": "GODREJIND.NS", "percent": 0.1},
-  "Grasim Industries": {"symbol": "GRASIM.NS", "percent": 1.30},
-  "Gravita": {"symbol": "GRAVITA.NS", "percent": 0.1},
-  "Gujarat Fluorochemicals Limited": {"symbol": "FLUOROCHEM.NS", "percent": 2.19},
-  "HCL Technologies": {"symbol": "HCLTECH.NS", "percent": 1.30},
-  "HDFC Bank": {"symbol": "HDFCBANK.NS", "percent": 13.07},
-  "HDFC Life Insurance": {"symbol": "HDFCLIFE.NS", "percent": 1.10},
-  "Hindustan Aeronautics Limited": {"symbol": "HAL.NS", "percent": 3.10},
-  "Hindustan Unilever": {"symbol": "HINDUNILVR.NS", "percent": 2.70},
-  "ICICI Bank": {"symbol": "ICICIBANK.NS", "percent": 9.00},
-  "Infosys": {"symbol": "INFY.NS", "percent": 4.78},
-  "Inox Wind Limited": {"symbol": "INOXWIND.NS", "percent": 2.35},
-  "ITC": {"symbol": "ITC.NS", "percent": 1.50},
-  "Jio Financial Services": {"symbol": "JIOFIN.NS", "percent": 1.50},
-  "K.P.R. Mill Limited": {"symbol": "KPRMILL.NS", "percent": 0.84},
-  "Kalyan Jewellers India Limited": {"symbol": "KALYANKJIL.NS", "percent": 1.64},
-  "Kaynes Technology India Limited": {"symbol": "KAYNES.NS", "percent": 2.52},
-  "Kirloskar Engines": {"symbol": "KIRLOSENG.NS", "percent": 0.1},
-  "Larsen & Toubro": {"symbol": "LT.NS", "percent": 2.00},
-  "Mahindra & Mahindra": {"symbol": "M&M.NS", "percent": 1.00},
-  "Maruti Suzuki India": {"symbol": "MARUTI.NS", "percent": 1.20},
-  "Max Healthcare": {"symbol": "MAXHEALTH.NS", "percent": 0.4},
-  "Motilal Oswal Midcap": {"symbol": "0P0001BAYU.BO", "percent": 100},
-  "Multi Commodity Exchange of India Limited": {"symbol": "MCX.NS", "percent": 3.45},
-  "Muthoot Finance Limited": {"symbol": "MUTHOOTFIN.NS", "percent": 2.38},
-  "Narayana Hrudayalaya": {"symbol": "NH.NS", "percent": 0.25},
-  "NBCC": {"symbol": "NBCC.NS", "percent": 0.15},
-  "Nestle India": {"symbol": "NESTLEIND.NS", "percent": 1.20},
-  "Neuland Labs": {"symbol": "NEULANDLAB.NS", "percent": 0.01},
-  "Nifty BeES": {"symbol": "^NSEI", "percent": 100},
-  "Nifty Midcap 100": {"symbol": "NIFTY_MIDCAP_100.NS", "percent": 1},
-  "Nifty50 Value 20": {"symbol": "NV20.NS", "percent": 1},
-  "Nifty Pharma": {"symbol": "^CNXPHARMA", "percent": 1},  
-  "NTPC": {"symbol": "NTPC.NS", "percent": 1.20},
-  "Onesource Specialty Pharma Limited": {"symbol": "ONESOURCE.NS", "percent": 2.99},
-  "ONGC": {"symbol": "ONGC.NS", "percent": 1.25},
-  "Parag Parikh Flexi Cap": {"symbol": "0P0000YWL0.BO", "percent": 100},
-  "PB Fintech Limited": {"symbol": "POLICYBZR.NS", "percent": 1.96},
-  "Power Grid Corporation": {"symbol": "POWERGRID.NS", "percent": 1.70},
-  "Premier Energies Limited": {"symbol": "PREMIER.NS", "percent": 2.78},
-  "Premier Explosives": {"symbol": "PREMEXPLN.NS", "percent": 1},
-  "Prestige Estates Projects Limited": {"symbol": "PRESTIGE.NS", "percent": 3.16},
-  "Reliance Industries": {"symbol": "RELIANCE.NS", "percent": 8.39},
-  "Religare Enterprises Limited": {"symbol": "RELIGARE.NS", "percent": 2.10},
-  "Samvardhana Motherson International Limited": {"symbol": "MOTHERSON.NS", "percent": 3.23},
-  "Siemens Energy India Limited": {"symbol": "ENRIN.NS", "percent": 3.71},
-  "Solar Industries": {"symbol": "SOLARINDS.NS", "percent": 1},
-  "State Bank of India": {"symbol": "SBIN.NS", "percent": 2.80},
-  "Sun Pharma": {"symbol": "SUNPHARMA.NS", "percent": 1.80},
-  "Suzlon Energy Limited": {"symbol": "SUZLON.NS", "percent": 3.21},
-  "Tata Consultancy Services": {"symbol": "TCS.NS", "percent": 3.00},
-  "Tata Consumer Products": {"symbol": "TATACONSUM.NS", "percent": 1.20},
-  "Tata Midcap 150 mom 50": {"symbol": "0P0001PTTZ.BO", "percent": 1},
-  "Tata Motors": {"symbol": "TATAMOTORS.NS", "percent": 1.10},
-  "Tata Steel": {"symbol": "TATASTEEL.NS", "percent": 1.25},
-  "Tech Mahindra": {"symbol": "TECHM.NS", "percent": 1.10},
-  "Titan Company": {"symbol": "TITAN.NS", "percent": 1.20},
-  "Trent Limited": {"symbol": "TRENT.NS", "percent": 2.63},
-  "TVS Motor Company Limited": {"symbol": "TVSMOTOR.NS", "percent": 0.54},
-  "UltraTech Cement": {"symbol": "ULTRACEMCO.NS", "percent": 1.40},
-  "V2 Retail Limited": {"symbol": "V2RETAIL.NS", "percent": 2.08},
-  "Waaree Energies Limited": {"symbol": "WAAREEENER.NS", "percent": 4.23},
-  "Wipro": {"symbol": "WIPRO.NS", "percent": 1.50},
-  "Zen Technologies Limited": {"symbol": "ZENTEC.NS", "percent": 2.43},
-  "Coal India Limited": {"symbol": "COALINDIA.NS", "percent": 1},
-  "Kotak Mahindra Bank Limited": {"symbol": "KOTAKBANK.NS", "percent": 1},
-  "Dr. Reddy's Laboratories Limited": {"symbol": "DRREDDY.NS", "percent": 1},
-  "Zydus Lifesciences Limited": {"symbol": "ZYDUSLIFE.NS", "percent": 1},
-  "Indian Energy Exchange Limited": {"symbol": "IEX.NS", "percent": 1},
-  "Balkrishna Industries Limited": {"symbol": "BALKRISIND.NS", "percent": 1},
-  "EID Parry India Limited": {"symbol": "EIDPARRY.NS", "percent": 1},
-  "Central Depository Services (India)": {"symbol": "CDSL.NS", "percent": 1},
-  "ICRA Limited": {"symbol": "ICRA.NS", "percent": 1},
-  "Maharashtra Scooters Limited": {"symbol": "MAHSCOOTER.NS", "percent": 1},
-  "IPCA Laboratories Limited": {"symbol": "IPCALAB.NS", "percent": 1},
-  "Nesco Limited": {"symbol": "NESCO.NS", "percent": 1},
-  "Swaraj Engines Limited": {"symbol": "SWARAJENG.NS", "percent": 1},
-   "Solar Industries": {"symbol": "SOLARINDS.NS", "percent": 1},
-   "Mazagon Dock Shipbuilders": {"symbol": "MAZDOCK.NS", "percent": 1},
-   "Cochin Shipyard Limited": {"symbol": "COCHINSHIP.NS", "percent": 1},
-   "Astra Microwave": {"symbol": "ASTRAMICRO.NS", "percent": 1},
-   "BEML": {"symbol": "BEML.BO", "percent": 1},
-   "Garden Reach": {"symbol": "GRSE.BO", "percent": 1},
-   "MTAR": {"symbol": "MTARTECH.BO", "percent": 1},
-   "DYNAMTEC": {"symbol": "DYNAMATECH.NS", "percent": 1},
-    "Paras Defence and Space Technologies": {"symbol": "PARAS.BO", "percent": 1},
-    "Mishra Dhatu Nigam Limited": {"symbol": "MIDHANI.NS", "percent": 1},
-    "Cyient Dlm Ltd": {"symbol": "CYIENT.BO", "percent": 1},
-    "DCX India": {"symbol": "DCXINDIA.NS", "percent": 1},
-    "UNIMECH": {"symbol": "UNIMECH.BO", "percent": 1}
-}
-
 # Allow custom ticker input
 use_custom = st.sidebar.checkbox("Use custom ticker")
 if use_custom:
@@ -228,102 +89,285 @@ maintenance_fee = st.sidebar.number_input(
     step=.05,
     format="%.2f"
 )
+# A rules.py rule set (JSON file) in place of the built-in Strong / Moderate / Profit_Taking strategy
+rules_file = st.sidebar.text_input("Strategy rules file (JSON, blank: built-in)", value=os.environ.get("RULES_FILE", ""))
+strategy_rules = None
+if rules_file.strip():
+    try:
+        strategy_rules = compile_rules(rules_file.strip())
+    except (OSError, ValueError, KeyError) as e:
+        st.sidebar.error(f"Using the built-in strategy, the rules file did not load: {e}")
+rules_key = json.dumps(strategy_rules.spec, sort_keys=True) if strategy_rules else None
+# Portfolio, Walk-forward and Stress Test step the built-in strategy in NumPy lanes and cannot run a rule set
+builtin_only = {'disabled': strategy_rules is not None,
+                'help': "Runs the built-in strategy only: clear the rules file to use it" if strategy_rules else None}
+if strategy_rules:
+    st.sidebar.caption("Rules file loaded: TradeToday, Run Analysis and Sweep use it; Portfolio, Walk-forward "
+                       "and Stress Test are off")
+# One Interest row per month in the trade history instead of one per accrual
+monthly_interest = st.sidebar.checkbox("Summarise interest by month")
+# Stage timings always go to the Diagnostics panel; memory tracing and cProfile slow runs down a little
+trace_memory = st.sidebar.checkbox("Trace memory per stage", value=True)
+profile_hot_loop = st.sidebar.checkbox("Profile the simulation (cProfile)")
+# Full-precision tables for analytics jobs (see export.py), one folder per run
+export_dir = st.sidebar.text_input("Export results to folder (blank: off)", value=os.environ.get("EXPORT_DIR", ""))
+# Charts send at most this many points per line for the visible window (see charts.py)
+chart_budget = st.sidebar.number_input("Chart points per line", min_value=200, max_value=10000, value=DEFAULT_BUDGET, step=100)
 initial_price = 0.0
 
-# 📊 TradeToday - Today's Trades Summary
-st.sidebar.subheader("Today's Trades")
 
-if st.sidebar.button("📊 TradeToday"):
-    today_trades = []
+def open_exporter(run_name):
+    """An Exporter in a fresh folder under export_dir for this run, or None when export is off."""
+    if not export_dir.strip():
+        return None
+    return Exporter(os.path.join(export_dir.strip(), f"{run_name}-{datetime.now():%Y%m%d-%H%M%S}"))
 
-    # Loop through all predefined tickers
-    for fund_name, fund_info in ticker_options.items():
-        ticker_symbol = fund_info["symbol"]
-        initial_capital = total_capital * fund_info.get("percent", 100)/100
+# 📊 TradeToday - Today's Trades Summary, precomputed by scheduler.py and refreshed on demand
+st.sidebar.subheader("Today's Trades")
+today_params = dict(profit_threshold=profit_threshold, sell_pct=sell_pct, drop_threshold=drop_threshold,
+                    strong_buy_allocation=strong_buy_allocation, moderate_buy_allocation=moderate_buy_allocation,
+                    maintenance_fee=maintenance_fee)
+today_capitals = universe_capital(total_capital)
+show_today = st.sidebar.button("📊 TradeToday")
+refresh_today = st.sidebar.button("🔄 Refresh stale symbols")
+
+if show_today or refresh_today:
+    profiler = Profiler("TradeToday", memory=trace_memory, profile=["scan"] if profile_hot_loop else ())
+    now = datetime.now(MARKET_TZ)
+    if refresh_today:
+        # Same strategy as Run Analysis, without interest, allocation capping or the final exit,
+        # continued from each ticker's checkpoint; only symbols whose stored entry is stale. The
+        # fetch, pre-screen and every ticker are stages of their own inside the scan.
+        with profiler.stage("scan"):
+            stale = stale_symbols(today_store, today_capitals, today_params, start_date_input, end_date_input, now,
+                                  rules=strategy_rules)
+            rescanned = scan_symbols(price_store, checkpoints, today_store, {s: today_capitals[s] for s in stale},
+                                     today_params, start_date_input, end_date_input, now, rules=strategy_rules,
+                                     stage=profiler.stage) if stale else {}
+        st.caption(f"Rescanned {len(stale)} stale symbols; the pre-screen ruled "
+                   f"{sum(entry['pruned'] for entry in rescanned.values())} of them out of buying without a full simulation")
+
+    with profiler.stage("load"):
+        entries = {symbol: today_store.read(symbol) for symbol in today_capitals}
+        current = {symbol: entry for symbol, entry in entries.items()
+                   if entry is not None and entry['key'] == scan_key(today_capitals[symbol], today_params, start_date_input,
+                                                                     end_date_input, strategy_rules)}
+        stale_count = sum(is_stale(entry, entry['key'], now) for entry in current.values())
+
+    with profiler.stage("render"):
+        if not current:
+            st.info(f"No precomputed scan for these settings and {start_date_input} to {end_date_input} yet: run "
+                    f"scheduler.py (today's, from {LOOKBACK_DAYS} days back) or click 🔄 Refresh stale symbols.")
+        else:
+            stamps = sorted(entry['scanned_at'] for entry in current.values())
+            st.caption(f"Precomputed at {pd.Timestamp(stamps[-1]):%Y-%m-%d %H:%M %Z} (oldest {pd.Timestamp(stamps[0]):%Y-%m-%d %H:%M}); "
+                       f"{stale_count} stale, {len(today_capitals) - len(current)} not scanned for these settings")
+            today_trades = [{"Stock": symbol.replace(".NS", ""), "Date": pd.Timestamp(t[0]), "Action": t[1], "Type": t[2],
+                             "Units": t[3], "Price": t[4], "Cash Position": t[5]}
+                            for symbol, entry in current.items() for t in entry['buys']]
+            if today_trades:
+                st.subheader("📋 Today's Trades Summary")
+                st.dataframe(pd.DataFrame(today_trades), use_container_width=True)
+            else:
+                st.info("✅ No trades triggered today.")
+            tickers_df = pd.DataFrame([{
+                "Stock": symbol, "Capital": entry['capital'], "As of": entry['as_of'],
+                "Last Close": (entry['last'] or {}).get('Close'), "Dma 50": (entry['last'] or {}).get('50DMA'),
+                "Dma 200": (entry['last'] or {}).get('200DMA'), "Scanned": pd.Timestamp(entry['scanned_at']).strftime('%Y-%m-%d %H:%M'),
+                "Pruned": entry.get('pruned', False), "Error": entry['error']} for symbol, entry in current.items()])
+            with st.expander(f"Tickers ({len(current)})"):
+                st.dataframe(tickers_df, use_container_width=True)
+            exporter = open_exporter("trade-today")
+            if exporter:
+                with profiler.stage("export"):
+                    for symbol, entry in current.items():
+                        exporter.write("today", scan_table(entry, symbol=symbol))
+                    exporter.write("tickers", scan_status_table(current))
+                    exporter.close()
+                st.caption(f"Exported to {exporter.root}")
+    profiler.close()
+    st.session_state["diagnostics"] = profiler.report()
+
+# 📦 Whole Portfolio - every ticker on one calendar, sharing total capital as one cash pool
+st.sidebar.subheader("Whole Portfolio")
+
+if st.sidebar.button("📦 Run Portfolio", **builtin_only):
+    profiler = Profiler("Run Portfolio", memory=trace_memory, profile=["simulation"] if profile_hot_loop else ())
+    end_date = (end_date_input + timedelta(days=1)).strftime("%Y-%m-%d")
+    start_date = start_date_input
+    start_date_moving = (start_date - timedelta(days=365)).strftime("%Y-%m-%d")
+    percents = {info["symbol"]: info.get("percent", 100) for info in ticker_options.values()}
+
+    with profiler.stage("fetch"):
+        frames, fetch_errors = price_store.load_many(list(percents), start_date_moving, end_date)
+    with profiler.stage("indicators"):
+        aligned = aligned_indicators(frames)
+    if fetch_errors:
+        st.info(f"Skipped {len(fetch_errors)} tickers that failed to download: {', '.join(fetch_errors)}")
+
+    if not aligned['symbols']:
+        st.error("Insufficient data after calculating moving averages")
+    else:
+        # Buys are sized from each ticker's share of total capital, as in Run Analysis
+        budgets = [total_capital * percents[symbol] / 100 for symbol in aligned['symbols']]
+        with profiler.stage("simulation"):
+            portfolio_result = run_portfolio(
+                aligned, budgets, total_capital, profit_threshold, sell_pct, drop_threshold, strong_buy_allocation,
+                moderate_buy_allocation, maintenance_fee, start_date=start_date, interest_rate_pct=interest_rate_pct,
+                interest_period='M' if monthly_interest else None)
+        with profiler.stage("xirr"):
+            portfolio_summary = summarize_portfolio(portfolio_result, total_capital, budgets, start_date, end_date)
+        exporter = open_exporter("portfolio")
+        if exporter:
+            with profiler.stage("export"):
+                exporter.write("ledger", ledger_table(portfolio_result['interest'], symbol=POOL))
+                for symbol, symbol_ledger in portfolio_result['ledgers'].items():
+                    exporter.write("ledger", ledger_table(symbol_ledger, symbol=symbol))
+                exporter.write("equity", pd.DataFrame({'date': portfolio_result['dates'], 'value': portfolio_result['value']}))
+                exporter.write("summary", pd.DataFrame([portfolio_summary]))
+                exporter.close()
+            st.caption(f"Exported to {exporter.root}")
+
+        with profiler.stage("render"):
+            st.subheader(f"📦 Whole Portfolio ({len(aligned['symbols'])} tickers, one cash pool)")
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Total Profit", f"₹{portfolio_summary['profit']:.0f}", f"{portfolio_summary['return_pct']:.2f}%")
+            col2.metric("CAGR (Annualized)", f"{portfolio_summary['cagr_pct']:.2f}%")
+            col3.metric("Total Trades", portfolio_summary['trades'])
+            col4.metric("Buy & Hold (Annualized)", f"{portfolio_summary['buy_hold_cagr_pct']:.2f}%")
+
+            st.plotly_chart(lines_figure(portfolio_result['dates'], {'Portfolio value': portfolio_result['value']}, chart_budget),
+                            use_container_width=True)
+
+            portfolio_df = ledger_frame(portfolio_result).sort_values(by="Date", ascending=False, kind="stable")
+            portfolio_df['Value'] = (portfolio_df['Units'].astype(float) * portfolio_df['Price'].astype(float)).round(0)
+            portfolio_df['Price'] = portfolio_df['Price'].astype(float).round(1)
+            portfolio_df['Date'] = portfolio_df['Date'].dt.strftime('%Y-%m-%d')
+            st.dataframe(portfolio_df, use_container_width=True)
+    profiler.close()
+    st.session_state["diagnostics"] = profiler.report()
+
+# 🔍 Parameter Sweep - every combination of the ranges below, ranked by CAGR
+st.sidebar.subheader("Parameter Sweep")
+with st.sidebar.expander("Ranges (value, a,b,c or start:stop:step)"):
+    sweep_ranges = {
+        'profit_threshold': st.text_input("Profit threshold (%)", value="25:100:25"),
+        'sell_pct': st.text_input("Sell percentage (%)", value="1,5"),
+        'drop_threshold': st.text_input("Peak Drop (%)", value="10,15,20"),
+        'strong_buy_allocation': st.text_input("Strong Buy allocation (%)", value="15"),
+        'moderate_buy_allocation': st.text_input("Moderate Buy allocation (%)", value="1"),
+    }
+
+if st.sidebar.button("🔍 Run Sweep"):
+    end_date = (end_date_input + timedelta(days=1)).strftime("%Y-%m-%d")
+    start_date = start_date_input
+    start_date_moving = (start_date - timedelta(days=365)).strftime("%Y-%m-%d")
+    initial_capital = total_capital
+    if not use_custom:
+        initial_capital = round(total_capital * ticker_options[selected_fund]["percent"] / 100)
 
-        # Fetch yahoo finance data
-        end_date = (end_date_input + timedelta(days=1)).strftime("%Y-%m-%d")
-        start_date = start_date_input
-        start_date_moving = (start_date - timedelta(days=365)).strftime("%Y-%m-%d") # For calculation of 180 days back..
-        df = yf.download(ticker_symbol, start=start_date_moving, end=end_date, progress=False)
-        if df.empty:
-            st.info(f"✅ Yahoo Finance download failed. : {ticker_symbol} df is empty.")
-            continue
+    try:
+        # The sidebar takes percents; the engine takes fractions for everything but the profit threshold
+        ranges = {knob: [v if knob == 'profit_threshold' else v / 100 for v in parse_range(text)]
+                  for knob, text in sweep_ranges.items()}
+        grid = param_grid(ranges, {**DEFAULT_PARAMS, 'maintenance_fee': maintenance_fee, 'interest_rate_pct': interest_rate_pct})
+        data = cache.prices.get_or_compute((ticker, start_date_moving, end_date),
+                                           lambda: price_store.load(ticker, start_date_moving, end_date))
+        if data.empty:
+            st.error(f"No data found for ticker {ticker}")
+        else:
+            with st.spinner(f"Running {len(grid)} parameter sets for {ticker}..."):
+                sweep_table = run_sweep(indicator_store.window(ticker, data, start_date_moving, end_date),
+                                        initial_capital, grid, start_date, end_date, rules=strategy_rules)
+            st.subheader(f"🔍 Parameter Sweep: {ticker}")
+            st.dataframe(sweep_table, use_container_width=True)
+    except ValueError as e:
+        st.error(f"Invalid sweep range: {e}")
+    except Exception as e:
+        filename, line_number, function_name, text = traceback.extract_tb(sys.exc_info()[2])[-1]
+        st.error(f"An error occurred: {e}")
+        st.error(f"Location: File '{filename}', line {line_number}, in {function_name}")
+        st.error(f"Code: {text}")
 
-        # Calculate moving averages
-        df['30DMA'] = df['Close'].rolling(window=30).mean()
-        df['50DMA'] = df['Close'].rolling(window=50).mean()
-        df['200DMA'] = df['Close'].rolling(window=200).mean()
-        df = df.dropna()
-        if df.empty:
-            continue
+# 🚶 Walk-forward - the strategy from every Nth trading day between Start Date and the last start, to End Date
+st.sidebar.subheader("Walk-forward")
+walk_last_start = st.sidebar.date_input("Last start date", value=end_date_input - timedelta(days=365),
+                                        min_value=min_date, max_value=max_date)
+walk_every = st.sidebar.number_input("Every N trading days", min_value=1, max_value=250, value=5, step=1)
 
-        # Initialize portfolio
-        portfolio = {'cash': initial_capital, 'units': 0, 'last_buy_price': None, 'history': []}
-        trade_history = []
-
-        # Apply strategy logic (same as your Run Analysis loop)
-        peak_price = -1
-        muhurth = 1
-        dates = df.index.to_numpy()
-        close_prices = df['Close'].values
-        dma30_values = df['30DMA'].values
-        dma50_values = df['50DMA'].values
-        dma200_values = df['200DMA'].values
-        
-        st.info(f"✅ Checking for ticker : {ticker_symbol}, Capital:{initial_capital}, Last Trade: {close_prices[-1]},  Dma 50: {dma50_values[-1]}, Dma 200: {dma200_values[-1]}")
-        
-        for i in range(len(dates)):
-            date = pd.Timestamp(dates[i])
-            price = close_prices[i]
-            dma30 = dma30_values[i]
-            dma50 = dma50_values[i]
-            dma200 = dma200_values[i]
-
-            if peak_price < price:
-                peak_price = price
-
-            if muhurth:
-                muhurth = 0
-                portfolio, trade_history = perform_buy(date, portfolio, price, price, 'Muhurut', maintenance_fee, initial_capital, trade_history)
-
-            # Buy / Sell logic
-            if dma200 > dma50 > price and portfolio['cash'] > 0 and price <= peak_price * (1 - drop_threshold):
-                allocation = initial_capital * strong_buy_allocation
-                portfolio, trade_history = perform_buy(date, portfolio, allocation, price, 'Strong', maintenance_fee, initial_capital, trade_history)
-            elif dma50 > dma30 > price and portfolio['cash'] > 0 and price <= peak_price * (1 - drop_threshold):
-                allocation = initial_capital * moderate_buy_allocation
-                portfolio, trade_history = perform_buy(date, portfolio, allocation, price, 'Moderate', maintenance_fee, initial_capital, trade_history)
-            elif portfolio['units'] > 0 and portfolio['last_buy_price'] is not None and price > dma50 > dma200:
-                pct_change = (price - portfolio['last_buy_price']) / portfolio['last_buy_price'] * 100
-                if pct_change >= profit_threshold:
-                    portfolio, trade_history = perform_sell(date, portfolio, sell_pct, price, trade_history)
-
-        # Filter only today's trades
-        if trade_history:
-            latest_date = max(t[0] for t in trade_history)
-            cutoff_date = pd.Timestamp(end_date_input) - pd.Timedelta(days=7)
-        
-            recent_trades = [t for t in trade_history if t[0] > cutoff_date and t[1] == "Buy"]
-        
-            for t in recent_trades:
-                today_trades.append({
-                    "Stock": ticker_symbol.replace(".NS", ""),
-                    "Date": t[0],
-                    "Action": t[1],
-                    "Type": t[2],
-                    "Units": t[3],
-                    "Price": t[4],
-                    "Cash Position": t[5]
-                })
-
-    # Display summary table
-    if today_trades:
-        summary_df = pd.DataFrame(today_trades)
-        st.subheader("📋 Today's Trades Summary")
-        st.dataframe(summary_df, use_container_width=True)
+if st.sidebar.button("🚶 Run Walk-forward", **builtin_only):
+    end_date = (end_date_input + timedelta(days=1)).strftime("%Y-%m-%d")
+    start_date = start_date_input
+    start_date_moving = (start_date - timedelta(days=365)).strftime("%Y-%m-%d")
+    initial_capital = total_capital
+    if not use_custom:
+        initial_capital = round(total_capital * ticker_options[selected_fund]["percent"] / 100)
+
+    data = cache.prices.get_or_compute((ticker, start_date_moving, end_date),
+                                       lambda: price_store.load(ticker, start_date_moving, end_date))
+    if data.empty:
+        st.error(f"No data found for ticker {ticker}")
+    elif walk_last_start < start_date:
+        st.error("The last start date is before the Start Date")
+    else:
+        params = {'profit_threshold': profit_threshold, 'sell_pct': sell_pct, 'drop_threshold': drop_threshold,
+                  'strong_buy_allocation': strong_buy_allocation, 'moderate_buy_allocation': moderate_buy_allocation,
+                  'maintenance_fee': maintenance_fee, 'interest_rate_pct': interest_rate_pct}
+        with st.spinner(f"Backtesting {ticker} from every {walk_every} trading days..."):
+            walk_table = walk_forward(indicator_store.window(ticker, data, start_date_moving, end_date), initial_capital,
+                                      params, start_date, walk_last_start, end_date, every=walk_every)
+        st.subheader(f"🚶 Walk-forward: {ticker} ({len(walk_table)} start dates)")
+        if walk_table.empty:
+            st.info("No trading days between the Start Date and the last start date")
+        else:
+            st.dataframe(distribution(walk_table).round(2), use_container_width=True)
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=walk_table['start_date'], y=walk_table['cagr_pct'], mode='lines', name='Strategy CAGR'))
+            fig.add_trace(go.Scatter(x=walk_table['start_date'], y=walk_table['buy_hold_cagr_pct'], mode='lines', name='Buy & Hold CAGR'))
+            fig.update_layout(height=350, margin=dict(l=0, r=0, t=30, b=0), xaxis_title="Start date", yaxis_title="CAGR (%)")
+            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(px.histogram(walk_table, x='outperformance_pct', nbins=40, title="Outperformance by start date (%)"),
+                            use_container_width=True)
+            walk_df = walk_table.assign(start_date=walk_table['start_date'].dt.strftime('%Y-%m-%d'))
+            st.dataframe(walk_df, use_container_width=True)
+
+# 🎲 Stress Test - the strategy on resampled futures of the ticker's history from Start Date to End Date
+st.sidebar.subheader("Stress Test")
+stress_paths = st.sidebar.number_input("Price paths", min_value=100, max_value=20000, value=1000, step=100)
+stress_years = st.sidebar.number_input("Years per path", min_value=1, max_value=20, value=5, step=1)
+stress_method = st.sidebar.selectbox("Resampling", STRESS_METHODS,
+                                     format_func=lambda m: {'block': "Blocks of days", 'regime': "Above / below 200DMA runs"}[m])
+stress_block = st.sidebar.number_input("Block length (days)", min_value=1, max_value=250, value=20, step=1)
+
+if st.sidebar.button("🎲 Run Stress Test", **builtin_only):
+    end_date = (end_date_input + timedelta(days=1)).strftime("%Y-%m-%d")
+    start_date_moving = (start_date_input - timedelta(days=365)).strftime("%Y-%m-%d")
+    initial_capital = total_capital
+    if not use_custom:
+        initial_capital = round(total_capital * ticker_options[selected_fund]["percent"] / 100)
+
+    data = cache.prices.get_or_compute((ticker, start_date_moving, end_date),
+                                       lambda: price_store.load(ticker, start_date_moving, end_date))
+    if data.empty:
+        st.error(f"No data found for ticker {ticker}")
     else:
-        st.info("✅ No trades triggered today.")
+        params = {'profit_threshold': profit_threshold, 'sell_pct': sell_pct, 'drop_threshold': drop_threshold,
+                  'strong_buy_allocation': strong_buy_allocation, 'moderate_buy_allocation': moderate_buy_allocation,
+                  'maintenance_fee': maintenance_fee, 'interest_rate_pct': interest_rate_pct}
+        try:
+            with st.spinner(f"Running {stress_paths} paths of {stress_years} years for {ticker}..."):
+                stress_table = run_stress(data, initial_capital, params, stress_paths, stress_years, stress_method,
+                                          stress_block)
+        except ValueError as e:
+            st.error(f"Stress test not possible: {e}")
+        else:
+            st.subheader(f"🎲 Stress Test: {ticker} ({len(stress_table)} paths of {stress_years} years)")
+            st.dataframe(bands(stress_table).round(2), use_container_width=True)
+            fig = go.Figure()
+            fig.add_trace(go.Histogram(x=stress_table['cagr_pct'], name='Strategy CAGR', opacity=0.6, nbinsx=60))
+            fig.add_trace(go.Histogram(x=stress_table['buy_hold_cagr_pct'], name='Buy & Hold CAGR', opacity=0.6, nbinsx=60))
+            fig.update_layout(barmode='overlay', height=350, margin=dict(l=0, r=0, t=30, b=0), xaxis_title="CAGR (%)")
+            st.plotly_chart(fig, use_container_width=True)
 
 # Run analysis button
 if st.sidebar.button("🚀 Run Analysis", type="primary"):
@@ -336,13 +380,17 @@ if st.sidebar.button("🚀 Run Analysis", type="primary"):
     # Progress bar
     progress_bar = st.progress(0)
     status_text = st.empty()
+    profiler = Profiler("Run Analysis", memory=trace_memory, profile=["simulation"] if profile_hot_loop else ())
     
     try:
         # Fetch data
         status_text.text("Downloading market data...")
         progress_bar.progress(10)
         
-        data = yf.download(ticker, start=start_date_moving, end=end_date, progress=False)
+        # Prices, indicators and results are memoized across reruns (see cache.py, indicators.py)
+        data_key = (ticker, start_date_moving, end_date)
+        with profiler.stage("fetch"):
+            data = cache.prices.get_or_compute(data_key, lambda: price_store.load(ticker, start_date_moving, end_date))
         
         if data.empty:
             st.error(f"No data found for ticker {ticker}")
@@ -352,14 +400,10 @@ if st.sidebar.button("🚀 Run Analysis", type="primary"):
         
         # Calculate moving averages
         status_text.text("Calculating moving averages...")
-        data['30DMA'] = data['Close'].rolling(window=30).mean()
-        data['50DMA'] = data['Close'].rolling(window=50).mean()
-        data['200DMA'] = data['Close'].rolling(window=200).mean()
-        
-        # Remove NaN values
-        data = data.dropna()
+        with profiler.stage("indicators"):
+            series = indicator_store.window(ticker, data, start_date_moving, end_date)
         
-        if data.empty:
+        if len(series['dates']) == 0:
             st.error("Insufficient data after calculating moving averages")
             st.stop()
             
@@ -370,261 +414,184 @@ if st.sidebar.button("🚀 Run Analysis", type="primary"):
         if not use_custom:
             initial_capital = round(total_capital * ticker_options[selected_fund]["percent"] / 100)
 
-        portfolio = {
-            'cash': initial_capital,
-            'units': 0,
-            'last_buy_price': None,
-            'history': []
-        }
-        
         # Apply trading rules
         status_text.text(f"Applying trading strategy...for {ticker} with initial amount {initial_capital}")
         progress_bar.progress(70)
         
-        # Lists to store history data with cash position
-        trade_history_with_cash = []
-        
         # Convert to arrays
-        dates = data.index.to_numpy()
-        close_prices = data['Close'].values
-        dma30_values = data['30DMA'].values
-        dma50_values = data['50DMA'].values
-        dma200_values = data['200DMA'].values
-
+        dates = series['dates']
+        close_prices = series['Close']
         final_price = close_prices[-1]
-        last_date = -1
-        initial_price = -1
-        initial_date = dates[0]
-        peak_price = -1
-        muhurth = 1;
-
-        for i in range(len(dates)):
-            date_str = dates[i]
-            if peak_price < close_prices[i]:
-                peak_price = close_prices[i]
-            
-            #Skip past dates.
-            date = pd.Timestamp(date_str)
-            if date < pd.Timestamp(start_date):
-                continue
-
-            if muhurth:
-                muhurth = 0
-                initial_price = close_prices[i]
-                initial_date = dates[i]
-                if initial_price == -1:
-                    initial_price = close_prices[0]
-                portfolio, trade_history_with_cash = perform_buy(date, portfolio, initial_price, initial_price, 
-                                                                 'Muhurut', maintenance_fee, initial_capital, trade_history_with_cash)
-            
-            price = close_prices[i]
-            dma30 = dma30_values[i]
-            dma50 = dma50_values[i]
-            dma200 = dma200_values[i]
-
-            days = 0
-            if last_date == -1:
-                last_date = date
-            else :
-                days = (date - last_date).days
-                last_date = date
-                
-            if days > 0 :
-                interest_income = portfolio['cash'] * daily_interest_rate * days
-                if interest_income > 1 : 
-                    portfolio['cash'] += interest_income
-                    interest_rate = f"{interest_rate_pct}%"
-                    cash_rounded = int(portfolio['cash'])
-                    cash_pct = int(100 * portfolio['cash'] / (price * portfolio['units'] + portfolio['cash']) )
-                    cash_pos = f"{cash_rounded} ( {cash_pct}% )"
-                    trade_history_with_cash.append((date, 'Interest', interest_rate, days, (portfolio['cash'] * daily_interest_rate) , cash_pos))
-            
-            if dma200 > dma50 > price and portfolio['cash'] > 0 and price <= peak_price * (1 - drop_threshold):
-                allocation = initial_capital * strong_buy_allocation
-                if portfolio['cash'] < (1 + (maintenance_fee / 100)) * allocation:
-                    allocation = (1 - (maintenance_fee / 100)) * portfolio['cash']
-                portfolio, trade_history_with_cash = perform_buy(date, portfolio, allocation, price, 'Strong', maintenance_fee, initial_capital, trade_history_with_cash)
-
-            # Moderate Buy
-            elif dma50 > dma30 > price and portfolio['cash'] > 0 and price <= peak_price * (1 - drop_threshold):
-                allocation = initial_capital * moderate_buy_allocation
-                if portfolio['cash'] < (1 + (maintenance_fee / 100)) * allocation:
-                    allocation = (1 - (maintenance_fee / 100)) * portfolio['cash']
-                portfolio, trade_history_with_cash = perform_buy(date, portfolio, allocation, price, 'Moderate', maintenance_fee, initial_capital, trade_history_with_cash)
-
-            # Sell
-            elif (portfolio['units'] > 0 and portfolio['last_buy_price'] is not None and price > dma50 > dma200):
-                pct_change = (price - portfolio['last_buy_price']) / portfolio['last_buy_price'] * 100
-                if pct_change >= profit_threshold:
-                    portfolio, trade_history_with_cash = perform_sell(date, portfolio, sell_pct, price, trade_history_with_cash)
 
-        
-        # Close remaining positions
-        final_cash_rounded = 0.001
-        if portfolio['units'] > 0:
-            last_price = float(close_prices[-1])
-            portfolio['cash'] += portfolio['units'] * last_price
-            portfolio['units'] = 0.0
-            cash_rounded = int(portfolio['cash'])
-            cash_pct = int(100 * portfolio['cash'] / (price * portfolio['units'] + portfolio['cash']) )
-            cash_pos = f"{cash_rounded} ( {cash_pct}% )"
-            trade_history_with_cash.append((pd.Timestamp(dates[-1]), 'Sell',  'Final_Exit', portfolio['units'], last_price, cash_pos ))
-            portfolio['units'] = 0
+        interest_period = 'M' if monthly_interest else None
+        result_key = data_key + (str(start_date), initial_capital, profit_threshold, sell_pct, drop_threshold,
+                                 strong_buy_allocation, moderate_buy_allocation, maintenance_fee, interest_rate_pct,
+                                 interest_period, rules_key)
+
+        def simulate():
+            # The final exit is run as a stage of its own, so it shows up separately in Diagnostics
+            with profiler.stage("simulation"):
+                result = run_backtest(
+                    dates, close_prices, series['30DMA'], series['50DMA'], series['200DMA'],
+                    initial_capital, profit_threshold, sell_pct, drop_threshold, strong_buy_allocation,
+                    moderate_buy_allocation, maintenance_fee, start_date=start_date,
+                    interest_rate_pct=interest_rate_pct, close_out=False, interest_period=interest_period,
+                    rules=strategy_rules,
+                    indicators=strategy_rules.indicators(data['Close'], dates) if strategy_rules else None)
+            with profiler.stage("close_out"):
+                return close_position(result, dates[-1], final_price)
+
+        if profile_hot_loop:
+            # A cached result would leave nothing to profile
+            result = simulate()
+            cache.results.put(result_key, result)
+        else:
+            result = cache.results.get_or_compute(result_key, simulate)
+        portfolio = result['portfolio']
+        trade_history_with_cash = result['trade_history']
+        initial_price = result['initial_price']
+        initial_date = result['initial_date']
         
         progress_bar.progress(90)
         
-        # Calculate XIRR
+        # Calculate returns
         status_text.text("Calculating returns...")
-        cash_flows = []
-        cash_dates = []
-        total_trades_count = 0
-        
-        for h in trade_history_with_cash:
-            date, action, type, units, price = h[:5]
-            if action == 'Buy':
-                cash_flow = -units * price
-                cash_flows.append(cash_flow)
-                cash_dates.append(date)
-                total_trades_count = total_trades_count + 1
-            elif action == 'Sell':
-                cash_flow = units * price
-                cash_flows.append(cash_flow)
-                cash_dates.append(date)
-                total_trades_count = total_trades_count + 1
-        
-        # Calculate XIRR
-        total_days = (pd.to_datetime(end_date) - pd.to_datetime(start_date)).days
-        total_years = total_days / 365.25
-        
-        xirr_value = 0.001
-        try:
-            xirr_value = ((portfolio['cash'][0] / initial_capital) ** (1 / total_years) - 1) * 100
-            print ( f"{xirr_value} = (({portfolio['cash'][0]} / {initial_capital}) ** (1 / {total_years}) - 1) * 100")
-        except:
-            xirr_value = 0.001
+        with profiler.stage("xirr"):
+            summary = summarize(result, initial_capital, start_date, end_date)
+            total_trades_count = summary['trades']
+            xirr_value = summary['cagr_pct']
+            # XIRR of the dated trade flows in the ledger, and of buy & hold
+            xirr_row = returns_table([result], initial_capital, start_date, end_date).iloc[0]
+        exporter = open_exporter("analysis")
+        if exporter:
+            with profiler.stage("export"):
+                exporter.write("ledger", ledger_table(trade_history_with_cash, symbol=ticker))
+                exporter.write("equity", equity_table(result, dates, close_prices, initial_capital, start_date, symbol=ticker))
+                exporter.write("summary", pd.DataFrame([{'symbol': ticker, 'initial_capital': initial_capital, **summary,
+                                                         **xirr_row.drop('cagr_pct')}]))
+                exporter.close()
         
         progress_bar.progress(100)
         status_text.text("Analysis complete for {ticker} with initial amount {initial_capital}!")
         
-        # Display results
-        st.success("✅ Analysis completed successfully!")
-        
-        # Key metrics
-        col1, col2, col3, col4 = st.columns(4)
-        
-        try:
-            with col1:
-                total_return = portfolio['cash'][0] - initial_capital
-                return_pct = (portfolio['cash'][0] / initial_capital - 1) * 100
-                return_pct_rounded = f"{return_pct:.2f}%"
-                st.metric("Total Profit", f"₹{total_return:.0f}", f"{return_pct_rounded}")
+        with profiler.stage("render"):
+            # Display results
+            st.success("✅ Analysis completed successfully!")
+            if exporter:
+                st.caption(f"Exported to {exporter.root}")
+        
+            # Key metrics
+            col1, col2, col3, col4 = st.columns(4)
+        
+            try:
+                with col1:
+                    total_return = portfolio['cash'] - initial_capital
+                    return_pct = (portfolio['cash'] / initial_capital - 1) * 100
+                    return_pct_rounded = f"{return_pct:.2f}%"
+                    st.metric("Total Profit", f"₹{total_return:.0f}", f"{return_pct_rounded}")
             
-            with col2:
-                st.metric("CAGR (Annualized)", f"{xirr_value:.2f}%")
+                with col2:
+                    st.metric("CAGR (Annualized)", f"{xirr_value:.2f}%")
             
-            with col3:
-                st.metric("Total Trades", total_trades_count)
-            
-            with col4:
-                st.metric("Final Value", f"₹{portfolio['cash'][0]:.0f}")
-        except:
-            st.metric("Total Trades", len(trade_history_with_cash))
-        
-        # Buy and Hold comparison
-        if initial_price == 0 :
-            initial_price = close_prices[0]
+                with col3:
+                    st.metric("Total Trades", total_trades_count)
             
-        buy_qty = initial_capital/initial_price
-        final_capital = (buy_qty * final_price)
-        buy_hold_profit = final_capital - initial_capital
-        buy_hold_annualized = ( (final_capital / initial_capital) ** (1 / total_years) - 1) * 100
-        
-        #  Buy & Hold via XIRR ---
-        bh_cash_flows = [
-            -initial_capital,
-            portfolio['cash']
-        ]
-        bh_dates = [
-            pd.to_datetime(initial_date),
-            pd.to_datetime(dates[-1])
-        ]
-        try:
-            bh_xirr = pyxirr.xirr(bh_dates, bh_cash_flows)
-        except Exception:
-            bh_xirr = 0.001
-        bh_xirr_pct = bh_xirr * 100
-        simple_bh_return = (final_price / initial_price - 1) * 100
-
-        #  End replacement ---
+                with col4:
+                    st.metric("Final Value", f"₹{portfolio['cash']:.0f}")
+            except:
+                st.metric("Total Trades", len(trade_history_with_cash))
+        
+            # Buy and Hold comparison
+            final_capital = summary['buy_hold_value']
+            buy_hold_profit = final_capital - initial_capital
+            buy_hold_annualized = summary['buy_hold_cagr_pct']
+            simple_bh_return = (final_price / initial_price - 1) * 100
+
+            #  End replacement ---
                 
-        st.subheader(" Strategy vs Buy & Hold")
-        comp_col1, comp_col2, comp_col3 = st.columns(3)
-        with comp_col1:
-            # Optionally still show simple total return
-            st.metric("Buy & Hold Total Profit", f"₹{buy_hold_profit[0]:.0f}")
-        with comp_col2:
-            st.metric("Buy & Hold (Annualized)", f"{buy_hold_annualized[0]:.2f}%")
-        with comp_col3:
-            strat_xirr_pct = xirr_value * 100
-            outperformance = strat_xirr_pct - bh_xirr_pct
-            st.metric("Final Value", f"{final_capital[0]:.0f}")
-
-        st.subheader("💰 Investment Details")
-        st.write(f"**Symbol:** {ticker}     ,&nbsp;&nbsp;&nbsp;&nbsp; **Invested Capital:** {initial_capital}  ,&nbsp;&nbsp;&nbsp;&nbsp;  **Opening Price** {initial_price}  ,&nbsp;&nbsp;&nbsp;&nbsp;  **Opening Date** {initial_date}")
-        
-        # Trade history
-        if trade_history_with_cash:
-            st.subheader("📋 Trade History")
-            trade_df = pd.DataFrame(trade_history_with_cash, 
-                                  columns=['Date', 'Action', 'Type', 'Units', 'Price', 'Cash Position'])
-
-            # Convert numpy values to float for proper formatting
-            trade_df['Units'] = trade_df['Units'].astype(float)
-            trade_df['Price'] = trade_df['Price'].astype(float)
-            trade_df['Value'] = trade_df['Units'] * trade_df['Price']
+            st.subheader(" Strategy vs Buy & Hold")
+            comp_col1, comp_col2, comp_col3 = st.columns(3)
+            with comp_col1:
+                # Optionally still show simple total return
+                st.metric("Buy & Hold Total Profit", f"₹{buy_hold_profit:.0f}")
+            with comp_col2:
+                st.metric("Buy & Hold (Annualized)", f"{buy_hold_annualized:.2f}%")
+            with comp_col3:
+                st.metric("Final Value", f"{final_capital:.0f}")
+
+            xirr_col1, xirr_col2, xirr_col3 = st.columns(3)
+            xirr_col1.metric("Strategy XIRR (trades)", f"{xirr_row['xirr_pct']:.2f}%")
+            xirr_col2.metric("Buy & Hold XIRR", f"{xirr_row['buy_hold_xirr_pct']:.2f}%")
+            xirr_col3.metric("XIRR Outperformance", f"{xirr_row['xirr_pct'] - xirr_row['buy_hold_xirr_pct']:.2f}%")
+            for label, status in [("Strategy", xirr_row['xirr_status']), ("Buy & Hold", xirr_row['buy_hold_xirr_status'])]:
+                if status != 'converged':
+                    st.warning(f"{label} XIRR not available: {status}")
+
+            st.subheader("💰 Investment Details")
+            st.write(f"**Symbol:** {ticker}     ,&nbsp;&nbsp;&nbsp;&nbsp; **Invested Capital:** {initial_capital}  ,&nbsp;&nbsp;&nbsp;&nbsp;  **Opening Price** {initial_price}  ,&nbsp;&nbsp;&nbsp;&nbsp;  **Opening Date** {initial_date}")
+
+            # Charted below from the session, so moving the chart window does not rerun the analysis
+            chart_from = int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), 'left'))
+            trades = ledger_table(trade_history_with_cash)
+            st.session_state["chart"] = {
+                'run': f"{ticker}-{datetime.now():%Y%m%d%H%M%S%f}", 'ticker': ticker,
+                'dates': np.array(dates[chart_from:]), 'close': np.array(close_prices[chart_from:]),
+                'dmas': {name: np.array(series[name][chart_from:]) for name in ['30DMA', '50DMA', '200DMA']},
+                'trades': trades[trades['action'].isin(['Buy', 'Sell'])],
+                'equity': equity_table(result, dates, close_prices, initial_capital, start_date)}
+        
+            # Trade history
+            if trade_history_with_cash:
+                st.subheader("📋 Trade History")
+                trade_df = trade_history_with_cash.to_frame()
+
+                # Convert numpy values to float for proper formatting
+                trade_df['Units'] = trade_df['Units'].astype(float)
+                trade_df['Price'] = trade_df['Price'].astype(float)
+                trade_df['Value'] = trade_df['Units'] * trade_df['Price']
             
-            # Round values for display
-            trade_df['Units'] = trade_df['Units'].round(0)
-            trade_df['Price'] = trade_df['Price'].round(1)
-            trade_df['Value'] = trade_df['Value'].round(0)
+                # Round values for display
+                trade_df['Units'] = trade_df['Units'].round(0)
+                trade_df['Price'] = trade_df['Price'].round(1)
+                trade_df['Value'] = trade_df['Value'].round(0)
             
-            trade_df = trade_df.sort_values(by="Date", ascending=False)
+                trade_df = trade_df.sort_values(by="Date", ascending=False)
 
-            # format date nicely
-            trade_df['Date'] = trade_df['Date'].dt.strftime('%Y-%m-%d')
+                # format date nicely
+                trade_df['Date'] = trade_df['Date'].dt.strftime('%Y-%m-%d')
             
-            st.dataframe(trade_df, use_container_width=True)
+                st.dataframe(trade_df, use_container_width=True)
 
             
-            # Trade statistics
-            st.subheader("📊 Trade Statistics")
-            col1, col2 = st.columns(2)
+                # Trade statistics
+                st.subheader("📊 Trade Statistics")
+                col1, col2 = st.columns(2)
             
-            with col1:
-                buy_trades = trade_df[trade_df['Action'] == 'Buy']
-                sell_trades = trade_df[trade_df['Action'] == 'Sell']
+                with col1:
+                    buy_trades = trade_df[trade_df['Action'] == 'Buy']
+                    sell_trades = trade_df[trade_df['Action'] == 'Sell']
                 
-                st.write(f"**Total Buy Trades:** {len(buy_trades)}")
-                st.write(f"**Total Sell Trades:** {len(sell_trades)}")
+                    st.write(f"**Total Buy Trades:** {len(buy_trades)}")
+                    st.write(f"**Total Sell Trades:** {len(sell_trades)}")
                 
-                if len(buy_trades) > 0:
-                    strong_buys = len(buy_trades[buy_trades['Type'] == 'Strong'])
-                    moderate_buys = len(buy_trades[buy_trades['Type'] == 'Moderate'])
-                    st.write(f"**Strong Buys:** {strong_buys}")
-                    st.write(f"**Moderate Buys:** {moderate_buys}")
+                    if len(buy_trades) > 0:
+                        strong_buys = len(buy_trades[buy_trades['Type'] == 'Strong'])
+                        moderate_buys = len(buy_trades[buy_trades['Type'] == 'Moderate'])
+                        st.write(f"**Strong Buys:** {strong_buys}")
+                        st.write(f"**Moderate Buys:** {moderate_buys}")
             
-            with col2:
-                if len(buy_trades) > 0:
-                    total_invested = buy_trades['Value'].sum()
-                    st.write(f"**Total Invested:** ₹{total_invested:,.2f}")
+                with col2:
+                    if len(buy_trades) > 0:
+                        total_invested = buy_trades['Value'].sum()
+                        st.write(f"**Total Invested:** ₹{total_invested:,.2f}")
                 
-                if len(sell_trades) > 0:
-                    total_received = sell_trades['Value'].sum()
-                    st.write(f"**Total Received:** ₹{total_received:,.2f}")
+                    if len(sell_trades) > 0:
+                        total_received = sell_trades['Value'].sum()
+                        st.write(f"**Total Received:** ₹{total_received:,.2f}")
                     
-                    if len(buy_trades) > 0:
-                        net_profit = total_received - total_invested
-                        st.write(f"**Net Profit/Loss:** ₹{net_profit:,.2f}")
+                        if len(buy_trades) > 0:
+                            net_profit = total_received - total_invested
+                            st.write(f"**Net Profit/Loss:** ₹{net_profit:,.2f}")
     
     except Exception as e:
         exc_type, exc_value, exc_tb = sys.exc_info()
@@ -640,6 +607,8 @@ if st.sidebar.button("🚀 Run Analysis", type="primary"):
     finally:
         progress_bar.empty()
         status_text.empty()
+        profiler.close()
+        st.session_state["diagnostics"] = profiler.report()
 
 else:
     st.info("👈 Configure your parameters in the sidebar and click 'Run Analysis' to start")
@@ -673,6 +642,42 @@ else:
     - Comparison with buy-and-hold strategy
     """)
 
+# 📈 Charts of the last Run Analysis: decimated to the point budget for the chosen window, so
+# narrowing the window brings back detail
+chart = st.session_state.get("chart")
+if chart and len(chart['dates']):
+    st.subheader(f"📈 {chart['ticker']}: price, DMAs and trades")
+    first, last = pd.Timestamp(chart['dates'][0]).date(), pd.Timestamp(chart['dates'][-1]).date()
+    chart_start, chart_end = first, last
+    if first < last:
+        chart_start, chart_end = st.slider("Chart window", min_value=first, max_value=last, value=(first, last),
+                                           key=f"chart_window-{chart['run']}")
+    price_fig = price_figure(chart['dates'], chart['close'], chart['dmas'], chart['trades'], chart_budget,
+                             chart_start, chart_end)
+    st.plotly_chart(price_fig, use_container_width=True)
+    equity_fig = equity_figure(chart['equity'], chart_budget, chart_start, chart_end, title="Cash vs holdings")
+    st.plotly_chart(equity_fig, use_container_width=True)
+    st.caption(f"{price_fig.layout.meta['points']:,} of {price_fig.layout.meta['bars']:,} bars per line, "
+               f"{(payload_bytes(price_fig) + payload_bytes(equity_fig)) / 1024:,.0f} KiB sent")
+
+# Where the last Run Analysis or TradeToday spent its time (see profiling.py)
+diagnostics = st.session_state.get("diagnostics")
+if diagnostics:
+    with st.expander(f"🔬 Diagnostics: {diagnostics['name']} at {diagnostics['started']}"):
+        stages_df = pd.DataFrame(diagnostics['stages']).set_index('stage')
+        stages_df['ms'] = (stages_df.pop('seconds') * 1000).round(1)
+        stages_df['peak MiB'] = (stages_df.pop('peak_bytes') / 2**20).round(2)
+        st.dataframe(stages_df, use_container_width=True)
+        st.download_button("Download diagnostics (JSON)", json.dumps(diagnostics, indent=2),
+                           file_name="diagnostics.json", mime="application/json")
+        for stage_name, text in diagnostics['profiles'].items():
+            st.caption(f"cProfile of {stage_name}")
+            st.code(text)
+
+# Cache hit/miss counts, shared computations and memory held, for sizing the caches
+with st.sidebar.expander("Cache statistics"):
+    st.dataframe(pd.DataFrame(cache.cache_stats()).set_index('cache'), use_container_width=True)
+
 # Footer
 st.markdown("---")
 st.markdown("*Built with Streamlit • Data from Yahoo Finance*")
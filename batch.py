@@ -0,0 +1,180 @@
+"""Headless batch backtests: every symbol x parameter set, results written to files.
+
+    python batch.py --symbols HDFCBANK.NS INFY.NS --start 2015-01-01 --out results
+    python batch.py --universe --params params.json --workers 8 --out results
+
+`--params` is a JSON object or list of objects overriding engine.DEFAULT_PARAMS, and `--rules` a
+rules.py rule set in place of the built-in strategy (its windows beyond the 30/50/200 DMAs are
+rolled over the whole loaded history, warm-up included, as in the app). The run writes,
+through export.Exporter (Parquet, or CSV with --format csv), results/summary (one row per symbol
+and parameter set), results/ledger (every run's full-precision ledger) and results/equity (every
+run's daily cash and value). Ledgers and equity curves are written as each symbol finishes, so
+the whole universe's never sits in memory at once.
+
+Symbols are processed LOAD_CHUNK at a time: their prices are loaded, cut down to
+indicators.compact_series (Close and the DMAs, float32 with --float32), backtested and let go
+before the next chunk is loaded, so a universe-wide run only ever holds one chunk of prices. The
+summary's series_bytes column is what each symbol's series took.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from engine import DEFAULT_PARAMS, WARMUP_DAYS, run_backtest, summarize
+from export import FORMATS, Exporter, default_format, equity_table, ledger_table
+from indicators import compact_series, series_nbytes
+from price_store import PriceStore
+from returns import returns_table
+from rules import GIVEN, compile_rules, load_rules
+from sweep import series_columns
+from tickers import ticker_options
+
+SYMBOL_PERCENT = {info["symbol"]: info.get("percent", 100) for info in ticker_options.values()}
+LOAD_CHUNK = 16  # symbols whose OHLCV frames are in memory at once
+
+
+def load_param_sets(path=None):
+    if path is None:
+        return [dict(DEFAULT_PARAMS)]
+    with open(path) as f:
+        sets = json.load(f)
+    if isinstance(sets, dict):
+        sets = [sets]
+    return [{**DEFAULT_PARAMS, **s} for s in sets]
+
+
+def run_symbol(symbol, series, initial_capital, param_sets, start_date, end_date, tables=False, rules=None):
+    """Backtest one symbol (an OHLCV frame or load_series arrays) under every parameter set.
+
+    Returns one summary row per set and, with `tables`, {'ledger', 'equity'} frames of all sets
+    (else an empty dict).
+    """
+    columns = series_columns(series)
+    if not len(columns[0]):
+        return [{'symbol': symbol, 'error': 'insufficient history for the 200DMA'}], {}
+    rules = None if rules is None else compile_rules(rules)
+    indicators = None
+    if rules is not None:
+        # The rule set's other windows, rolled over the warm-up too: load_series carries them along
+        indicators = ({name: values for name, values in series.items() if name not in GIVEN and name != 'dates'}
+                      if isinstance(series, dict) else rules.indicators(series['Close'], columns[0]))
+    rows, results, ledgers, curves = [], [], [], []
+    for set_id, params in enumerate(param_sets):
+        result = run_backtest(*columns, initial_capital, start_date=start_date, rules=rules, indicators=indicators,
+                              **params)
+        rows.append({'symbol': symbol, 'param_set': set_id, 'initial_capital': initial_capital, **params,
+                     **summarize(result, initial_capital, start_date, end_date)})
+        results.append(result)
+        if tables:
+            ledgers.append(ledger_table(result['trade_history'], symbol=symbol, param_set=set_id))
+            curves.append(equity_table(result, columns[0], columns[1], initial_capital, start_date,
+                                       symbol=symbol, param_set=set_id))
+    # Every set's XIRR in one batched solve
+    xirr = returns_table(results, initial_capital, start_date, end_date)
+    for row, (_, returns) in zip(rows, xirr.iterrows()):
+        row.update(returns.drop('cagr_pct'))
+    if not tables:
+        return rows, {}
+    return rows, {'ledger': pd.concat(ledgers, ignore_index=True), 'equity': pd.concat(curves, ignore_index=True)}
+
+
+def load_series(store, symbols, start, end, dtype=np.float64, rules=None):
+    """({symbol: compact_series}, {symbol: error}) of `symbols`, each frame dropped once compacted.
+
+    With a rules.py rule set, each series also holds the rule set's windows beyond the 30/50/200
+    DMAs, rolled over the whole frame.
+    """
+    frames, errors = store.load_many(symbols, start, end)
+    series = {}
+    for symbol in list(frames):
+        frame = frames.pop(symbol)
+        series[symbol] = compact_series(frame, dtype)
+        if rules is not None:
+            series[symbol].update((name, values.astype(dtype)) for name, values in
+                                  rules.indicators(frame['Close'], series[symbol]['dates']).items())
+    return series, errors
+
+
+def run_batch(store, symbols, start_date, end_date, param_sets, total_capital, out_dir=None, workers=1, fmt=None,
+              dtype=np.float64, rules=None):
+    """Backtest `symbols` from start_date through end_date (inclusive) and return the summary frame.
+
+    Each symbol gets its ticker_options share of total_capital, or all of it if it is not in the
+    universe, as in the app. With `out_dir`, the tables are exported there in format `fmt`.
+    Prices are held as `dtype` (see indicators.compact_series). `rules` is a rule-set dict (see
+    rules.py), None for the built-in strategy.
+    """
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date) + timedelta(days=1)
+    symbols = list(dict.fromkeys(symbols))
+    compiled = None if rules is None else compile_rules(rules)
+    exporter = Exporter(out_dir, fmt) if out_dir else None
+    rows, sizes = [], {}
+    # spawn, not fork: the fetch threads (and yfinance's HTTP client) must not be forked mid-flight
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) if workers > 1 else None
+    try:
+        for i in range(0, len(symbols), LOAD_CHUNK):
+            series, errors = load_series(store, symbols[i:i + LOAD_CHUNK], start_date - timedelta(days=WARMUP_DAYS),
+                                         end_date, dtype, compiled)
+            rows.extend({'symbol': symbol, 'error': error} for symbol, error in errors.items())
+            sizes.update((symbol, series_nbytes(columns)) for symbol, columns in series.items())
+            jobs = [(symbol, columns, round(total_capital * SYMBOL_PERCENT.get(symbol, 100) / 100), param_sets,
+                     start_date, end_date, exporter is not None, rules) for symbol, columns in series.items()]
+            del series
+            results = pool.map(run_symbol, *zip(*jobs)) if pool and jobs else (run_symbol(*job) for job in jobs)
+            for symbol_rows, tables in results:
+                rows.extend(symbol_rows)
+                for name, table in tables.items():
+                    exporter.write(name, table)
+        summary = pd.DataFrame(rows)
+        if len(summary):
+            summary['series_bytes'] = summary['symbol'].map(sizes)
+        if exporter:
+            exporter.write('summary', summary)
+    finally:
+        if pool:
+            pool.shutdown()
+        if exporter:
+            exporter.close()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    universe = parser.add_mutually_exclusive_group(required=True)
+    universe.add_argument('--symbols', nargs='+', help='Yahoo symbols to backtest')
+    universe.add_argument('--universe', action='store_true', help='backtest every symbol in tickers.ticker_options')
+    parser.add_argument('--start', default=str(date.today() - timedelta(days=90)), help='first trading date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=str(date.today()), help='last trading date, inclusive (YYYY-MM-DD)')
+    parser.add_argument('--capital', type=float, default=60000000, help='total capital, split by ticker_options percent')
+    parser.add_argument('--params', help='JSON file with a parameter set or a list of them')
+    parser.add_argument('--rules', help='JSON rule set (see rules.py) in place of the built-in strategy')
+    parser.add_argument('--store', default=os.environ.get("PRICE_STORE_DIR", ".price_store"), help='price store directory')
+    parser.add_argument('--workers', type=int, default=1, help='processes to spread symbols over')
+    parser.add_argument('--out', default='results', help='output directory')
+    parser.add_argument('--format', choices=FORMATS, default=default_format(), help='format of the exported tables')
+    parser.add_argument('--float32', action='store_true', help='hold prices as float32 (half the memory, not bit-exact)')
+    args = parser.parse_args(argv)
+
+    symbols = args.symbols or [info["symbol"] for info in ticker_options.values()]
+    summary = run_batch(PriceStore(args.store), symbols, args.start, args.end, load_param_sets(args.params),
+                        args.capital, out_dir=args.out, workers=args.workers, fmt=args.format,
+                        dtype=np.float32 if args.float32 else np.float64,
+                        rules=load_rules(args.rules) if args.rules else None)
+    failed = summary['error'].notna().sum() if 'error' in summary else 0
+    print(f"{len(summary) - failed} runs written to {args.out}, {failed} symbols failed")
+    if 'series_bytes' in summary:
+        held = summary.drop_duplicates('symbol')['series_bytes'].sum()
+        print(f"price series held: {held / 2**20:.1f} MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Offline benchmark of the Run Analysis and TradeToday flows on synthetic price universes.
+
+    python bench.py --symbols 1 20 200 --years 1 5 20 --save bench_baseline.json
+    python bench.py --symbols 1 20 200 --years 1 5 20 --baseline bench_baseline.json
+
+Every scenario (symbol count x years) backtests a synthetic.universe() served by a
+SyntheticFetcher through a fresh PriceStore, so no network is touched and every run sees the
+same bars. Stages follow the app: load (cold store, then warm), indicators, simulation, XIRR and
+summary, ledger to display DataFrame, and the TradeToday scan (cold checkpoints, then resumed,
+then resumed behind the pre-screen of screen.py).
+Each stage reports its best wall time over --repeat samples (quick stages are looped within a
+sample), bars per second and the peak memory traced during a separate run. With --baseline, any
+stage whose throughput falls, or whose peak memory grows, by more than --tolerance is reported
+and the exit status is 1.
+"""
+import argparse
+import gc
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache
+from checkpoints import CheckpointStore, scan
+from engine import DEFAULT_PARAMS, WARMUP_DAYS, run_backtest, summarize
+from indicators import IndicatorStore
+from price_store import PriceStore, price_matrix
+from returns import returns_table
+from scheduler import TodayStore, scan_symbols
+from synthetic import CALENDAR_END, SyntheticFetcher, universe
+
+STAGES = ['load_cold', 'load_warm', 'indicators', 'simulation', 'xirr', 'ledger_frame', 'trade_today_cold', 'trade_today_warm',
+          'trade_today_screened']
+INITIAL_CAPITAL = 1_000_000
+MEMORY_SLACK = 1 << 20  # peak-memory growth below this is noise, whatever the ratio
+MIN_SAMPLE_SECONDS = 0.05  # quick stages are looped until a sample takes this long
+
+
+class Scenario:
+    """One symbol count x years run of the app's flows, one method per stage.
+
+    Stages run in STAGES order and each leaves what the next one needs on the instance.
+    """
+
+    def __init__(self, n_symbols, years, seed=0):
+        self.symbols = universe(n_symbols)
+        self.end_date = pd.Timestamp(CALENDAR_END)
+        self.start_date = self.end_date - pd.DateOffset(years=years)
+        self.start_moving = self.start_date - timedelta(days=WARMUP_DAYS)
+        self.end = self.end_date + timedelta(days=1)
+        self.seed = seed
+        self.strategy = {k: v for k, v in DEFAULT_PARAMS.items() if k != 'interest_rate_pct'}
+        self.root = tempfile.mkdtemp(prefix='bench-')
+        self.bars = 0
+
+    def close(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def load_cold(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.store = PriceStore(self.root, fetcher=SyntheticFetcher(self.seed))
+        return self.load_warm()
+
+    def load_warm(self):
+        self.frames = {s: self.store.load(s, self.start_moving, self.end) for s in self.symbols}
+        self.bars = sum(len(df) for df in self.frames.values())
+        return self.bars
+
+    def indicators(self):
+        store = IndicatorStore(LRUCache('bench', maxsize=len(self.symbols)))
+        self.series = {s: store.window(s, df, self.start_moving, self.end) for s, df in self.frames.items()}
+        return self.bars
+
+    def simulation(self):
+        self.results = {}
+        for s, series in self.series.items():
+            self.results[s] = run_backtest(series['dates'], series['Close'], series['30DMA'], series['50DMA'],
+                                           series['200DMA'], INITIAL_CAPITAL, start_date=self.start_date, **DEFAULT_PARAMS)
+        return self.simulated_bars
+
+    @property
+    def simulated_bars(self):
+        return sum(len(series['dates']) for series in self.series.values())
+
+    def xirr(self):
+        for result in self.results.values():
+            summarize(result, INITIAL_CAPITAL, self.start_date, self.end)
+        returns_table(list(self.results.values()), INITIAL_CAPITAL, self.start_date, self.end)
+        return self.simulated_bars
+
+    def ledger_frame(self):
+        for result in self.results.values():
+            # The app's Trade History conversions
+            df = result['trade_history'].to_frame()
+            df['Units'] = df['Units'].astype(float)
+            df['Price'] = df['Price'].astype(float)
+            df['Value'] = (df['Units'] * df['Price']).round(0)
+            df['Units'] = df['Units'].round(0)
+            df['Price'] = df['Price'].round(1)
+            df = df.sort_values(by='Date', ascending=False)
+            df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
+        return self.simulated_bars
+
+    def trade_today_cold(self):
+        shutil.rmtree(self.root + '-checkpoints', ignore_errors=True)
+        self.checkpoints = CheckpointStore(self.root + '-checkpoints')
+        return self.trade_today_warm()
+
+    def trade_today_warm(self):
+        frames, _ = self.store.load_many(self.symbols, self.start_moving, self.end)
+        matrix = price_matrix(frames)
+        for s in self.symbols:
+            # As of the morning after the last bar, so every bar is settled and checkpointed
+            scan(self.checkpoints, s, matrix[s], INITIAL_CAPITAL, self.strategy, now=self.end)
+        return self.bars
+
+    def trade_today_screened(self):
+        # The scheduler's pass: only symbols the pre-screen cannot rule out are simulated
+        scan_symbols(self.store, self.checkpoints, TodayStore(self.root + '-today'), dict.fromkeys(self.symbols, INITIAL_CAPITAL),
+                     self.strategy, self.start_date, self.end_date)
+        return self.bars
+
+
+def _sample(stage):
+    """(seconds per call, bars) of one timing sample of `stage`."""
+    gc.collect()
+    loops, t0 = 0, time.perf_counter()
+    while True:
+        bars = stage()
+        loops += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= MIN_SAMPLE_SECONDS:
+            return elapsed / loops, bars
+
+
+def run_scenario(n_symbols, years, repeat=3, seed=0):
+    """{stage: {'seconds', 'bars', 'bars_per_s', 'peak_bytes'}} for one scenario."""
+    timings = {stage: [] for stage in STAGES}
+    peaks = {}
+    scenario = Scenario(n_symbols, years, seed)
+    try:
+        for _ in range(repeat):
+            for stage in STAGES:
+                timings[stage].append(_sample(getattr(scenario, stage)))
+        # Tracing slows everything down, so memory gets a run of its own
+        for stage in STAGES:
+            gc.collect()
+            tracemalloc.start()
+            getattr(scenario, stage)()
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        scenario.close()
+        shutil.rmtree(scenario.root + '-checkpoints', ignore_errors=True)
+        shutil.rmtree(scenario.root + '-today', ignore_errors=True)
+
+    report = {}
+    for stage in STAGES:
+        seconds, bars = min(timings[stage])
+        report[stage] = {'seconds': seconds, 'bars': bars, 'bars_per_s': bars / seconds if seconds > 0 else float('inf'),
+                         'peak_bytes': peaks[stage]}
+    return report
+
+
+def run_bench(symbol_counts, year_counts, repeat=3, seed=0, log=print):
+    scenarios = {}
+    for n_symbols in symbol_counts:
+        for years in year_counts:
+            name = f"{n_symbols}x{years}y"
+            log(f"{name} ...")
+            scenarios[name] = run_scenario(n_symbols, years, repeat, seed)
+            for stage, r in scenarios[name].items():
+                log(f"  {stage:<20} {r['seconds'] * 1000:10.1f} ms {r['bars_per_s']:14,.0f} bars/s {r['peak_bytes'] / 2**20:8.1f} MiB")
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'repeat': repeat, 'seed': seed, 'scenarios': scenarios}
+
+
+def regressions(report, baseline, tolerance=0.25):
+    """Stages of scenarios present in both runs that got slower or hungrier than `tolerance` allows."""
+    found = []
+    for name, stages in report['scenarios'].items():
+        for stage, r in stages.items():
+            base = baseline.get('scenarios', {}).get(name, {}).get(stage)
+            if base is None:
+                continue
+            if r['bars_per_s'] < base['bars_per_s'] * (1 - tolerance):
+                found.append(f"{name} {stage}: {r['bars_per_s']:,.0f} bars/s vs baseline {base['bars_per_s']:,.0f}")
+            if r['peak_bytes'] > base['peak_bytes'] * (1 + tolerance) and r['peak_bytes'] - base['peak_bytes'] > MEMORY_SLACK:
+                found.append(f"{name} {stage}: peak {r['peak_bytes'] / 2**20:.1f} MiB vs baseline {base['peak_bytes'] / 2**20:.1f} MiB")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1, 20], help='universe sizes (1-200)')
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 5], help='backtest lengths in years (1-20)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage; the best one is kept')
+    parser.add_argument('--seed', type=int, default=0, help='synthetic universe seed')
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown / memory growth')
+    args = parser.parse_args(argv)
+    if not all(1 <= n <= 200 for n in args.symbols) or not all(1 <= y <= 20 for y in args.years):
+        parser.error('--symbols must be within 1-200 and --years within 1-20')
+
+    report = run_bench(args.symbols, args.years, args.repeat, args.seed)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        if found:
+            print(f"REGRESSION: {len(found)} stage(s) beyond {args.tolerance:.0%} of {args.baseline}")
+            for line in found:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
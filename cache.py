@@ -0,0 +1,177 @@
+"""In-process LRU/TTL caches that outlive Streamlit reruns.
+
+app.py is re-executed on every widget interaction, but imported modules stay in sys.modules, so
+the caches below live for the whole server process and are shared by its sessions (each session
+runs the script on its own thread). Cached values are shared objects: callers must treat them
+as read-only.
+
+A miss computes once however many sessions ask for the same key at the same moment: the first
+caller computes and the others wait for its value (get_or_compute). Each cache is bounded by
+entries and by an estimate of the bytes its values hold (sizeof), evicting least recently used
+entries past either limit.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_TTL = 15 * 60  # matches PriceStore.refresh_after, so a live bar is not served stale for longer
+MiB = 2 ** 20
+# Byte budget of all the caches together, split between them below
+BUDGET = int(os.environ.get("CACHE_BUDGET_MB", 1024)) * MiB
+
+
+def sizeof(value, _seen=None):
+    """Rough bytes held by `value`: array and frame buffers, and the containers and objects around them."""
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        # A view counts the buffer it shares, once
+        return value.nbytes if value.base is None else sizeof(value.base, seen)
+    if hasattr(value, 'memory_usage') and hasattr(value, 'index'):  # DataFrame, Series
+        usage = value.memory_usage(index=True, deep=False)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k, seen) + sizeof(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(v, seen) for v in value)
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        return sys.getsizeof(value) + sizeof(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """A computation in progress, waited on by the callers that missed the same key meanwhile."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = self.error = None
+
+
+class LRUCache:
+    """Size-bounded mapping with least-recently-used eviction, an optional time-to-live and hit counts.
+
+    `maxbytes` bounds the sizeof() of the values held; a single value larger than that is not kept.
+    """
+
+    def __init__(self, name, maxsize=128, ttl=None, maxbytes=None, clock=time.monotonic):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.clock = clock
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.computes = self.waits = 0
+        self.nbytes = 0
+        self._data = OrderedDict()  # key: (stored at, value, bytes)
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and self.clock() - entry[0] > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _drop(self, key):
+        self.nbytes -= self._data.pop(key)[2]
+
+    def put(self, key, value):
+        """Store `value` under `key`; putting a value again re-measures it (for values grown in place)."""
+        nbytes = sizeof(value) if self.maxbytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            if self.maxbytes is not None and nbytes > self.maxbytes:
+                self.evictions += 1
+                return
+            self._data[key] = (self.clock(), value, nbytes)
+            self.nbytes += nbytes
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Cached value for `key`, or compute() stored under it.
+
+        Concurrent callers missing the same key wait for the first one's compute() instead of
+        running their own, and get its value or its exception. The lock is not held while computing.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None and key in self._data and (self.ttl is None or self.clock() - self._data[key][0] <= self.ttl):
+                # Stored by a computation that finished since the miss above
+                return self._data[key][1]
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.computes += 1
+            else:
+                self.waits += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+            self.put(key, flight.value)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'cache': self.name, 'entries': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions, 'expired': self.expirations, 'computes': self.computes,
+                'waits': self.waits, 'mib': self.nbytes / MiB,
+                'max_mib': self.maxbytes / MiB if self.maxbytes is not None else None}
+
+
+# Raw bars by (symbol, start, end); indicator series by symbol (indicators.IndicatorStore, which
+# keeps them current itself, so no TTL); whole backtest results by (symbol, range, capital and
+# every strategy parameter).
+prices = LRUCache('prices', maxsize=64, ttl=DEFAULT_TTL, maxbytes=BUDGET // 2)
+indicators = LRUCache('indicators', maxsize=128, maxbytes=BUDGET // 4)
+results = LRUCache('results', maxsize=256, ttl=DEFAULT_TTL, maxbytes=BUDGET // 4)
+CACHES = [prices, indicators, results]
+
+
+def cache_stats():
+    return [c.stats() for c in CACHES]
+
+
+def clear_all():
+    for c in CACHES:
+        c.clear()
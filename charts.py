@@ -0,0 +1,130 @@
+"""Plotly charts of long histories, decimated server-side and drawn with WebGL.
+
+    fig = price_figure(dates, close, dmas, trades, budget=1500, start='2020-01-01')
+
+A 20-year daily run is ~5,000 bars per line, and a figure of every bar for several lines and
+tickers sends megabytes of JSON to the browser. Every line here is cut down to `budget` points
+of the visible window: price lines with LTTB (largest-triangle-three-buckets), which keeps the
+turns a reader sees, and equity lines with min-max buckets, which keep every step and spike of
+the cash. Trade markers are never decimated. The app re-decimates the window picked on its
+slider, so zooming in brings back detail while the payload stays bounded by the budget.
+"""
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+DEFAULT_BUDGET = 1500  # points per line
+DMA_COLORS = {'30DMA': '#ff7f0e', '50DMA': '#2ca02c', '200DMA': '#d62728'}
+MARKERS = {'Buy': dict(symbol='triangle-up', color='#2ca02c', size=9),
+           'Sell': dict(symbol='triangle-down', color='#d62728', size=9)}
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points of (x, y) that LTTB keeps, first and last included."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i (of threshold - 2) spans edges[i]:edges[i + 1]; the first and last points stand alone
+    edges = np.floor(np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The third corner: the mean of the next bucket (the last point after the last bucket)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(y, threshold):
+    """Sorted indices of the lowest and highest point of each of threshold / 2 equal buckets of y, plus the ends."""
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+    width = -(-n // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, width)
+    filled = ~np.isnan(rows).all(axis=1)
+    offsets = np.arange(buckets)[filled] * width
+    low = offsets + np.nanargmin(rows[filled], axis=1)
+    high = offsets + np.nanargmax(rows[filled], axis=1)
+    return np.unique(np.concatenate([[0, n - 1], low, high]))
+
+
+def window(dates, start=None, end=None):
+    """(first, stop) bar indices of `dates` from start to end, both inclusive."""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    first = 0 if start is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 'ns'), 'left'))
+    stop = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 'ns'), 'right'))
+    return first, stop
+
+
+def payload_bytes(fig):
+    """Size of the figure's JSON, what the browser is sent."""
+    return len(fig.to_json())
+
+
+def price_figure(dates, close, dmas, trades=None, budget=DEFAULT_BUDGET, start=None, end=None, title=None):
+    """Close and {name: DMA values} lines with Buy / Sell markers from `trades`, over start..end.
+
+    The lines are sampled at the LTTB points of the close (the DMAs are smooth enough to share
+    them). `trades` is an export.ledger_table frame; all of its Buy and Sell rows in the window
+    are drawn. The figure's `meta` holds the bars in the window and the points drawn per line.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    first, stop = window(dates, start, end)
+    kept = first + lttb(dates[first:stop].view(np.int64), close[first:stop], budget)
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=dates[kept], y=np.asarray(close)[kept], mode='lines', name='Close',
+                               line=dict(color='#1f77b4', width=1.5)))
+    for name, values in dmas.items():
+        fig.add_trace(go.Scattergl(x=dates[kept], y=np.asarray(values)[kept], mode='lines', name=name,
+                                   line=dict(color=DMA_COLORS.get(name), width=1)))
+    if trades is not None and len(trades):
+        lo, hi = (dates[first], dates[stop - 1]) if stop > first else (None, None)
+        visible = trades[(trades['date'] >= lo) & (trades['date'] <= hi)] if lo is not None else trades.iloc[:0]
+        for action, marker in MARKERS.items():
+            rows = visible[visible['action'] == action]
+            if len(rows):
+                fig.add_trace(go.Scattergl(
+                    x=rows['date'], y=rows['price'], mode='markers', name=action, marker=marker,
+                    text=[f"{t} {u:,.0f} @ {p:,.2f}" for t, u, p in zip(rows['type'], rows['units'], rows['price'])],
+                    hovertemplate="%{text}<extra>" + action + "</extra>"))
+    fig.update_layout(height=450, margin=dict(l=0, r=0, t=30, b=0), hovermode='x unified', yaxis_title="Price",
+                      title=title, meta={'bars': stop - first, 'points': len(kept)})
+    return fig
+
+
+def lines_figure(dates, columns, budget=DEFAULT_BUDGET, start=None, end=None, title=None, yaxis_title="₹"):
+    """{name: values} lines over start..end, sampled together at the min-max points of every column.
+
+    Each column gets an equal share of `budget`; the figure's `meta` is as in price_figure.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    first, stop = window(dates, start, end)
+    share = max(budget // max(len(columns), 1), 4)
+    kept = first + np.unique(np.concatenate(
+        [minmax(np.asarray(values, dtype=float)[first:stop], share) for values in columns.values()] or [[]]).astype(np.int64))
+    fig = go.Figure()
+    for name, values in columns.items():
+        fig.add_trace(go.Scattergl(x=dates[kept], y=np.asarray(values)[kept], mode='lines', name=name))
+    fig.update_layout(height=350, margin=dict(l=0, r=0, t=30, b=0), hovermode='x unified', yaxis_title=yaxis_title,
+                      title=title, meta={'bars': stop - first, 'points': len(kept)})
+    return fig
+
+
+def equity_figure(equity, budget=DEFAULT_BUDGET, start=None, end=None, title=None):
+    """Cash, holdings (units x close) and total value of an export.equity_table frame."""
+    return lines_figure(equity['date'], {'Cash': equity['cash'].to_numpy(),
+                                         'Holdings': (equity['units'] * equity['close']).to_numpy(),
+                                         'Value': equity['value'].to_numpy()},
+                        budget, start, end, title)
@@ -0,0 +1,157 @@
+"""TradeToday checkpoints: each ticker's end-of-scan strategy state, so the next scan only steps new bars.
+
+A checkpoint holds the engine state (cash, units, last buy price, cool-off, running peak, last
+date), the last TAIL_BARS closes the 30/50/200 DMAs of the next bar still need (more for a rule
+set with longer windows), and the trades of the last KEEP_TRADE_DAYS days. It is kept for as
+long as the parameters, capital and rule set stay the same, the scan window starts on the
+checkpoint's first bar, and the stored closes still match the price store (an adjusted-price
+revision forces a replay). The Muhurut buy, cash and running peak all depend on that first bar,
+so a window that starts on another one (a later Start Date, the scheduler's rolling lookback)
+replays from its own start: a resumed scan reports exactly the trades a fresh one would. Today's
+bar (today in the market's time zone, MARKET_TZ) may be an intraday snapshot, so it is stepped
+on top of the checkpoint but never written into it.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from engine import add_moving_averages, run_backtest
+from rules import compile_rules
+
+MARKET_TZ = ZoneInfo('Asia/Kolkata')
+TAIL_BARS = 199  # closes before a new bar that its 200DMA still needs
+KEEP_TRADE_DAYS = 30
+_DATE_FIELDS = ('cooloff_until', 'last_date', 'initial_date')
+
+
+def _encode(checkpoint):
+    state = {k: (v.isoformat() if k in _DATE_FIELDS and v is not None else v) for k, v in checkpoint['state'].items()}
+    trades = [[t[0].isoformat(), *t[1:]] for t in checkpoint['trades']]
+    return {**checkpoint, 'state': state, 'trades': trades}
+
+
+def _decode(checkpoint):
+    state = {k: (datetime.fromisoformat(v) if k in _DATE_FIELDS and v is not None else v) for k, v in checkpoint['state'].items()}
+    trades = [(datetime.fromisoformat(t[0]), *t[1:]) for t in checkpoint['trades']]
+    return {**checkpoint, 'state': state, 'trades': trades}
+
+
+class CheckpointStore:
+    """One JSON checkpoint per symbol under `root`."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol):
+        return os.path.join(self.root, quote(symbol, safe='') + '.json')
+
+    def read(self, symbol):
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return _decode(json.load(f))
+
+    def write(self, symbol, checkpoint):
+        path = self._path(symbol)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(_encode(checkpoint), f)
+        os.replace(path + '.tmp', path)
+
+
+def _usable(checkpoint, key, closes):
+    if checkpoint is None or checkpoint['key'] != key or checkpoint['origin'] != str(closes.index[0].date()):
+        return False
+    tail_dates = np.array(checkpoint['tail_dates'], dtype='datetime64[ns]')
+    overlap, in_tail, in_closes = np.intersect1d(tail_dates, closes.index.to_numpy(dtype='datetime64[ns]'),
+                                                 assume_unique=True, return_indices=True)
+    return (np.datetime64(checkpoint['state']['last_date'], 'ns') in overlap
+            and np.allclose(np.asarray(checkpoint['tail_closes'])[in_tail], closes.to_numpy()[in_closes], rtol=1e-9, atol=0))
+
+
+def _key(initial_capital, params, rules=None):
+    key = {'initial_capital': float(initial_capital), **{k: float(v) for k, v in sorted(params.items())}}
+    if rules is not None:
+        key['rules'] = compile_rules(rules).spec
+    return key
+
+
+def resumable(store, symbol, closes, initial_capital, params, rules=None):
+    """The checkpoint scan() would resume for these closes, capital, params and rules, or None for a fresh run."""
+    closes = closes.dropna()
+    checkpoint = store.read(symbol)
+    if closes.empty or not _usable(checkpoint, _key(initial_capital, params, rules), closes):
+        return None
+    return checkpoint
+
+
+def scan(store, symbol, closes, initial_capital, params, now=None, rules=None):
+    """Run TradeToday's strategy for one symbol over `closes`, resuming its checkpoint when possible.
+
+    `params` are run_backtest keyword arguments (the strategy knobs); the run never caps
+    allocations or closes out, as in the app. `rules` is a rules.py rule set in place of the
+    built-in one; its other DMA windows are rolled over the checkpoint's tail too. `now` (a
+    tz-aware time, or a naive one already in MARKET_TZ) decides which bars are settled. Returns
+    {'trades', 'last', 'resumed'}: the checkpointed trades plus any new ones, the last bar's
+    Close / 30DMA / 50DMA / 200DMA, and whether the checkpoint was used. Returns None when there
+    are too few bars for the 200DMA.
+    """
+    closes = closes.dropna()
+    if closes.empty:
+        return None
+    now = pd.Timestamp(now or datetime.now(MARKET_TZ))
+    if now.tzinfo is not None:
+        now = now.tz_convert(MARKET_TZ).tz_localize(None)
+    today = now.normalize()
+    key = _key(initial_capital, params, rules)
+    checkpoint = store.read(symbol)
+    rules = None if rules is None else compile_rules(rules)
+    tail_bars = max([TAIL_BARS] + [window - 1 for window in (rules.windows if rules else [])])
+
+    if _usable(checkpoint, key, closes):
+        last_date = checkpoint['state']['last_date']
+        tail = pd.Series(checkpoint['tail_closes'], index=pd.DatetimeIndex(checkpoint['tail_dates']))
+        history = pd.concat([tail, closes[closes.index > last_date]])
+        bars = add_moving_averages(history.to_frame('Close')).loc[lambda df: df.index > last_date]
+        state, trades, origin, last = checkpoint['state'], checkpoint['trades'], checkpoint['origin'], checkpoint['last']
+        resumed, save = True, True
+    else:
+        history = closes
+        bars = add_moving_averages(history.to_frame('Close'))
+        if bars.empty:
+            return None
+        state, trades, origin, last = None, [], str(closes.index[0].date()), None
+        # A scan that ends before an existing checkpoint must not roll it back
+        resumed = False
+        save = checkpoint is None or checkpoint['state']['last_date'] <= closes.index[-1]
+    extra = rules.indicators(history, bars.index) if rules else {}
+    if extra:
+        bars = bars.assign(**extra)
+
+    def step(frame, state):
+        return run_backtest(frame.index.to_numpy(), frame['Close'].values, frame['30DMA'].values, frame['50DMA'].values,
+                            frame['200DMA'].values, initial_capital, cap_allocation=False, close_out=False,
+                            state=state, rules=rules, indicators={name: frame[name].values for name in extra}, **params)
+
+    settled, live = bars[bars.index < today], bars[bars.index >= today]
+    if len(settled):
+        result = step(settled, state)
+        state = result['state']
+        trades = trades + result['trade_history'].rows()
+        last = {k: float(v) for k, v in settled.iloc[-1][['Close', '30DMA', '50DMA', '200DMA']].items()}
+        if save:
+            cutoff = state['last_date'] - timedelta(days=KEEP_TRADE_DAYS)
+            tail = history[history.index < today].iloc[-tail_bars:]
+            store.write(symbol, {'key': key, 'origin': origin, 'state': state, 'last': last,
+                                 'trades': [t for t in trades if t[0] > cutoff],
+                                 'tail_dates': [str(d.date()) for d in tail.index], 'tail_closes': tail.tolist()})
+    if len(live):
+        trades = trades + step(live, state)['trade_history'].rows()
+        last = {k: float(v) for k, v in live.iloc[-1][['Close', '30DMA', '50DMA', '200DMA']].items()}
+    return {'trades': trades, 'last': last, 'resumed': resumed}
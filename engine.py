@@ -0,0 +1,533 @@
+"""DMA strategy engine, free of Streamlit and of module-level state.
+
+`run_backtest` is the fast path: the signal masks of a rule set (rules.py, the app's strategy by
+default) and the running peak are computed with NumPy over the whole series, and the stepper
+only visits bars where a buy could fire or a sell passes its profit and cool-off checks, which is
+where the path-dependent state actually changes; interest on idle cash is booked in a tight loop
+over plain floats between those bars.
+`run_reference` is the original bar-by-bar loop built on `perform_buy` / `perform_sell`.
+Every run owns its portfolio, cool-off and ledger, so runs can be repeated or parallelised.
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import chain, repeat
+from math import nan
+
+import numpy as np
+import pandas as pd
+
+from ledger import BUY, INTEREST, MAINTENANCE, SELL, Ledger
+from rules import DEFAULT as DEFAULT_RULES, compile_rules
+
+DAY_NS = 86_400_000_000_000
+SCAN_SELL_BARS = 16  # sell bars checked one at a time before the rest up to the next buy are checked at once
+
+# Sidebar defaults of the app, keyed like run_backtest's arguments
+DEFAULT_PARAMS = {
+    'profit_threshold': 100,
+    'sell_pct': 0.01,
+    'drop_threshold': 0.15,
+    'strong_buy_allocation': 0.15,
+    'moderate_buy_allocation': 0.01,
+    'maintenance_fee': 0.15,
+    'interest_rate_pct': 8.25,
+}
+WARMUP_DAYS = 365
+
+
+def new_portfolio(initial_capital):
+    return {'cash': initial_capital, 'units': 0, 'last_buy_price': None, 'history': [],
+            'cooloff_until': datetime(1970, 1, 1, 0, 0)}
+
+
+def perform_buy(date, portfolio, allocation, price, buy_type, maintenance_fee, initial_capital, trade_history):
+    units = int(allocation / price)
+    if units >= 1:
+        portfolio['units'] += units
+        buy_amt = units * price
+        portfolio['cash'] -= buy_amt
+        portfolio['last_buy_price'] = price
+        trade_history.record(date, 'Buy', buy_type, units, price, portfolio['cash'], price * portfolio['units'] + portfolio['cash'])
+
+        # Maintenance fee
+        fee = (buy_amt * maintenance_fee) / 100
+        portfolio['cash'] -= fee
+        trade_history.record(date, 'Maintenance', 'Fees', 1, fee, portfolio['cash'], price * portfolio['units'] + portfolio['cash'])
+
+    return portfolio, trade_history
+
+
+def perform_sell(date, portfolio, sell_pct, price, trade_history, sell_type='Profit_Taking', cooloff_days=5):
+    # The cool-off lives in the portfolio, not a global, so concurrent runs don't block each other's sells
+    if date < portfolio['cooloff_until']:
+        return portfolio, trade_history
+    portfolio['cooloff_until'] = date + timedelta(days=cooloff_days)  # Don't allow sale till next 5 days.
+
+    units_to_sell = int(portfolio['units'] * sell_pct)
+    if units_to_sell >= 1:
+        portfolio['units'] -= units_to_sell
+        sell_amt = units_to_sell * price
+        portfolio['cash'] += sell_amt
+        trade_history.record(date, 'Sell', sell_type, units_to_sell, price, portfolio['cash'], price * portfolio['units'] + portfolio['cash'])
+
+    return portfolio, trade_history
+
+
+def add_moving_averages(df):
+    """Add the 30/50/200-day moving averages and drop the warm-up rows."""
+    df = df.copy()
+    df['30DMA'] = df['Close'].rolling(window=30).mean()
+    df['50DMA'] = df['Close'].rolling(window=50).mean()
+    df['200DMA'] = df['Close'].rolling(window=200).mean()
+    return df.dropna()
+
+
+def signal_masks(close_prices, dma30_values, dma50_values, dma200_values, drop_threshold, initial_peak=None):
+    """Boolean Strong / Moderate buy and Sell masks, plus the running peak (seeded with `initial_peak`).
+
+    Works along the first axis, so date x symbol matrices get one peak per symbol; NaN bars (no
+    price) never signal and do not reset the peak.
+    """
+    peak_prices = np.fmax.accumulate(close_prices, axis=0)
+    if initial_peak is not None:
+        peak_prices = np.maximum(peak_prices, initial_peak)
+    dip = close_prices <= peak_prices * (1 - drop_threshold)
+    strong = (dma200_values > dma50_values) & (dma50_values > close_prices) & dip
+    moderate = ~strong & (dma50_values > dma30_values) & (dma30_values > close_prices) & dip
+    sell = (close_prices > dma50_values) & (dma50_values > dma200_values)
+    return strong, moderate, sell, peak_prices
+
+
+def _resume(portfolio, result, state):
+    """Seed a fresh run's portfolio and result from an earlier run's `state`."""
+    if state is not None:
+        portfolio.update(cash=state['cash'], units=state['units'], last_buy_price=state['last_buy_price'],
+                         cooloff_until=state['cooloff_until'])
+        result['initial_price'], result['initial_date'] = state['initial_price'], state['initial_date']
+
+
+def _end_state(result, peak, last_date, state):
+    """What a later run needs to carry on where this one stopped (see run_backtest's `state`)."""
+    portfolio = result['portfolio']
+    if last_date is None:
+        last_date = state['last_date'] if state else None
+    else:
+        last_date = pd.Timestamp(last_date).to_pydatetime()
+    initial_date = result['initial_date']
+    result['state'] = {
+        'cash': portfolio['cash'], 'units': portfolio['units'], 'last_buy_price': portfolio['last_buy_price'],
+        'cooloff_until': portfolio['cooloff_until'], 'peak': peak, 'last_date': last_date,
+        'initial_price': None if result['initial_price'] is None else float(result['initial_price']),
+        'initial_date': None if initial_date is None else pd.Timestamp(initial_date).to_pydatetime(),
+    }
+    return result
+
+
+def close_position(result, date, price):
+    """Sell every remaining unit at `price` (the Final_Exit row), as run_backtest's `close_out` does.
+
+    For callers that run with close_out=False and liquidate afterwards; `result['state']` is
+    updated to match.
+    """
+    portfolio = result['portfolio']
+    if portfolio['units'] > 0:
+        portfolio['cash'] += portfolio['units'] * price
+        portfolio['units'] = 0
+        result['trade_history'].record(date, 'Sell', 'Final_Exit', 0, price, portfolio['cash'], price * 0.0 + portfolio['cash'])
+        result['state'].update(cash=portfolio['cash'], units=0)
+    return result
+
+
+def _book_rows(ledger, trades, interest, ns, days, close):
+    """Write a run's trade rows, tuples led by their bar, and Interest rows to `ledger` in bar order.
+
+    `interest` is (first bar accrued, cash after each bar's interest from there on with NaN where
+    none was booked, units held before the first trade, type code, daily rate) as run_backtest's
+    accrual kept it; the other columns, the units held on each bar included, are derived here with
+    the same IEEE arithmetic as the per-bar step. A bar's Interest row comes before its trades.
+    """
+    first, cash, units, interest_type, rate = interest
+    cash = np.array(cash, dtype=np.float64)
+    bars = first + np.flatnonzero(~np.isnan(cash))
+    cash = cash[bars - first]
+    block = np.fromiter(chain.from_iterable(trades), np.float64, 7 * len(trades)).reshape(-1, 7)
+    trade_bars = block[:, 0].astype(np.intp)
+    signed = block[:, 3] * ((block[:, 1] == BUY).astype(np.float64) - (block[:, 1] == SELL))
+    held = units + np.concatenate([[0.0], np.cumsum(signed)])
+    units = held[np.searchsorted(trade_bars, bars, 'left')]
+    order = np.argsort(np.concatenate([bars, trade_bars]), kind='stable')
+    columns = [np.concatenate([np.full(len(bars), INTEREST), block[:, 1]]),
+               np.concatenate([np.full(len(bars), interest_type), block[:, 2]]),
+               np.concatenate([days[bars], block[:, 3]]),
+               np.concatenate([cash * rate, block[:, 4]]),
+               np.concatenate([cash, block[:, 5]]),
+               np.concatenate([close[bars] * units + cash, block[:, 6]])]
+    ledger.extend_columns(ns[np.concatenate([bars, trade_bars])[order]], *(column[order] for column in columns))
+
+
+def run_backtest(dates, close_prices, dma30_values, dma50_values, dma200_values, initial_capital,
+                 profit_threshold, sell_pct, drop_threshold, strong_buy_allocation, moderate_buy_allocation,
+                 maintenance_fee, start_date=None, interest_rate_pct=None, cap_allocation=True,
+                 close_out=True, cooloff_days=5, state=None, interest_period=None, initial_peak=None, rules=None,
+                 indicators=None):
+    """Backtest one symbol and return its portfolio and trade ledger.
+
+    Bars before `start_date` only feed the running peak. `interest_rate_pct=None` disables
+    interest on idle cash; `cap_allocation` shrinks a buy to the cash on hand; `close_out`
+    liquidates remaining units on the last bar (the Final_Exit row). `trade_history` is a
+    ledger.Ledger; `interest_period` ('M', ...) has it keep one Interest row per period.
+
+    `result['state']` holds the end-of-run cash, units, last buy price, cool-off, running peak and
+    last date. Passing it back as `state` with the bars that followed continues that run (no
+    Muhurut buy, interest counted from the last date) and leaves only the new trades in the ledger.
+    A fresh run's running peak can be seeded with `initial_peak`, the highest close of bars
+    before these (see streaming.py).
+
+    `rules` is a rules.py rule set (default: the app's strategy, rules.DEFAULT_RULES) whose knobs
+    are this call's arguments; `indicators` supplies {'NDMA': values} for windows it uses beyond
+    the 30/50/200 DMAs given.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    close_array = np.asarray(close_prices, dtype=float)
+    n = len(close_array)
+    rules = DEFAULT_RULES if rules is None else compile_rules(rules)
+    knobs = {'profit_threshold': profit_threshold, 'sell_pct': sell_pct, 'drop_threshold': drop_threshold,
+             'strong_buy_allocation': strong_buy_allocation, 'moderate_buy_allocation': moderate_buy_allocation,
+             'maintenance_fee': maintenance_fee, 'cooloff_days': cooloff_days}
+    columns = {'Close': close_array, '30DMA': np.asarray(dma30_values, dtype=float),
+               '50DMA': np.asarray(dma50_values, dtype=float), '200DMA': np.asarray(dma200_values, dtype=float),
+               **(indicators or {})}
+    buy_masks, sell, peak_prices = rules.masks(columns, knobs, initial_peak if state is None else state['peak'])
+    profit_threshold, sell_pct, cooloff_days = (rules.value(rules.sell[k], knobs) for k in ('profit', 'pct', 'cooloff_days'))
+    peak = float(peak_prices[-1]) if n else (state['peak'] if state else None)
+
+    s = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), 'left'))
+    portfolio = new_portfolio(initial_capital)
+    trade_history = Ledger(interest_period)
+    result = {'portfolio': portfolio, 'trade_history': trade_history, 'initial_price': -1,
+              'initial_date': dates[0] if n else None, 'final_price': close_array[-1] if n else None}
+    _resume(portfolio, result, state)
+    if s >= n:
+        return _end_state(result, peak, dates[-1] if n else None, state)
+
+    # Plain Python scalars from here on: same IEEE arithmetic as NumPy scalars, a fraction of the cost.
+    close = close_array.tolist()
+    ns_array = dates.view(np.int64)
+    ns = ns_array.tolist()
+    days_array = np.zeros(n, dtype=np.int64)
+    days_array[s + 1:] = np.diff(ns_array[s:]) // DAY_NS
+    if state is not None and state['last_date'] is not None:
+        days_array[s] = (ns[s] - pd.Timestamp(state['last_date']).value) // DAY_NS
+    days = days_array.tolist()
+    rate = 0.0 if interest_rate_pct is None else interest_rate_pct / 100 / 365
+    book_interest = trade_history.interest
+    coalesce = trade_history.interest_period is not None
+    # Trade rows, led by their bar, collect in a plain list and Interest rows, one on almost every
+    # bar of idle cash, only as the cash after booking (NaN on bars booking none); _book_rows
+    # derives the rest and hands them all to the ledger when the run ends. A ledger that coalesces
+    # interest takes each row as it comes instead, to keep the order.
+    rows, booked_cash = [], []
+    add = (lambda row: trade_history.append(ns[row[0]], *row[1:])) if coalesce else rows.append
+    muhurut = trade_history.type_code('Muhurut')
+    rule_types = [trade_history.type_code(rule['type']) for rule in rules.buy]
+    fees, profit_taking, final_exit, interest_type = map(
+        trade_history.type_code, ['Fees', rules.sell['type'], 'Final_Exit', f"{interest_rate_pct}%"])
+    fee_factor = maintenance_fee / 100
+    cooloff_step = cooloff_days * DAY_NS
+
+    # A resumed run books interest on its first bar too; a fresh one starts its clock there
+    accrued = s if state is None else s - 1
+    cash, units, last_buy_price = portfolio['cash'], portfolio['units'], portfolio['last_buy_price']
+    first_units, first_accrued = units, accrued + 1
+
+    # Muhurut: one unit (an allocation of one close) on the first traded bar.
+    if state is None:
+        result['initial_price'], result['initial_date'] = close_array[s], dates[s]
+        price = close[s]
+        bought = int(price / price)
+        if bought >= 1:
+            units += bought
+            buy_amt = bought * price
+            cash -= buy_amt
+            last_buy_price = price
+            add((s, BUY, muhurut, bought, price, cash, price * units + cash))
+            fee = (buy_amt * maintenance_fee) / 100
+            cash -= fee
+            add((s, MAINTENANCE, fees, 1, fee, cash, price * units + cash))
+
+    # The buy rule firing on each bar (-1: none) and its allocation. A capped allocation never
+    # exceeds the uncapped one, so bars where even the full allocation buys less than one unit can
+    # never trade and are dropped up front.
+    allocations = [initial_capital * rules.value(rule['allocation'], knobs) for rule in rules.buy]
+    bar_rule = np.full(n, -1, dtype=np.intp)
+    for i, mask in enumerate(buy_masks):
+        bar_rule[mask] = i
+    viable = (bar_rule >= 0) & (np.array(allocations + [0.0])[bar_rule] / close_array >= 1)
+    buy_array = s + np.flatnonzero(viable[s:])
+    buy_bars = buy_array.tolist()
+    buy_closes, buy_rules = close_array[buy_array], bar_rule[buy_array]
+    sell_array = s + np.flatnonzero(sell[s:])
+    sell_bars = sell_array.tolist()
+    sell_ns, sell_closes = ns_array[sell_array], close_array[sell_array]
+    # As in the original if/elif, a bar a buy rule fires on is a buy bar while there is cash, even
+    # when it buys nothing or was dropped above; only a rule set whose buy and sell chains overlap
+    # has such sell bars.
+    blocked = bool((sell[s:] & (bar_rule[s:] >= 0)).any())
+    sell_free = bar_rule[sell_array] < 0
+    free_bars, buy_rule_list = sell_free.tolist(), buy_rules.tolist()
+    buy_count, sell_count = len(buy_bars), len(sell_bars)
+    max_gap = int(days_array[s:].max())  # no bar books interest on less cash than 1 / (rate * max_gap)
+    cooloff = pd.Timestamp(portfolio['cooloff_until']).value
+    starved = False
+    pos, b, c = s, 0, 0
+    while True:
+        if cash <= 0:
+            # Interest cannot make cash positive again; only a sell can.
+            next_buy = n
+        elif starved and cash * rate * max_gap <= 1:
+            # The last buy failed for lack of cash, and there is too little to ever book interest, so
+            # cash stays frozen until the next trade and the next bar whose capped allocation still
+            # buys a unit can be found in one pass.
+            capped = (1 - fee_factor) * cash
+            allocation = np.take([capped if cash < (1 + fee_factor) * a else a for a in allocations], buy_rules[b:])
+            hits = np.flatnonzero(allocation / buy_closes[b:] >= 1)
+            bi = b + int(hits[0]) if len(hits) else buy_count
+            next_buy = buy_bars[bi] if bi < buy_count else n
+        else:
+            bi = b
+            next_buy = buy_bars[b] if b < buy_count else n
+
+        # First sell bar before next_buy that passes the cool-off and profit checks (none when
+        # the next bar is a buy bar).
+        next_sell = n
+        if next_buy > pos and units > 0 and last_buy_price is not None:
+            c = bisect_left(sell_bars, pos, c)
+            scan_end = c + SCAN_SELL_BARS
+            while c < sell_count and sell_bars[c] < next_buy:
+                if c == scan_end:
+                    # A long run of sell bars failing the checks (held below the profit target, say):
+                    # the same checks, element by element, over the rest of it
+                    hi = bisect_left(sell_bars, next_buy, c)
+                    ok = (sell_ns[c:hi] >= cooloff) & ((sell_closes[c:hi] - last_buy_price) / last_buy_price * 100
+                                                       >= profit_threshold)
+                    if blocked and cash > 0:
+                        ok &= sell_free[c:hi]
+                    hit = int(ok.argmax())
+                    if ok[hit]:
+                        c += hit
+                        next_sell = sell_bars[c]
+                    else:
+                        c = hi
+                    break
+                j = sell_bars[c]
+                if blocked and cash > 0 and not free_bars[c]:
+                    c += 1
+                    continue
+                if ns[j] >= cooloff and (close[j] - last_buy_price) / last_buy_price * 100 >= profit_threshold:
+                    next_sell = j
+                    break
+                c += 1
+
+        k = next_sell if next_sell < next_buy else next_buy
+        done = k >= n
+        if done:
+            # No trade left: only the interest up to the last bar
+            k = n - 1
+
+        # Interest on idle cash for bars accrued+1..k, exactly as the app's per-bar step books it.
+        if rate:
+            if coalesce:
+                for j in range(accrued + 1, k + 1):
+                    interest_income = cash * rate * days[j]
+                    if interest_income > 1:
+                        cash += interest_income
+                        book_interest(ns[j], interest_type, days[j], cash * rate, interest_income, cash,
+                                      close[j] * units + cash)
+            elif k == accrued + 1:
+                # One bar (a buy on the bar after the last trade, say)
+                interest_income = cash * rate * days[k]
+                if interest_income > 1:
+                    cash += interest_income
+                    booked_cash.append(cash)
+                else:
+                    booked_cash.append(nan)
+            elif cash * rate * max_gap > 1:
+                for day in days[accrued + 1:k + 1]:
+                    interest_income = cash * rate * day
+                    if interest_income > 1:
+                        cash += interest_income
+                        booked_cash.append(cash)
+                    else:
+                        booked_cash.append(nan)
+            else:
+                booked_cash.extend(repeat(nan, k - accrued))
+        accrued = k
+        if done:
+            break
+
+        if k == next_sell:
+            cooloff = ns[k] + cooloff_step
+            units_to_sell = int(units * sell_pct)
+            if units_to_sell >= 1:
+                starved = False
+                price = close[k]
+                units -= units_to_sell
+                cash += units_to_sell * price
+                add((k, SELL, profit_taking, units_to_sell, price, cash, price * units + cash))
+            b = bisect_left(buy_bars, k + 1, b)
+        else:
+            # A buy bar is only picked while cash > 0, and interest never changes the sign of cash.
+            price = close[k]
+            rule = buy_rule_list[bi]
+            b = bi + 1
+            allocation = allocations[rule]
+            if cap_allocation and cash < (1 + fee_factor) * allocation:
+                allocation = (1 - fee_factor) * cash
+                starved = allocation < price
+            bought = int(allocation / price)
+            if bought >= 1:
+                units += bought
+                buy_amt = bought * price
+                cash -= buy_amt
+                last_buy_price = price
+                add((k, BUY, rule_types[rule], bought, price, cash, price * units + cash))
+                fee = (buy_amt * maintenance_fee) / 100
+                cash -= fee
+                add((k, MAINTENANCE, fees, 1, fee, cash, price * units + cash))
+        pos = k + 1
+
+    if close_out and units > 0:
+        last_price = close[-1]
+        cash += units * last_price
+        units = 0
+        add((n - 1, SELL, final_exit, 0, last_price, cash, last_price * 0.0 + cash))
+    if not coalesce:
+        interest = (first_accrued, booked_cash, first_units, interest_type, rate)
+        _book_rows(trade_history, rows, interest, ns_array, days_array, close_array)
+
+    portfolio.update(cash=cash, units=units, last_buy_price=last_buy_price)
+    if cooloff:
+        portfolio['cooloff_until'] = pd.Timestamp(cooloff).to_pydatetime()
+    return _end_state(result, peak, dates[-1], state)
+
+
+def run_reference(dates, close_prices, dma30_values, dma50_values, dma200_values, initial_capital,
+                  profit_threshold, sell_pct, drop_threshold, strong_buy_allocation, moderate_buy_allocation,
+                  maintenance_fee, start_date=None, interest_rate_pct=None, cap_allocation=True,
+                  close_out=True, cooloff_days=5, state=None, interest_period=None):
+    """The app's original bar-by-bar loop; same arguments and result as run_backtest."""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    portfolio = new_portfolio(initial_capital)
+    trade_history = Ledger(interest_period)
+    result = {'portfolio': portfolio, 'trade_history': trade_history, 'initial_price': -1,
+              'initial_date': dates[0] if len(dates) else None,
+              'final_price': close_prices[-1] if len(close_prices) else None}
+    _resume(portfolio, result, state)
+    daily_interest_rate = 0.0 if interest_rate_pct is None else interest_rate_pct / 100 / 365
+    start = None if start_date is None else pd.Timestamp(start_date)
+    last_date = -1
+    peak_price = -1
+    muhurth = 1
+    if state is not None:
+        muhurth = 0
+        peak_price = state['peak']
+        if state['last_date'] is not None:
+            last_date = pd.Timestamp(state['last_date'])
+    price = None
+
+    for i in range(len(dates)):
+        if peak_price < close_prices[i]:
+            peak_price = close_prices[i]
+
+        #Skip past dates.
+        date = pd.Timestamp(dates[i])
+        if start is not None and date < start:
+            continue
+
+        if muhurth:
+            muhurth = 0
+            result['initial_price'], result['initial_date'] = close_prices[i], dates[i]
+            perform_buy(date, portfolio, close_prices[i], close_prices[i], 'Muhurut', maintenance_fee, initial_capital, trade_history)
+
+        price = close_prices[i]
+        dma30 = dma30_values[i]
+        dma50 = dma50_values[i]
+        dma200 = dma200_values[i]
+
+        days = 0
+        if last_date == -1:
+            last_date = date
+        else:
+            days = (date - last_date).days
+            last_date = date
+
+        if days > 0 and daily_interest_rate:
+            interest_income = portfolio['cash'] * daily_interest_rate * days
+            if interest_income > 1:
+                portfolio['cash'] += interest_income
+                trade_history.interest(date.value, trade_history.type_code(f"{interest_rate_pct}%"), days,
+                                       portfolio['cash'] * daily_interest_rate, interest_income, portfolio['cash'],
+                                       price * portfolio['units'] + portfolio['cash'])
+
+        if dma200 > dma50 > price and portfolio['cash'] > 0 and price <= peak_price * (1 - drop_threshold):
+            allocation = initial_capital * strong_buy_allocation
+            if cap_allocation and portfolio['cash'] < (1 + (maintenance_fee / 100)) * allocation:
+                allocation = (1 - (maintenance_fee / 100)) * portfolio['cash']
+            perform_buy(date, portfolio, allocation, price, 'Strong', maintenance_fee, initial_capital, trade_history)
+
+        # Moderate Buy
+        elif dma50 > dma30 > price and portfolio['cash'] > 0 and price <= peak_price * (1 - drop_threshold):
+            allocation = initial_capital * moderate_buy_allocation
+            if cap_allocation and portfolio['cash'] < (1 + (maintenance_fee / 100)) * allocation:
+                allocation = (1 - (maintenance_fee / 100)) * portfolio['cash']
+            perform_buy(date, portfolio, allocation, price, 'Moderate', maintenance_fee, initial_capital, trade_history)
+
+        # Sell
+        elif portfolio['units'] > 0 and portfolio['last_buy_price'] is not None and price > dma50 > dma200:
+            pct_change = (price - portfolio['last_buy_price']) / portfolio['last_buy_price'] * 100
+            if pct_change >= profit_threshold:
+                perform_sell(date, portfolio, sell_pct, price, trade_history, cooloff_days=cooloff_days)
+
+    # Close remaining positions
+    if close_out and portfolio['units'] > 0:
+        last_price = float(close_prices[-1])
+        portfolio['cash'] += portfolio['units'] * last_price
+        portfolio['units'] = 0.0
+        trade_history.record(dates[-1], 'Sell', 'Final_Exit', portfolio['units'], last_price, portfolio['cash'],
+                             price * portfolio['units'] + portfolio['cash'])
+        portfolio['units'] = 0
+    return _end_state(result, None if peak_price == -1 else float(peak_price), dates[-1] if len(dates) else None, state)
+
+
+def backtest_frame(df, initial_capital, params, start_date=None, engine=run_backtest, **options):
+    """Run `engine` on an OHLCV frame, adding the moving averages first if they are missing."""
+    if '200DMA' not in df:
+        df = add_moving_averages(df)
+    return engine(df.index.to_numpy(), df['Close'].values, df['30DMA'].values, df['50DMA'].values,
+                  df['200DMA'].values, initial_capital, start_date=start_date, **{**params, **options})
+
+
+def summarize(result, initial_capital, start_date, end_date):
+    """Headline numbers the app reports for one run: final value, CAGR, trade count, buy-and-hold."""
+    final_value = result['portfolio']['cash']
+    years = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days / 365.25
+    trades = result['trade_history'].count('Buy', 'Sell')
+    initial_price, final_price = result['initial_price'], result['final_price']
+    buy_hold_value = initial_capital / initial_price * final_price if initial_price and initial_price > 0 else float('nan')
+
+    def annualized(value):
+        if years <= 0 or initial_capital <= 0 or not value > 0:
+            return float('nan')
+        return ((value / initial_capital) ** (1 / years) - 1) * 100
+
+    cagr, buy_hold_cagr = annualized(final_value), annualized(buy_hold_value)
+    return {
+        'final_value': final_value,
+        'profit': final_value - initial_capital,
+        'return_pct': (final_value / initial_capital - 1) * 100,
+        'cagr_pct': cagr,
+        'trades': trades,
+        'buy_hold_value': buy_hold_value,
+        'buy_hold_cagr_pct': buy_hold_cagr,
+        'outperformance_pct': cagr - buy_hold_cagr,
+    }
@@ -0,0 +1,159 @@
+"""Export of results for analytics jobs: ledgers, daily equity curves, summaries and TradeToday scans.
+
+    with Exporter('exports/run-1') as exporter:
+        exporter.write('ledger', ledger_table(result['trade_history'], symbol='INFY.NS'))
+        exporter.write('equity', equity_table(result, dates, closes, capital, symbol='INFY.NS'))
+
+Each table is one file under the export directory, <table>.parquet, or <table>.csv when
+pyarrow is missing or CSV is asked for. Tables are written incrementally: every write() appends
+a row group to the Parquet file (or rows to the CSV, a chunk at a time), so a universe-wide run
+can export symbol by symbol without keeping the results in memory. Values keep full precision,
+dates stay dates and codes are spelled out; nothing is rounded or formatted for display.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from ledger import ACTIONS, BUY, SELL
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV only
+    pa = pq = None
+
+FORMATS = ['parquet', 'csv']
+CSV_CHUNK_ROWS = 50_000
+# A TradeToday entry's last-bar values and their scan table columns
+SCAN_LAST_COLUMNS = {'Close': 'last_close', '30DMA': 'last_dma30', '50DMA': 'last_dma50', '200DMA': 'last_dma200'}
+
+
+def default_format():
+    return 'parquet' if pq is not None else 'csv'
+
+
+def ledger_table(ledger, **keys):
+    """The ledger's rows at full precision, after a column for each of `keys` (symbol=..., ...)."""
+    cols = ledger.columns()
+    table = pd.DataFrame({
+        'date': cols['dates'],
+        'action': np.array(ACTIONS, dtype=object)[cols['actions']],
+        'type': np.array(ledger.types, dtype=object)[cols['types']],
+        'units': cols['units'],
+        'price': cols['price'],
+        'cash': cols['cash'],
+        'value': cols['total'],
+    })
+    for i, (key, value) in enumerate(keys.items()):
+        table.insert(i, key, value)
+    return table
+
+
+def equity_table(result, dates, closes, initial_capital, start_date=None, **keys):
+    """Daily close, units held, cash and value (cash plus holdings) of a run_backtest result.
+
+    `dates` and `closes` are the bars the run was given; the curve starts at `start_date`. Each
+    day shows the position after that day's ledger rows, so it is exact when every interest
+    accrual has its own row (no `interest_period`); with coalesced interest the cash between
+    rows leaves out interest not yet booked.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    closes = np.asarray(closes, dtype=float)
+    s = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), 'left'))
+    ledger = result['trade_history']
+    cols = ledger.columns()
+    change = np.where(cols['actions'] == BUY, cols['units'], np.where(cols['actions'] == SELL, -cols['units'], 0))
+    held = np.cumsum(change)
+    if 'Final_Exit' in ledger.types:
+        # The final exit row sells everything but records no units
+        held[cols['types'] == ledger.types.index('Final_Exit')] = 0
+    # Position after the last row on or before each day; entry 0 is the opening position
+    row = np.searchsorted(cols['dates'], dates[s:], 'right')
+    cash = np.r_[float(initial_capital), cols['cash']][row]
+    units = np.r_[0, held].astype(np.int64)[row]
+    table = pd.DataFrame({'date': dates[s:], 'close': closes[s:], 'units': units, 'cash': cash,
+                          'value': cash + units * closes[s:]})
+    for i, (key, value) in enumerate(keys.items()):
+        table.insert(i, key, value)
+    return table
+
+
+def scan_table(entry, **keys):
+    """A TradeToday entry's recent buys (scheduler.TodayStore), with its last close and DMAs on every row.
+
+    The trades come from checkpoints, which keep the ledger's cash position as its display text.
+    """
+    table = pd.DataFrame(entry['buys'], columns=['date', 'action', 'type', 'units', 'price', 'cash_position'])
+    table['date'] = pd.to_datetime(table['date'])
+    last = entry['last'] or {}
+    for name, column in SCAN_LAST_COLUMNS.items():
+        table[column] = float(last[name]) if last.get(name) is not None else np.nan
+    table['resumed'] = bool(entry['resumed'])
+    table['pruned'] = bool(entry.get('pruned', False))
+    for i, (key, value) in enumerate(keys.items()):
+        table.insert(i, key, value)
+    return table
+
+
+def scan_status_table(entries):
+    """One row per TradeToday entry ({symbol: entry}): capital, last bar, when and how it was scanned."""
+    rows = []
+    for symbol, entry in entries.items():
+        last = entry['last'] or {}
+        rows.append({'symbol': symbol, 'capital': float(entry['capital']),
+                     'as_of': pd.Timestamp(entry['as_of']) if entry['as_of'] else pd.NaT,
+                     **{column: float(last[name]) if last.get(name) is not None else np.nan
+                        for name, column in SCAN_LAST_COLUMNS.items()},
+                     'buys': len(entry['buys']), 'scanned_at': pd.Timestamp(entry['scanned_at']),
+                     'resumed': bool(entry['resumed']), 'pruned': bool(entry.get('pruned', False)),
+                     'error': entry['error']})
+    return pd.DataFrame(rows)
+
+
+class Exporter:
+    """Writes named tables under `root`, appending to each on every write()."""
+
+    def __init__(self, root, fmt=None, csv_chunk_rows=CSV_CHUNK_ROWS):
+        fmt = fmt or default_format()
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown export format: {fmt}")
+        if fmt == 'parquet' and pq is None:
+            raise ValueError("Parquet export needs pyarrow; use the 'csv' format")
+        self.root = root
+        self.format = fmt
+        self.csv_chunk_rows = csv_chunk_rows
+        self.paths = {}
+        self._writers = {}
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, table, frame):
+        """Append `frame`'s rows to `table` (the first non-empty write fixes the table's columns)."""
+        if frame.empty:
+            return
+        path = self.paths.get(table)
+        if path is None:
+            path = self.paths[table] = os.path.join(self.root, f"{table}.{self.format}")
+            if os.path.exists(path):
+                os.remove(path)
+        if self.format == 'csv':
+            frame.to_csv(path, mode='a', header=not os.path.exists(path), index=False, chunksize=self.csv_chunk_rows)
+            return
+        writer = self._writers.get(table)
+        if writer is None:
+            arrow = pa.Table.from_pandas(frame, preserve_index=False)
+            writer = self._writers[table] = pq.ParquetWriter(path, arrow.schema)
+        else:
+            arrow = pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False)
+        writer.write_table(arrow)
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,396 @@
+"""Golden-output regression harness: every engine checked against the reference loop, with its speedup.
+
+    python harness.py                                   # synthetic fixtures, randomized parameters
+    python harness.py --fixtures INFY.csv TCS.parquet --windows 5 --sets 32
+    python harness.py --save golden.json.gz             # record the reference outputs
+    python harness.py --golden golden.json.gz           # check the engines against a recording
+
+engine.run_reference is the app's original bar-by-bar loop on perform_buy / perform_sell and
+defines the strategy: whole units per buy, the cool-off after each sell, maintenance fees, daily
+interest on idle cash and the Final_Exit close-out. Every faster engine has to reproduce it.
+A case is a fixture (a synthetic.synthetic_ohlcv symbol, or a recorded CSV / Parquet file with
+Date and Close columns), a random window of it with the app's warm-up, a capital, the
+cap_allocation / close_out options and --sets parameter sets drawn from GRID. ENGINES run
+every case:
+
+- fast: engine.run_backtest;
+- resumed: run_backtest stopped at a random bar and resumed from its state, as TradeToday's
+  checkpoints and streaming.py do;
+- lanes: lanes.run_lanes with the case's sets as one grid (it keeps no ledger, so only the final
+  cash, units, trade count and lanes.summarize_lanes are checked).
+
+Each fixture also gets a short case, its first SHORT_BARS bars, as a recent listing with too
+little history for the 200DMA: every engine must come back with an empty run, not an error.
+And it gets a case of every rule set in RULE_SETS, whose reference is run_rules_reference,
+the same loop with the rule set's conditions checked bar by bar; lanes, which only knows the
+built-in rules, sits those out.
+
+Ledgers are diffed row by row: dates, actions, types and units exactly, prices and cash within
+--rtol; so are the final cash and units, and engine.summarize's headline numbers (NaN matching
+NaN). The report gives each engine's runs, mismatches, time
+and speedup over the reference, and the exit status is 1 on any mismatch. --save records the
+cases, the reference outputs and times (gzipped for a .gz name); --golden checks against a recording
+instead of running the reference, so its speedups are against the recorded reference time.
+"""
+import argparse
+import gzip
+import json
+import platform
+import sys
+import time
+import zlib
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from engine import (WARMUP_DAYS, _end_state, add_moving_averages, new_portfolio, perform_buy, perform_sell,
+                    run_backtest, run_reference, summarize)
+from lanes import run_lanes, summarize_lanes
+from ledger import ACTIONS, Ledger
+from rules import COMPARISONS, compile_rules
+from synthetic import synthetic_ohlcv, universe
+
+# Values each knob of a parameter set is drawn from
+GRID = {
+    'profit_threshold': [1, 2, 5, 10, 25, 50, 100],
+    'sell_pct': [0.01, 0.05, 0.1, 0.2, 0.5, 1.0],
+    'drop_threshold': [0.0, 0.02, 0.05, 0.1, 0.15, 0.3],
+    'strong_buy_allocation': [0.01, 0.05, 0.15, 0.5, 1.0],
+    'moderate_buy_allocation': [0.01, 0.05, 0.15, 0.5],
+    'maintenance_fee': [0.0, 0.15, 1.0],
+    'interest_rate_pct': [None, 4.0, 8.25],
+    'cooloff_days': [0, 1, 5, 10],
+}
+CAPITALS = [10_000, 1_000_000, 60_000_000]  # small ones run out of cash, exercising allocation capping
+MIN_YEARS, MAX_YEARS = 1, 10  # window lengths
+SYNTHETIC = 'synthetic:'
+ATOL = 1e-6  # absolute slack on prices and cash, for runs that spend down to a few rupees
+SHORT_BARS = 150  # a short case's bars: fewer than the 200DMA needs
+SUMMARY_KEYS = ['final_value', 'buy_hold_value', 'cagr_pct', 'buy_hold_cagr_pct']
+# Rule sets (see rules.py) cases run instead of the built-in one. In 'overlap' the buy and sell
+# chains both hold on many bars, where the original if/elif precedence must decide: a bar a buy
+# rule fires on is a buy bar while there is cash, whether or not it buys a unit.
+RULE_SETS = {'overlap': compile_rules({
+    'buy': [{'type': 'Dip', 'when': '200DMA > Close', 'drop': 'drop_threshold', 'allocation': 'strong_buy_allocation'},
+            {'type': 'Trend', 'when': 'Close > 50DMA > 200DMA', 'allocation': 'moderate_buy_allocation'}],
+    'sell': {'type': 'Profit_Taking', 'when': 'Close > 30DMA', 'profit': 'profit_threshold', 'pct': 'sell_pct',
+             'cooloff_days': 'cooloff_days'},
+})}
+
+
+def load_fixture(name):
+    """Close series of a fixture: 'synthetic:SYMBOL' or a CSV / Parquet file with Date and Close."""
+    if name.startswith(SYNTHETIC):
+        return synthetic_ohlcv(name[len(SYNTHETIC):])['Close']
+    frame = pd.read_parquet(name) if name.endswith('.parquet') else pd.read_csv(name)
+    if 'Date' in frame.columns:
+        frame = frame.set_index('Date')
+    close = pd.Series(frame['Close'].to_numpy(dtype=float), index=pd.DatetimeIndex(pd.to_datetime(frame.index)))
+    return close.dropna().sort_index()
+
+
+def checksum(close):
+    return zlib.crc32(close.index.to_numpy(dtype='datetime64[ns]').tobytes() + close.to_numpy().tobytes())
+
+
+def make_cases(fixtures, windows, sets, seed=0):
+    """`windows` random cases of every {name: Close series} fixture, each with `sets` parameter sets,
+    then one of each RULE_SETS rule set and its short case."""
+    rng = np.random.default_rng(seed)
+
+    def draw(values):
+        return values[int(rng.integers(len(values)))]
+
+    cases = []
+    for name, close in fixtures.items():
+        first = close.index[0] + timedelta(days=WARMUP_DAYS)
+        span = (close.index[-1] - first).days
+        if span < 30:
+            raise ValueError(f"{name}: too little history for a window after the {WARMUP_DAYS}-day warm-up")
+        for rules in [None] * windows + list(RULE_SETS):
+            length = min(rng.uniform(MIN_YEARS, MAX_YEARS) * 365.25, span)
+            start = first + timedelta(days=int(rng.uniform(0, span - length)))
+            cases.append({'fixture': name, 'start': str(start.date()), 'end': str((start + timedelta(days=int(length))).date()),
+                          'capital': float(draw(CAPITALS)), 'cap_allocation': bool(rng.integers(2)),
+                          'close_out': bool(rng.integers(2)), 'split': float(rng.uniform(0.1, 0.9)),
+                          'sets': [{knob: draw(values) for knob, values in GRID.items()} for _ in range(sets)],
+                          **({'rules': rules} if rules else {})})
+        cases.append({'fixture': name, 'start': str(close.index[0].date()),
+                      'end': str(close.index[min(SHORT_BARS, len(close)) - 1].date()), 'capital': float(draw(CAPITALS)),
+                      'cap_allocation': True, 'close_out': True, 'split': 0.5,
+                      'sets': [{knob: draw(values) for knob, values in GRID.items()} for _ in range(sets)]})
+    return cases
+
+
+def case_bars(case, close):
+    """(dates, Close, 30DMA, 50DMA, 200DMA) arrays of a case's window and warm-up, as the app computes them."""
+    start = pd.Timestamp(case['start'])
+    window = close[(close.index >= start - timedelta(days=WARMUP_DAYS)) & (close.index <= pd.Timestamp(case['end']))]
+    df = add_moving_averages(window.to_frame('Close'))
+    return (df.index.to_numpy(), df['Close'].to_numpy(), df['30DMA'].to_numpy(), df['50DMA'].to_numpy(),
+            df['200DMA'].to_numpy())
+
+
+def _end(case):
+    """The exclusive end date summaries take, as in the app."""
+    return pd.Timestamp(case['end']) + timedelta(days=1)
+
+
+def outcome(result, case):
+    """What a run is checked on: its ledger columns, final cash and units, and its summary."""
+    ledger = result['trade_history']
+    cols = ledger.columns()
+    summary = summarize(result, case['capital'], case['start'], _end(case))
+    return {'summary': {k: float(summary[k]) for k in SUMMARY_KEYS}, 'dates': cols['dates'].view(np.int64).tolist(), 'actions': [ACTIONS[a] for a in cols['actions'].tolist()],
+            'types': [ledger.types[t] for t in cols['types'].tolist()], 'units': cols['units'].tolist(),
+            'price': cols['price'].tolist(), 'cash': cols['cash'].tolist(),
+            'final_cash': float(result['portfolio']['cash']), 'final_units': int(result['portfolio']['units'])}
+
+
+def _options(case):
+    return {'cap_allocation': case['cap_allocation'], 'close_out': case['close_out']}
+
+
+def _rules(case):
+    return {'rules': RULE_SETS[case['rules']]} if case.get('rules') else {}
+
+
+def run_rules_reference(dates, close_prices, dma30_values, dma50_values, dma200_values, initial_capital,
+                        profit_threshold, sell_pct, drop_threshold, strong_buy_allocation, moderate_buy_allocation,
+                        maintenance_fee, start_date=None, interest_rate_pct=None, cap_allocation=True,
+                        close_out=True, cooloff_days=5, rules=None):
+    """engine.run_reference's loop for a fresh run, with a rules.py rule set's conditions checked bar by bar."""
+    knobs = {'profit_threshold': profit_threshold, 'sell_pct': sell_pct, 'drop_threshold': drop_threshold,
+             'strong_buy_allocation': strong_buy_allocation, 'moderate_buy_allocation': moderate_buy_allocation,
+             'maintenance_fee': maintenance_fee, 'cooloff_days': cooloff_days}
+    sell_rule = rules.sell
+    profit_threshold, sell_pct, cooloff_days = (rules.value(sell_rule[k], knobs) for k in ('profit', 'pct', 'cooloff_days'))
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    portfolio = new_portfolio(initial_capital)
+    trade_history = Ledger()
+    result = {'portfolio': portfolio, 'trade_history': trade_history, 'initial_price': -1,
+              'initial_date': dates[0] if len(dates) else None,
+              'final_price': close_prices[-1] if len(close_prices) else None}
+    daily_interest_rate = 0.0 if interest_rate_pct is None else interest_rate_pct / 100 / 365
+    start = None if start_date is None else pd.Timestamp(start_date)
+    last_date, peak_price, muhurth = -1, -1, 1
+
+    def holds(chain, bar):
+        return all(COMPARISONS[op](bar.get(left, left), bar.get(right, right)) for left, op, right in chain)
+
+    for i in range(len(dates)):
+        if peak_price < close_prices[i]:
+            peak_price = close_prices[i]
+        date = pd.Timestamp(dates[i])
+        if start is not None and date < start:
+            continue
+        if muhurth:
+            muhurth = 0
+            result['initial_price'], result['initial_date'] = close_prices[i], dates[i]
+            perform_buy(date, portfolio, close_prices[i], close_prices[i], 'Muhurut', maintenance_fee, initial_capital, trade_history)
+        price = close_prices[i]
+        bar = {'Close': price, '30DMA': dma30_values[i], '50DMA': dma50_values[i], '200DMA': dma200_values[i]}
+        days = 0
+        if last_date == -1:
+            last_date = date
+        else:
+            days = (date - last_date).days
+            last_date = date
+        if days > 0 and daily_interest_rate:
+            interest_income = portfolio['cash'] * daily_interest_rate * days
+            if interest_income > 1:
+                portfolio['cash'] += interest_income
+                trade_history.interest(date.value, trade_history.type_code(f"{interest_rate_pct}%"), days,
+                                       portfolio['cash'] * daily_interest_rate, interest_income, portfolio['cash'],
+                                       price * portfolio['units'] + portfolio['cash'])
+
+        # The first buy rule that fires takes the bar, as the if/elif did; only then may it sell
+        fired = next((rule for rule in rules.buy if holds(rule['when'], bar) and (
+            rule['drop'] is None or price <= peak_price * (1 - rules.value(rule['drop'], knobs)))), None)
+        if fired is not None and portfolio['cash'] > 0:
+            allocation = initial_capital * rules.value(fired['allocation'], knobs)
+            if cap_allocation and portfolio['cash'] < (1 + (maintenance_fee / 100)) * allocation:
+                allocation = (1 - (maintenance_fee / 100)) * portfolio['cash']
+            perform_buy(date, portfolio, allocation, price, fired['type'], maintenance_fee, initial_capital, trade_history)
+        elif portfolio['units'] > 0 and portfolio['last_buy_price'] is not None and holds(sell_rule['when'], bar):
+            pct_change = (price - portfolio['last_buy_price']) / portfolio['last_buy_price'] * 100
+            if pct_change >= profit_threshold:
+                perform_sell(date, portfolio, sell_pct, price, trade_history, sell_rule['type'], cooloff_days)
+
+    if close_out and portfolio['units'] > 0:
+        last_price = float(close_prices[-1])
+        portfolio['cash'] += portfolio['units'] * last_price
+        portfolio['units'] = 0
+        trade_history.record(dates[-1], 'Sell', 'Final_Exit', 0.0, last_price, portfolio['cash'], portfolio['cash'])
+    return _end_state(result, None if peak_price == -1 else float(peak_price), dates[-1] if len(dates) else None, None)
+
+
+def per_set(engine):
+    """A harness engine running `engine` (run_backtest's signature) once per parameter set."""
+    def run(bars, case):
+        t0 = time.perf_counter()
+        results = [engine(*bars, case['capital'], start_date=case['start'], **_options(case), **_rules(case), **params)
+                   for params in case['sets']]
+        return time.perf_counter() - t0, [outcome(result, case) for result in results]
+    return run
+
+
+def run_resumed(bars, case):
+    """run_backtest up to a bar `split` of the way through the window, then on from its state."""
+    n = len(bars[0])
+    s = int(np.searchsorted(bars[0], np.datetime64(pd.Timestamp(case['start'])), 'left'))
+    k = s + 1 + int(case['split'] * max(n - s - 2, 0))  # at least one bar on either side of the split
+    if k >= n:
+        return per_set(run_backtest)(bars, case)
+    t0 = time.perf_counter()
+    runs = []
+    for params in case['sets']:
+        head = run_backtest(*(b[:k] for b in bars), case['capital'], start_date=case['start'],
+                            cap_allocation=case['cap_allocation'], close_out=False, **_rules(case), **params)
+        tail = run_backtest(*(b[k:] for b in bars), case['capital'], state=head['state'], **_options(case),
+                            **_rules(case), **params)
+        runs.append((head, tail))
+    elapsed = time.perf_counter() - t0
+    outcomes = []
+    for head, tail in runs:
+        first, second = outcome(head, case), outcome(tail, case)
+        ledger = {column: first[column] + second[column] for column in ('dates', 'actions', 'types', 'units', 'price', 'cash')}
+        outcomes.append({**ledger, 'final_cash': second['final_cash'], 'final_units': second['final_units']})
+    return elapsed, outcomes
+
+
+def run_lane_grid(bars, case):
+    if case.get('rules'):
+        return 0.0, None
+    t0 = time.perf_counter()
+    result = run_lanes(*bars, case['capital'], case['sets'], start_date=case['start'], **_options(case))
+    elapsed = time.perf_counter() - t0
+    summary = summarize_lanes(result, case['capital'], case['start'], _end(case))
+    return elapsed, [{'final_cash': float(cash), 'final_units': int(units), 'trades': int(trades),
+                      'summary': {k: float(summary[k][i]) for k in SUMMARY_KEYS}}
+                     for i, (cash, units, trades) in enumerate(zip(result['cash'], result['units'], result['trades']))]
+
+
+def run_references(bars, case):
+    return per_set(run_rules_reference if case.get('rules') else run_reference)(bars, case)
+
+
+REFERENCE = run_references
+ENGINES = {'fast': per_set(run_backtest), 'resumed': run_resumed, 'lanes': run_lane_grid}
+
+
+def _row(out, i):
+    return (str(pd.Timestamp(out['dates'][i]).date()), out['actions'][i], out['types'][i], out['units'][i],
+            out['price'][i], out['cash'][i])
+
+
+def diff(expected, actual, rtol):
+    """Why `actual` differs from the reference outcome `expected`, or None: the first ledger row, then the finals."""
+    if 'dates' in actual:
+        n = min(len(actual['dates']), len(expected['dates']))
+        bad = np.zeros(n, dtype=bool)
+        for column in ('dates', 'actions', 'types', 'units'):
+            bad |= np.array(actual[column][:n], dtype=object) != np.array(expected[column][:n], dtype=object)
+        for column in ('price', 'cash'):
+            bad |= ~np.isclose(actual[column][:n], expected[column][:n], rtol=rtol, atol=ATOL)
+        if bad.any():
+            i = int(np.argmax(bad))
+            return f"ledger row {i}: {_row(actual, i)} != {_row(expected, i)}"
+        if len(actual['dates']) != len(expected['dates']):
+            return f"{len(actual['dates'])} ledger rows != {len(expected['dates'])}"
+    if not np.isclose(actual['final_cash'], expected['final_cash'], rtol=rtol, atol=ATOL):
+        return f"final cash {actual['final_cash']!r} != {expected['final_cash']!r}"
+    if actual['final_units'] != expected['final_units']:
+        return f"final units {actual['final_units']} != {expected['final_units']}"
+    if 'trades' in actual:
+        trades = sum(action in ('Buy', 'Sell') for action in expected['actions'])
+        if actual['trades'] != trades:
+            return f"{actual['trades']} trades != {trades}"
+    if 'summary' in actual and 'summary' in expected:
+        for k in SUMMARY_KEYS:
+            if not np.isclose(actual['summary'][k], expected['summary'][k], rtol=rtol, atol=ATOL, equal_nan=True):
+                return f"{k} {actual['summary'][k]!r} != {expected['summary'][k]!r}"
+    return None
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + 't') if path.endswith('.gz') else open(path, mode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', nargs='+', help='recorded price files (default: --synthetic symbols)')
+    parser.add_argument('--synthetic', type=int, default=4, help='synthetic symbols to use without --fixtures')
+    parser.add_argument('--windows', type=int, default=3, help='random windows per fixture')
+    parser.add_argument('--sets', type=int, default=16, help='random parameter sets per window')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the windows and parameter sets')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES), help='engines to check')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='relative tolerance on prices and cash')
+    parser.add_argument('--save', help='record the cases and reference outputs to this JSON file')
+    parser.add_argument('--golden', help='check against a recording instead of running the reference')
+    parser.add_argument('--show', type=int, default=5, help='mismatches to print per engine')
+    args = parser.parse_args(argv)
+
+    if args.golden:
+        with _open(args.golden, 'r') as f:
+            golden = json.load(f)
+        fixtures = {name: load_fixture(name) for name in golden['fixtures']}
+        changed = [name for name, crc in golden['fixtures'].items() if checksum(fixtures[name]) != crc]
+        if changed:
+            parser.error(f"fixtures changed since {args.golden} was recorded: {', '.join(changed)}")
+        cases, expected, case_seconds = golden['cases'], golden['reference'], golden['case_seconds']
+    else:
+        names = args.fixtures or [SYNTHETIC + symbol for symbol in universe(args.synthetic)]
+        fixtures = {name: load_fixture(name) for name in names}
+        try:
+            cases = make_cases(fixtures, args.windows, args.sets, args.seed)
+        except ValueError as e:
+            parser.error(str(e))
+        expected, case_seconds = None, []
+
+    bars = [case_bars(case, fixtures[case['fixture']]) for case in cases]
+    if expected is None:
+        expected = []
+        for case, arrays in zip(cases, bars):
+            seconds, outcomes = REFERENCE(arrays, case)
+            case_seconds.append(seconds)
+            expected.append(outcomes)
+    reference_seconds = sum(case_seconds)
+    runs = sum(len(case['sets']) for case in cases)
+    simulated = sum(len(b[0]) * len(case['sets']) for case, b in zip(cases, bars))
+    print(f"{len(cases)} cases of {len(fixtures)} fixtures: {runs} runs, {simulated:,} bars")
+    print(f"{'engine':<22}{'runs':>7}{'mismatches':>12}{'seconds':>10}{'speedup':>10}")
+    print(f"{'reference' + (' (recorded)' if args.golden else ''):<22}{runs:>7}{'-':>12}{reference_seconds:>10.3f}{1:>9.1f}x")
+
+    failed = 0
+    for name in args.engines:
+        seconds, baseline, ran, mismatches = 0.0, 0.0, 0, []
+        for case, arrays, reference, reference_time in zip(cases, bars, expected, case_seconds):
+            elapsed, outcomes = ENGINES[name](arrays, case)
+            if outcomes is None:
+                continue  # a case this engine cannot run
+            seconds += elapsed
+            baseline += reference_time
+            ran += len(outcomes)
+            for i, (want, got) in enumerate(zip(reference, outcomes)):
+                why = diff(want, got, args.rtol)
+                if why:
+                    mismatches.append(f"{case['fixture']} {case['start']}..{case['end']} set {i} {case['sets'][i]}: {why}")
+        speedup = baseline / seconds if seconds else float('inf')
+        print(f"{name:<22}{ran:>7}{len(mismatches):>12}{seconds:>10.3f}{speedup:>9.1f}x")
+        for line in mismatches[:args.show]:
+            print(f"  {line}")
+        failed += len(mismatches)
+
+    if args.save:
+        with _open(args.save, 'w') as f:
+            json.dump({'platform': platform.platform(), 'python': platform.python_version(), 'case_seconds': case_seconds,
+                       'fixtures': {name: checksum(close) for name, close in fixtures.items()}, 'cases': cases,
+                       'reference': expected}, f)
+        print(f"reference outputs written to {args.save}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""Per-symbol indicator store: closes, 30/50/200-day moving averages and the running peak.
+
+Series live in growable NumPy buffers and are extended bar by bar in O(1): each moving average
+keeps pandas' own compensated running sum (the add/remove steps of rolling().mean()), so a series
+built here is bit-identical to rolling over the same bars, however it was grown. Readers get
+read-only views into the buffers, which run_backtest and the sweep take without copying. Appends
+only write past the stored bars; replace_last and trim, which rewrite stored ones, move to new
+buffers, so a view keeps the bars it was taken with.
+
+`compact_series` is the one-shot version for universe-wide runs (batch.py, portfolio.py): the
+Close and DMA columns of a frame in a single block, float64 or float32, with day-resolution
+dates and the warm-up trimmed off by slicing, instead of a DataFrame that carries OHLCV plus the
+DMA columns and is copied again by dropna(). `series_nbytes` reports what a set of series holds.
+"""
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import indicators as _symbols
+
+DMA_WINDOWS = (30, 50, 200)
+WARMUP_BARS = max(DMA_WINDOWS) - 1  # bars before the first one with every DMA defined
+SERIES = ['dates', 'Close', '30DMA', '50DMA', '200DMA', 'peak']
+COMPACT_SERIES = ['Close', '30DMA', '50DMA', '200DMA']
+DAY_NS = 86_400_000_000_000
+
+
+def _new_mean():
+    # nobs, sum, add compensation, remove compensation, negatives, run of equal values, previous value
+    return [0, 0.0, 0.0, 0.0, 0, 0, math.nan]
+
+
+class SymbolIndicators:
+    """Indicator series of one symbol. Only the last bar may be replaced (an intraday snapshot)."""
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self._dates = np.empty(capacity, dtype='datetime64[ns]')
+        self._values = {name: np.empty(capacity) for name in SERIES[1:]}
+        self._means = [_new_mean() for _ in DMA_WINDOWS]
+        self._peak = -math.inf
+        self._before_last = None
+
+    def _grow(self, need):
+        capacity = len(self._dates)
+        if need <= capacity:
+            return
+        capacity = max(need, 2 * capacity)
+        self._dates = np.resize(self._dates, capacity)
+        self._values = {name: np.resize(values, capacity) for name, values in self._values.items()}
+
+    def _detach(self, lo=0, hi=None):
+        # Fresh buffers holding bars lo:hi, leaving the old ones to the views handed out
+        hi = self.size if hi is None else hi
+        capacity = len(self._dates)
+        dates = np.empty(capacity, dtype=self._dates.dtype)
+        dates[:hi - lo] = self._dates[lo:hi]
+        values = {}
+        for name, old in self._values.items():
+            values[name] = np.empty(capacity)
+            values[name][:hi - lo] = old[lo:hi]
+        self._dates, self._values = dates, values
+
+    def extend(self, dates, closes):
+        """Append bars (datetime64[ns] dates, float closes) that follow the last stored one."""
+        closes = np.asarray(closes, dtype=float)
+        m = len(closes)
+        if not m:
+            return
+        start = self.size
+        self._grow(start + m)
+        self._dates[start:start + m] = dates
+        close_buf = self._values['Close']
+        close_buf[start:start + m] = closes
+        base = max(0, start - max(DMA_WINDOWS))
+        history = close_buf[base:start + m].tolist()  # plain floats for the values leaving each window
+        out = [self._values[f'{w}DMA'] for w in DMA_WINDOWS]
+        peak_buf = self._values['peak']
+        peak = self._peak
+        means = self._means
+        for i, value in enumerate(closes.tolist(), start):
+            if i == start + m - 1:
+                # Kept so the last bar can be swapped for a fresher snapshot of itself
+                self._before_last = ([list(state) for state in means], peak)
+            if value > peak:
+                peak = value
+            peak_buf[i] = peak
+            negative = math.copysign(1, value) < 0
+            for w, state, dma in zip(DMA_WINDOWS, means, out):
+                nobs, total, comp_add, comp_remove, neg_ct, same, prev = state
+                if i >= w:
+                    old = history[i - w - base]
+                    nobs -= 1
+                    y = -old - comp_remove
+                    t = total + y
+                    comp_remove = t - total - y
+                    total = t
+                    if math.copysign(1, old) < 0:
+                        neg_ct -= 1
+                nobs += 1
+                y = value - comp_add
+                t = total + y
+                comp_add = t - total - y
+                total = t
+                if negative:
+                    neg_ct += 1
+                same = same + 1 if value == prev else 1
+                prev = value
+                if nobs < w:
+                    mean = math.nan
+                elif same >= nobs:
+                    mean = prev
+                else:
+                    mean = total / nobs
+                    if (neg_ct == 0 and mean < 0) or (neg_ct == nobs and mean > 0):
+                        mean = 0.0
+                dma[i] = mean
+                state[:] = nobs, total, comp_add, comp_remove, neg_ct, same, prev
+        self._peak = peak
+        self.size = start + m
+
+    def replace_last(self, date, close):
+        """Re-run the last bar with a new close (a refreshed intraday bar)."""
+        means, peak = self._before_last
+        self._means = [list(state) for state in means]
+        self._peak = peak
+        self.size -= 1
+        self._detach()
+        self.extend(np.array([date], dtype='datetime64[ns]'), [close])
+
+    def trim(self, keep=max(DMA_WINDOWS)):
+        """Forget all but the last `keep` bars (at least the longest window, which extend() reads)."""
+        keep = max(keep, max(DMA_WINDOWS))
+        if self.size <= keep:
+            return
+        self._detach(self.size - keep)
+        self.size = keep
+
+    @property
+    def dates(self):
+        return self._dates[:self.size]
+
+    @property
+    def closes(self):
+        return self._values['Close'][:self.size]
+
+    def last(self, m):
+        """Read-only views of every series for the last `m` bars."""
+        lo = max(self.size - m, 0)
+        views = {'dates': self._dates[lo:self.size], **{name: values[lo:self.size] for name, values in self._values.items()}}
+        for view in views.values():
+            view.flags.writeable = False
+        return views
+
+    def window(self, start=None, end=None, warmup=WARMUP_BARS):
+        """Read-only views of every series for start <= date < end, without the first `warmup` bars.
+
+        With the default warmup the rows are the ones add_moving_averages would keep for a frame
+        of the same bars starting at `start`, and so are the values: the stored averages and peak
+        run from the first stored bar, so a window starting later gets its own, rolled from its
+        first bar (a frame of only its bars would round its running sums differently).
+        """
+        dates = self.dates
+        first = 0 if start is None else int(np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), 'left'))
+        hi = self.size if end is None else int(np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), 'left'))
+        lo = min(max(first + warmup, WARMUP_BARS), max(hi, 0))
+        views = {'dates': self._dates[lo:hi], **{name: values[lo:hi] for name, values in self._values.items()}}
+        if first > 0 and lo < hi:
+            closes = pd.Series(self._values['Close'][first:hi])
+            for window in DMA_WINDOWS:
+                views[f'{window}DMA'] = closes.rolling(window=window).mean().to_numpy()[lo - first:]
+            views['peak'] = np.fmax.accumulate(closes.to_numpy())[lo - first:]
+        for view in views.values():
+            view.flags.writeable = False
+        return views
+
+
+def compact_series(frame, dtype=np.float64):
+    """{'dates', 'Close', '30DMA', '50DMA', '200DMA'} arrays of a frame's Close, warm-up dropped.
+
+    The rows are the ones add_moving_averages keeps, for frames with only Close in them or no
+    gaps in the other columns. The averages are taken in float64, like rolling().mean(), and
+    then stored as `dtype`; float32 halves the memory but no longer matches a float64 run to the
+    last bit. The four series are rows of one array and, when no bar is missing, the warm-up is
+    sliced off rather than copied. Dates are datetime64[D] when every bar is at midnight.
+    """
+    closes = frame['Close']
+    block = np.empty((len(COMPACT_SERIES), len(closes)), dtype=dtype)
+    block[0] = closes.to_numpy(dtype=float)
+    for row, window in enumerate(DMA_WINDOWS, 1):
+        block[row] = closes.rolling(window=window).mean().to_numpy()
+    dates = closes.index.to_numpy(dtype='datetime64[ns]')
+    if not (dates.view(np.int64) % DAY_NS).any():
+        dates = dates.astype('datetime64[D]')
+    keep = ~np.isnan(block).any(axis=0)
+    lo = int(keep.argmax()) if keep.any() else len(keep)
+    if keep[lo:].all():
+        return {'dates': dates[lo:], **{name: block[i, lo:] for i, name in enumerate(COMPACT_SERIES)}}
+    block = block[:, keep]
+    return {'dates': dates[keep], **{name: block[i] for i, name in enumerate(COMPACT_SERIES)}}
+
+
+def series_nbytes(series):
+    """Bytes held by a dict of arrays, counting each underlying buffer once (views share theirs)."""
+    buffers = {}
+    for values in series.values():
+        base = values if values.base is None else values.base
+        buffers[id(base)] = base.nbytes
+    return sum(buffers.values())
+
+
+class IndicatorStore:
+    """SymbolIndicators per symbol, in a size-bounded LRU (cache.indicators by default)."""
+
+    def __init__(self, symbols=None):
+        self.symbols = _symbols if symbols is None else symbols
+        self._lock = threading.Lock()  # series are extended in place
+
+    def update(self, symbol, frame):
+        """Bring `symbol` up to date with `frame` (a Close column on a sorted date index) and return it.
+
+        Bars after the stored ones are appended and a changed last bar is replaced. If `frame`
+        starts earlier, leaves a gap, or disagrees with stored closes (an adjusted-price
+        revision), the series are rebuilt from `frame`.
+        """
+        with self._lock:
+            return self._update(symbol, frame.index.to_numpy(dtype='datetime64[ns]'), frame['Close'].to_numpy(dtype=float))
+
+    def _update(self, symbol, dates, closes):
+        entry = self.symbols.get(symbol)
+        if entry is not None and entry.size and len(dates):
+            stored = entry.dates
+            k = int(np.searchsorted(stored, dates[0], 'left'))
+            overlap = min(entry.size - k, len(dates))
+            same_history = (
+                k < entry.size and stored[k] == dates[0]
+                and overlap > 0 and np.array_equal(stored[k:k + overlap], dates[:overlap])
+                and np.array_equal(entry.closes[k:k + overlap - 1], closes[:overlap - 1])
+            )
+            if same_history:
+                if k + overlap == entry.size and entry.closes[-1] != closes[overlap - 1]:
+                    entry.replace_last(dates[overlap - 1], closes[overlap - 1])
+                elif entry.closes[k + overlap - 1] != closes[overlap - 1]:
+                    entry = None
+                if entry is not None:
+                    if overlap < len(dates):
+                        entry.extend(dates[overlap:], closes[overlap:])
+                        self.symbols.put(symbol, entry)  # re-measured against the cache's byte budget
+                    return entry
+        entry = SymbolIndicators(capacity=max(1024, 2 * len(dates)))
+        entry.extend(dates, closes)
+        self.symbols.put(symbol, entry)
+        return entry
+
+    def window(self, symbol, frame, start=None, end=None, warmup=WARMUP_BARS):
+        """update() then SymbolIndicators.window()."""
+        return self.update(symbol, frame).window(start, end, warmup)
+
+
+# Shared by every rerun and session of the app
+store = IndicatorStore()
@@ -0,0 +1,221 @@
+"""Many parameter sets of one symbol backtested in a single pass, one NumPy lane per set.
+
+The bars, moving averages, running peak and the DMA comparisons behind every signal are shared
+by all parameter sets; only what depends on the knobs differs between lanes: the peak-drop dip,
+the buy sizes and fees, the profit check, the sell size and cool-off, and interest on each
+lane's cash. `run_lanes` keeps every lane's cash, units, last buy price and cool-off in arrays and
+steps them through the bars together, so a grid of thousands of sets costs about as many NumPy
+calls as a single backtest. Lanes may also start on different dates (see walkforward.py); a
+lane sits idle until its start bar, where it makes its Muhurut buy, and may keep a running peak
+of its own over the bars a backtest from that start would load. Or each lane may follow a
+price path of its own (see stress.py): the closes and moving averages are then bars x lanes
+matrices and the signals are per lane too. It keeps no ledger, only the trade count, and its
+cash, units and trade counts match run_backtest's for every lane.
+"""
+import numpy as np
+import pandas as pd
+
+from engine import DAY_NS, signal_masks
+
+# Knobs that may differ between lanes; cap_allocation and close_out apply to them all
+LANE_PARAMS = ['profit_threshold', 'sell_pct', 'drop_threshold', 'strong_buy_allocation', 'moderate_buy_allocation',
+               'maintenance_fee', 'interest_rate_pct', 'cooloff_days']
+DEFAULT_COOLOFF_DAYS = 5
+
+
+def lane_params(grid):
+    """{knob: float array} with one entry per parameter set of `grid` (run_backtest's keywords)."""
+    params = {}
+    for knob in LANE_PARAMS:
+        if knob == 'interest_rate_pct':
+            # None (no interest) is a zero rate: it never books anything
+            values = [p.get(knob) or 0.0 for p in grid]
+        elif knob == 'cooloff_days':
+            values = [p.get(knob, DEFAULT_COOLOFF_DAYS) for p in grid]
+        else:
+            values = [p[knob] for p in grid]
+        params[knob] = np.asarray(values, dtype=float)
+    return params
+
+
+def run_lanes(dates, close_prices, dma30_values, dma50_values, dma200_values, initial_capital, grid,
+              start_date=None, cap_allocation=True, close_out=True, drawdown=False, peak_days=None):
+    """Backtest one symbol under every parameter set in `grid` at once.
+
+    The closes and moving averages are one series shared by every lane or bars x lanes matrices,
+    one price path per lane. `start_date` is one date for every lane or a sequence with one date
+    per lane. Returns {'cash', 'units', 'trades', 'initial_price', 'initial_date'} arrays, one
+    entry per set (initial_price is -1 for a lane that never started, as in run_backtest), and the
+    final_price (one per lane for paths). With `drawdown`, 'max_drawdown' holds each lane's
+    largest fall of cash plus holdings from a previous high, as a fraction.
+
+    By default the running peak is taken from the first bar for every lane. With `peak_days`, a
+    lane's peak only counts the bars from `peak_days` calendar days before its start on, as
+    run_backtest's does on bars loaded from that date (the app loads start - WARMUP_DAYS).
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    close_array = np.asarray(close_prices, dtype=float)
+    n, lanes = len(close_array), len(grid)
+    paths = close_array.ndim == 2
+    p = lane_params(grid)
+    if start_date is None:
+        starts = np.zeros(lanes, dtype=np.int64)
+    else:
+        starts = np.searchsorted(dates, np.broadcast_to(np.asarray(start_date, dtype='datetime64[ns]'), lanes), 'left')
+    # Dips are per lane, so the shared masks are taken without one (drop 0 leaves only the DMA tests)
+    strong, moderate, sell, peak_prices = signal_masks(close_array, np.asarray(dma30_values, dtype=float),
+                                                       np.asarray(dma50_values, dtype=float),
+                                                       np.asarray(dma200_values, dtype=float), 0.0)
+    result = {'cash': np.full(lanes, float(initial_capital)), 'units': np.zeros(lanes, dtype=np.int64),
+              'trades': np.zeros(lanes, dtype=np.int64), 'initial_price': np.full(lanes, -1.0),
+              'initial_date': np.full(lanes, dates[0] if n else np.datetime64('NaT'), dtype='datetime64[ns]'),
+              'final_price': close_array[-1] if n else None}
+    if drawdown:
+        result['max_drawdown'] = np.zeros(lanes)
+    s = int(starts.min()) if lanes else n
+    if s >= n:
+        return result
+
+    ns = dates.view(np.int64)
+    days = np.zeros(n, dtype=np.int64)
+    days[1:] = np.diff(ns) // DAY_NS
+    # Lanes opening on each bar; a lane only earns and trades once it is live
+    opening = {}
+    for j in np.argsort(starts, kind='stable').tolist():
+        if starts[j] < n:
+            opening.setdefault(int(starts[j]), []).append(j)
+    live = np.zeros(lanes, dtype=bool)
+    all_live = False
+    lane_peak = None
+    if peak_days is not None and not paths:
+        # Each lane's peak from its own first bar; seeded when it opens and kept up bar by bar
+        first = np.searchsorted(dates, dates[np.minimum(starts, n - 1)] - np.timedelta64(int(peak_days), 'D'), 'left')
+        lane_peak = np.full(lanes, np.nan)
+    # Same expressions, in the same order, as run_backtest, so every lane rounds as it does
+    rate = p['interest_rate_pct'] / 100 / 365
+    fee_factor = p['maintenance_fee'] / 100
+    maintenance_fee, profit_threshold, sell_pct = p['maintenance_fee'], p['profit_threshold'], p['sell_pct']
+    strong_allocation = initial_capital * p['strong_buy_allocation']
+    moderate_allocation = initial_capital * p['moderate_buy_allocation']
+    strong_ceiling, moderate_ceiling = (1 + fee_factor) * strong_allocation, (1 + fee_factor) * moderate_allocation
+    keep = 1 - p['drop_threshold']
+    cooloff_step = p['cooloff_days'].astype(np.int64) * DAY_NS
+    # Bars where the DMA tests already rule out every lane's buy (or sell) only earn interest
+    buy_signal = strong | moderate
+    if paths:
+        buy_any, sell_any = buy_signal.any(axis=1).tolist(), sell.any(axis=1).tolist()
+    else:
+        buy_any, sell_any = buy_signal.tolist(), sell.tolist()
+    is_strong = strong.tolist()
+
+    cash, units, trades = result['cash'], result['units'], result['trades']
+    last_buy_price = np.full(lanes, np.nan)
+    cooloff = np.zeros(lanes, dtype=np.int64)
+
+    def buy(price, allocation, where):
+        bought = np.trunc(allocation / price)
+        go = where & (bought >= 1)
+        buy_amt = bought * price
+        units[go] += bought[go].astype(np.int64)
+        np.subtract(cash, buy_amt, out=cash, where=go)
+        np.copyto(last_buy_price, price, where=go)
+        np.subtract(cash, (buy_amt * maintenance_fee) / 100, out=cash, where=go)
+        trades[go] += 1
+
+    rated = bool(rate.any())
+    high = cash.copy()  # highest cash plus holdings so far, for the drawdown
+    for t in range(s, n):
+        if rated and days[t] > 0:
+            interest_income = cash * rate * days[t]
+            earns = interest_income > 1
+            np.add(cash, interest_income, out=cash, where=earns if all_live else earns & live)
+        if lane_peak is not None:
+            np.fmax(lane_peak, close_array[t], out=lane_peak)
+        if t in opening:
+            # Muhurut: one unit on the lane's first traded bar
+            started = np.zeros(lanes, dtype=bool)
+            started[opening[t]] = True
+            if lane_peak is not None:
+                lane_peak[opening[t]] = [np.fmax.reduce(close_array[first[j]:t + 1]) for j in opening[t]]
+            live |= started
+            all_live = bool(live.all())
+            price = close_array[t] if paths else float(close_array[t])
+            np.copyto(result['initial_price'], price, where=started)
+            result['initial_date'][started] = dates[t]
+            buy(price, np.full(lanes, price), started)
+        price = close_array[t] if paths else float(close_array[t])
+        if sell_any[t]:
+            pct_change = (price - last_buy_price) / last_buy_price * 100
+            ok = (units > 0) & (pct_change >= profit_threshold) & (ns[t] >= cooloff)
+            if paths:
+                ok &= sell[t]
+            if ok.any():
+                cooloff[ok] = ns[t] + cooloff_step[ok]
+                units_to_sell = np.trunc(units * sell_pct)
+                go = ok & (units_to_sell >= 1)
+                units[go] -= units_to_sell[go].astype(np.int64)
+                np.add(cash, units_to_sell * price, out=cash, where=go)
+                trades[go] += 1
+        if buy_any[t]:
+            can = (price <= (peak_prices[t] if lane_peak is None else lane_peak) * keep) & (cash > 0)
+            if paths:
+                can &= buy_signal[t]
+            if not all_live:
+                can &= live
+            if can.any():
+                if paths:
+                    allocation = np.where(strong[t], strong_allocation, moderate_allocation)
+                    ceiling = np.where(strong[t], strong_ceiling, moderate_ceiling)
+                elif is_strong[t]:
+                    allocation, ceiling = strong_allocation, strong_ceiling
+                else:
+                    allocation, ceiling = moderate_allocation, moderate_ceiling
+                if cap_allocation:
+                    allocation = np.where(cash < ceiling, (1 - fee_factor) * cash, allocation)
+                buy(price, allocation, can)
+        if drawdown:
+            value = cash + units * price
+            np.maximum(high, value, out=high)
+            np.maximum(result['max_drawdown'], 1 - value / high, out=result['max_drawdown'])
+
+    if close_out:
+        held = units > 0
+        np.add(cash, units * close_array[-1], out=cash, where=held)
+        units[held] = 0
+        trades[held] += 1
+    return result
+
+
+def summarize_lanes(result, initial_capital, start_date, end_date):
+    """engine.summarize for every lane: the same keys, as arrays with one entry per lane.
+
+    `start_date` is one date or one per lane, as given to run_lanes.
+    """
+    final_value = result['cash']
+    lanes = len(final_value)
+    start_ns = pd.DatetimeIndex(np.broadcast_to(np.asarray(start_date, dtype='datetime64[ns]'), lanes))
+    spans = ((pd.Timestamp(end_date) - start_ns).days / 365.25).tolist()
+    # No bars after the warm-up (a recent listing) leaves no final price: buy-and-hold is NaN, as in summarize
+    initial_price = result['initial_price']
+    final_price = np.nan if result['final_price'] is None else result['final_price']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        buy_hold_value = np.where(initial_price > 0, initial_capital / initial_price * final_price, np.nan)
+
+    def annualized(value, years):
+        if years <= 0 or initial_capital <= 0 or not value > 0:
+            return float('nan')
+        return ((value / initial_capital) ** (1 / years) - 1) * 100
+
+    # Scalar powers: NumPy's vectorised pow can differ from summarize's in the last bit
+    cagr = np.array([annualized(value, years) for value, years in zip(final_value.tolist(), spans)])
+    buy_hold_cagr = np.array([annualized(value, years) for value, years in zip(buy_hold_value.tolist(), spans)])
+    return {
+        'final_value': final_value,
+        'profit': final_value - initial_capital,
+        'return_pct': (final_value / initial_capital - 1) * 100,
+        'cagr_pct': cagr,
+        'trades': result['trades'],
+        'buy_hold_value': buy_hold_value,
+        'buy_hold_cagr_pct': buy_hold_cagr,
+        'outperformance_pct': cagr - buy_hold_cagr,
+    }
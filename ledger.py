@@ -0,0 +1,167 @@
+"""Columnar trade ledger.
+
+Rows are kept as typed NumPy columns (date, action code, type code, units, price, cash and the
+portfolio value the cash share is taken of). The 'Cash Position' text the app shows is only
+formatted when the ledger is turned into rows or a frame. Appends go to a short list of plain
+tuples that is flushed into the preallocated columns a block at a time, which keeps a row as
+cheap as appending a tuple; extend_columns takes a whole run's rows as arrays, the way
+run_backtest hands them over. Reads flush the pending rows first, under the ledger's lock, so a
+finished ledger shared between sessions (cache.results) can be read from several threads at once.
+"""
+import threading
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+LEDGER_COLUMNS = ['Date', 'Action', 'Type', 'Units', 'Price', 'Cash Position']
+ACTIONS = ['Buy', 'Sell', 'Maintenance', 'Interest']
+BUY, SELL, MAINTENANCE, INTEREST = range(len(ACTIONS))
+FLUSH_ROWS = 4096
+
+
+def _cash_positions(cash, total):
+    share = np.zeros(len(cash), dtype=np.int64)
+    nonzero = total != 0
+    share[nonzero] = (100 * cash[nonzero] / total[nonzero]).astype(np.int64)
+    return [f"{c} ( {p}% )" for c, p in zip(cash.astype(np.int64).tolist(), share.tolist())]
+
+
+class Ledger:
+    """Append-only trade ledger of one run.
+
+    `interest_period` ('W', 'M', 'Y', ...) coalesces consecutive Interest rows falling in the same
+    calendar period into one row: its date is the last accrual, Units the days covered, Price the
+    interest booked over the period and the cash position the one after the last accrual.
+    """
+
+    def __init__(self, interest_period=None, capacity=256):
+        self.interest_period = interest_period
+        self.types = []
+        self._type_codes = {}
+        self._dates = np.empty(capacity, dtype=np.int64)
+        self._codes = np.empty((capacity, 2), dtype=np.int16)
+        self._values = np.empty((capacity, 4), dtype=np.float64)  # units, price, cash, total
+        self._size = 0
+        self._pending = []
+        self._open_interest = None
+        self._lock = threading.RLock()
+
+    def type_code(self, label):
+        code = self._type_codes.get(label)
+        if code is None:
+            code = self._type_codes[label] = len(self.types)
+            self.types.append(label)
+        return code
+
+    def append(self, date_ns, action, type_code, units, price, cash, total):
+        """Add one row; `date_ns` is nanoseconds since the epoch and `action` one of the module codes."""
+        if self._open_interest is not None:
+            self._close_interest()
+        pending = self._pending
+        pending.append((date_ns, action, type_code, units, price, cash, total))
+        if len(pending) >= FLUSH_ROWS:
+            self._flush()
+
+    def extend_columns(self, dates_ns, actions, type_codes, units, price, cash, total):
+        """Add rows given as arrays, one per column, straight into the columns (after any pending rows)."""
+        with self._lock:
+            self._flush()
+            end = self._size + len(dates_ns)
+            self._reserve(end)
+            self._dates[self._size:end] = dates_ns
+            self._codes[self._size:end, 0] = actions
+            self._codes[self._size:end, 1] = type_codes
+            values = self._values[self._size:end]
+            values[:, 0], values[:, 1], values[:, 2], values[:, 3] = units, price, cash, total
+            self._size = end
+
+    def interest(self, date_ns, type_code, days, daily_interest, income, cash, total):
+        """Add an Interest row (`income` is only used when coalescing)."""
+        if self.interest_period is None:
+            self.append(date_ns, INTEREST, type_code, days, daily_interest, cash, total)
+            return
+        period = np.datetime64(date_ns, 'ns').astype(f'datetime64[{self.interest_period}]')
+        row = self._open_interest
+        if row is not None and (row[0] != period or row[2] != type_code):
+            self._close_interest()
+            row = None
+        if row is None:
+            self._open_interest = [period, date_ns, type_code, days, income, cash, total]
+        else:
+            row[1:] = [date_ns, type_code, row[3] + days, row[4] + income, cash, total]
+
+    def record(self, date, action, type_label, units, price, cash, total):
+        """append() taking a date-like and the action / type names, for callers outside a hot loop."""
+        self.append(pd.Timestamp(date).value, ACTIONS.index(action), self.type_code(type_label), units, price, cash, total)
+
+    def _close_interest(self):
+        _, date_ns, type_code, days, income, cash, total = self._open_interest
+        self._open_interest = None
+        self.append(date_ns, INTEREST, type_code, days, income, cash, total)
+
+    def _reserve(self, end):
+        if end > len(self._dates):
+            capacity = max(end, 2 * len(self._dates))
+            self._dates = np.resize(self._dates, capacity)
+            self._codes = np.resize(self._codes, (capacity, 2))
+            self._values = np.resize(self._values, (capacity, 4))
+
+    def _flush(self):
+        with self._lock:
+            if self._open_interest is not None:
+                self._close_interest()
+            pending = self._pending
+            if not pending:
+                return
+            end = self._size + len(pending)
+            self._reserve(end)
+            block = np.fromiter(chain.from_iterable(pending), np.float64, 7 * len(pending)).reshape(-1, 7)
+            self._dates[self._size:end] = [row[0] for row in pending]  # int64 ns do not survive a float64 round trip
+            self._codes[self._size:end] = block[:, 1:3]
+            self._values[self._size:end] = block[:, 3:]
+            self._size = end
+            pending.clear()
+
+    def columns(self):
+        """Typed views of the rows: dates (datetime64[ns]), action and type codes, units, price, cash, total."""
+        with self._lock:
+            self._flush()
+            n = self._size
+            dates, codes, values = self._dates[:n], self._codes[:n], self._values[:n]
+        return {'dates': dates.view('datetime64[ns]'), 'actions': codes[:, 0],
+                'types': codes[:, 1], 'units': values[:, 0].astype(np.int64), 'price': values[:, 1],
+                'cash': values[:, 2], 'total': values[:, 3]}
+
+    def __len__(self):
+        with self._lock:
+            return self._size + len(self._pending) + (self._open_interest is not None)
+
+    def count(self, *actions):
+        """Number of rows whose action is one of `actions` (names)."""
+        codes = self.columns()['actions']
+        return int(np.isin(codes, [ACTIONS.index(a) for a in actions]).sum())
+
+    def to_frame(self):
+        """The ledger as the app's table (LEDGER_COLUMNS), with the cash position formatted."""
+        cols = self.columns()
+        return pd.DataFrame({
+            'Date': cols['dates'],
+            'Action': np.array(ACTIONS, dtype=object)[cols['actions']],
+            'Type': np.array(self.types, dtype=object)[cols['types']],
+            'Units': cols['units'],
+            'Price': cols['price'],
+            'Cash Position': _cash_positions(cols['cash'], cols['total']),
+        }, columns=LEDGER_COLUMNS)
+
+    def rows(self):
+        """(date, action, type, units, price, cash position) tuples, dates as datetime objects."""
+        cols = self.columns()
+        return list(zip(cols['dates'].astype('datetime64[us]').tolist(),
+                        [ACTIONS[a] for a in cols['actions'].tolist()],
+                        [self.types[t] for t in cols['types'].tolist()],
+                        cols['units'].tolist(), cols['price'].tolist(),
+                        _cash_positions(cols['cash'], cols['total'])))
+
+    def __iter__(self):
+        return iter(self.rows())
@@ -0,0 +1,228 @@
+"""Whole-portfolio backtest: every symbol on one trading calendar, drawing on one cash pool.
+
+Closes and the 30/50/200-day moving averages are held as date x symbol arrays (NaN where a
+symbol has no bar), signals and running peaks are computed for the whole matrix at once, and a
+single pass over the calendar advances every symbol on each date: interest on the pool first,
+then the Muhurut buy of symbols trading for the first time, then profit-taking sells, then buys
+in symbol order. Each buy is sized from its symbol's budget (its share of total capital, as in
+the per-ticker runs) and capped by what is left in the pool. With a single symbol whose budget
+is the whole capital this is exactly engine.run_backtest.
+"""
+import numpy as np
+import pandas as pd
+
+from engine import DAY_NS, signal_masks
+from indicators import compact_series
+from ledger import BUY, LEDGER_COLUMNS, MAINTENANCE, SELL, Ledger
+
+SERIES = ['Close', '30DMA', '50DMA', '200DMA']
+POOL = 'CASH'  # Symbol shown on the pool's Interest rows
+
+
+def aligned_indicators(frames):
+    """Date x symbol arrays of Close and the moving averages from {symbol: OHLCV frame}.
+
+    Each symbol's averages are taken over its own bars, as add_moving_averages does, and its
+    rows only start once its 200DMA is defined. The calendar is the union of those rows.
+    """
+    series = {s: compact_series(df[['Close']].dropna()) for s, df in frames.items()}
+    series = {s: columns for s, columns in series.items() if len(columns['dates'])}
+    if not series:
+        return {'symbols': [], 'dates': np.array([], dtype='datetime64[ns]'), **{name: np.empty((0, 0)) for name in SERIES}}
+    own_dates = [columns['dates'].astype('datetime64[ns]') for columns in series.values()]
+    dates = np.unique(np.concatenate(own_dates))
+    data = {'symbols': list(series), 'dates': dates}
+    rows = [np.searchsorted(dates, d) for d in own_dates]
+    for name in SERIES:
+        matrix = data[name] = np.full((len(dates), len(series)), np.nan)
+        for j, columns in enumerate(series.values()):
+            matrix[rows[j], j] = columns[name]
+    return data
+
+
+def run_portfolio(data, budgets, initial_capital, profit_threshold, sell_pct, drop_threshold,
+                  strong_buy_allocation, moderate_buy_allocation, maintenance_fee, start_date=None,
+                  interest_rate_pct=None, cap_allocation=True, close_out=True, cooloff_days=5,
+                  interest_period=None):
+    """Backtest the symbols of `data` (see aligned_indicators) as one portfolio.
+
+    `budgets` holds each symbol's capital in `data['symbols']` order; buys take
+    strong/moderate_buy_allocation of it. `initial_capital` seeds the shared pool. Other
+    arguments are run_backtest's. Returns the pool's final cash, per-symbol units, ledgers and
+    Muhurut prices, the pool's interest ledger and the daily portfolio value from the start date.
+    """
+    symbols = data['symbols']
+    dates = data['dates']
+    close = data['Close']
+    n, m = close.shape
+    budgets = np.asarray(budgets, dtype=float)
+    strong, moderate, sell, _ = signal_masks(close, data['30DMA'], data['50DMA'], data['200DMA'], drop_threshold)
+    ledgers, pool = {symbol: Ledger() for symbol in symbols}, Ledger(interest_period)
+    s = 0 if start_date is None else int(np.searchsorted(dates, np.datetime64(pd.Timestamp(start_date)), 'left'))
+    result = {'symbols': symbols, 'ledgers': ledgers, 'interest': pool, 'cash': float(initial_capital),
+              'units': np.zeros(m, dtype=np.int64), 'initial_prices': np.full(m, np.nan),
+              'initial_dates': np.full(m, np.datetime64('NaT'), dtype='datetime64[ns]'),
+              'final_prices': np.full(m, np.nan), 'dates': dates[s:], 'value': np.empty(max(n - s, 0))}
+    if s >= n:
+        return result
+
+    # Valuation prices: each symbol's last close so far, 0 before its first bar
+    held = pd.DataFrame(close).ffill().fillna(0.0).to_numpy()
+    present = ~np.isnan(close)
+    last_row = n - 1 - np.argmax(present[::-1], axis=0)
+    result['final_prices'] = close[last_row, np.arange(m)]
+
+    ns = dates.view(np.int64).tolist()
+    days = [0] * (s + 1) + (np.diff(dates[s:].view(np.int64)) // DAY_NS).tolist()
+    rate = 0.0 if interest_rate_pct is None else interest_rate_pct / 100 / 365
+    fee_factor = maintenance_fee / 100
+    cooloff_step = cooloff_days * DAY_NS
+    types = [[ledger.type_code(t) for t in ('Muhurut', 'Strong', 'Moderate', 'Fees', 'Profit_Taking', 'Final_Exit')]
+             for ledger in ledgers.values()]
+    appends = [ledger.append for ledger in ledgers.values()]
+    interest_type = pool.type_code(f"{interest_rate_pct}%")
+    MUHURUT, STRONG, MODERATE, FEES, PROFIT_TAKING, FINAL_EXIT = range(6)
+
+    # Muhurut rows: each symbol's first bar from the start date on
+    first = np.where(present[s:].any(axis=0), s + np.argmax(present[s:], axis=0), n)
+    muhurut_at = {}
+    for j in np.argsort(first, kind='stable').tolist():
+        if first[j] < n:
+            muhurut_at.setdefault(int(first[j]), []).append(j)
+
+    # Buy candidates: bars where the full allocation buys at least a unit (a capped one never
+    # buys more), and sell bars, both in (date, symbol) order
+    strong_allocation = budgets * strong_buy_allocation
+    moderate_allocation = budgets * moderate_buy_allocation
+    with np.errstate(invalid='ignore', divide='ignore'):
+        viable = (strong & (strong_allocation / close >= 1)) | (moderate & (moderate_allocation / close >= 1))
+    buy_rows, buy_cols = np.nonzero(viable[s:])
+    sell_rows, sell_cols = np.nonzero(sell[s:])
+    buy_at = np.searchsorted(buy_rows, np.arange(n - s + 1)).tolist()
+    sell_at = np.searchsorted(sell_rows, np.arange(n - s + 1)).tolist()
+    buy_cols, sell_cols = buy_cols.tolist(), sell_cols.tolist()
+    is_strong = strong.tolist()
+    strong_allocation, moderate_allocation = strong_allocation.tolist(), moderate_allocation.tolist()
+
+    cash = float(initial_capital)
+    units = result['units']
+    last_buy_price = [None] * m
+    cooloff = [0] * m
+    value = result['value']
+    close_rows = close.tolist()
+
+    def buy(t, j, allocation, buy_type):
+        nonlocal cash
+        price = close_rows[t][j]
+        bought = int(allocation / price)
+        if bought < 1:
+            return
+        units[j] += bought
+        buy_amt = bought * price
+        cash -= buy_amt
+        last_buy_price[j] = price
+        holdings = float(units @ held[t])
+        appends[j](ns[t], BUY, types[j][buy_type], bought, price, cash, cash + holdings)
+        fee = (buy_amt * maintenance_fee) / 100
+        cash -= fee
+        appends[j](ns[t], MAINTENANCE, types[j][FEES], 1, fee, cash, cash + holdings)
+
+    for t in range(s, n):
+        k = t - s
+        if rate and days[t] > 0:
+            interest_income = cash * rate * days[t]
+            if interest_income > 1:
+                cash += interest_income
+                pool.interest(ns[t], interest_type, days[t], cash * rate, interest_income, cash, cash + float(units @ held[t]))
+
+        for j in muhurut_at.get(t, ()):
+            result['initial_prices'][j], result['initial_dates'][j] = close_rows[t][j], dates[t]
+            buy(t, j, close_rows[t][j], MUHURUT)
+
+        for i in range(sell_at[k], sell_at[k + 1]):
+            j = sell_cols[i]
+            bought_at = last_buy_price[j]
+            if units[j] <= 0 or bought_at is None or ns[t] < cooloff[j]:
+                continue
+            price = close_rows[t][j]
+            if (price - bought_at) / bought_at * 100 < profit_threshold:
+                continue
+            cooloff[j] = ns[t] + cooloff_step
+            units_to_sell = int(units[j] * sell_pct)
+            if units_to_sell >= 1:
+                units[j] -= units_to_sell
+                cash += units_to_sell * price
+                appends[j](ns[t], SELL, types[j][PROFIT_TAKING], units_to_sell, price, cash, cash + float(units @ held[t]))
+
+        for i in range(buy_at[k], buy_at[k + 1]):
+            if cash <= 0:
+                # Buys only ever spend, so nobody else can buy today
+                break
+            j = buy_cols[i]
+            if is_strong[t][j]:
+                buy_type, allocation = STRONG, strong_allocation[j]
+            else:
+                buy_type, allocation = MODERATE, moderate_allocation[j]
+            if cap_allocation and cash < (1 + fee_factor) * allocation:
+                allocation = (1 - fee_factor) * cash
+            buy(t, j, allocation, buy_type)
+
+        value[k] = cash + float(units @ held[t])
+
+    if close_out:
+        for j in np.flatnonzero(units > 0).tolist():
+            t = int(last_row[j])
+            price = close_rows[t][j]
+            cash += int(units[j]) * price
+            units[j] = 0
+            appends[j](ns[t], SELL, types[j][FINAL_EXIT], 0, price, cash, cash + float(units @ held[-1]))
+    result['cash'] = cash
+    return result
+
+
+def ledger_frame(result):
+    """Every symbol's trades and the pool's interest in one table (LEDGER_COLUMNS plus Symbol), by date.
+
+    Rows of one date are grouped by symbol, with the pool's interest first.
+    """
+    ledgers = [(POOL, result['interest']), *result['ledgers'].items()]
+    frames = [ledger.to_frame().assign(Symbol=symbol) for symbol, ledger in ledgers if len(ledger)]
+    if not frames:
+        return pd.DataFrame(columns=['Symbol'] + LEDGER_COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    return df.sort_values('Date', kind='stable', ignore_index=True)[['Symbol'] + LEDGER_COLUMNS]
+
+
+def summarize_portfolio(result, initial_capital, budgets, start_date, end_date):
+    """engine.summarize's headline numbers for a portfolio run.
+
+    Buy-and-hold puts the capital into every symbol on its first traded day, split in
+    proportion to the budgets.
+    """
+    final_value = result['cash'] + float(result['units'] @ np.nan_to_num(result['final_prices']))
+    years = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days / 365.25
+    trades = sum(ledger.count('Buy', 'Sell') for ledger in result['ledgers'].values())
+    budgets = np.asarray(budgets, dtype=float)
+    traded = ~np.isnan(result['initial_prices'])
+    weights = budgets * traded
+    buy_hold_value = float('nan')
+    if weights.sum() > 0:
+        shares = initial_capital * weights[traded] / weights.sum() / result['initial_prices'][traded]
+        buy_hold_value = float(shares @ result['final_prices'][traded])
+
+    def annualized(value):
+        if years <= 0 or initial_capital <= 0 or not value > 0:
+            return float('nan')
+        return ((value / initial_capital) ** (1 / years) - 1) * 100
+
+    cagr, buy_hold_cagr = annualized(final_value), annualized(buy_hold_value)
+    return {
+        'final_value': final_value,
+        'profit': final_value - initial_capital,
+        'return_pct': (final_value / initial_capital - 1) * 100,
+        'cagr_pct': cagr,
+        'trades': trades,
+        'buy_hold_value': buy_hold_value,
+        'buy_hold_cagr_pct': buy_hold_cagr,
+        'outperformance_pct': cagr - buy_hold_cagr,
+    }
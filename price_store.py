@@ -0,0 +1,197 @@
+"""On-disk OHLCV store: one Parquet file per symbol, topped up from Yahoo only for missing bars."""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import pandas as pd
+import yfinance as yf
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Unadjusted closes, as the app's yf.download calls returned on the yfinance versions it was
+# written for (later releases made download() adjust by default). Stores fetched with another
+# setting are fetched again rather than spliced with these.
+AUTO_ADJUST = False
+
+
+def _day(value):
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return ts.normalize()
+
+
+def normalize_ohlcv(df):
+    """Flatten a yfinance frame to a sorted, tz-naive Date index and plain OHLCV columns."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+    df = df.copy()
+    # yf.download returns (field, ticker) columns even for a single symbol
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df[[c for c in PRICE_COLUMNS if c in df.columns]]
+    df.index = pd.DatetimeIndex(df.index)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df.index.name = 'Date'
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df.astype(float)
+
+
+def yahoo_fetch(symbol, start, end):
+    # Ticker.history is what yf.download calls per symbol, minus download()'s shared
+    # module-level result dict, so it is safe to call from several threads at once.
+    df = yf.Ticker(symbol).history(start=start.strftime("%Y-%m-%d"), end=end.strftime("%Y-%m-%d"),
+                                   auto_adjust=AUTO_ADJUST, actions=False)
+    return normalize_ohlcv(df)
+
+
+def price_matrix(frames, field='Close'):
+    """Align per-symbol frames into one date x symbol matrix (NaN where a symbol has no bar)."""
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+    return pd.concat({symbol: df[field] for symbol, df in frames.items()}, axis=1).sort_index()
+
+
+# Loads of a symbol are serialized across the process, whichever PriceStore (the app makes one
+# per rerun) or session they come from: when several sessions ask for the same symbol at once,
+# the first tops up the store from upstream and the rest find the bars already on disk.
+_load_locks = {}
+_load_locks_guard = threading.Lock()
+
+
+def _load_lock(root, symbol):
+    with _load_locks_guard:
+        return _load_locks.setdefault((os.path.abspath(root), symbol), threading.Lock())
+
+
+class FixtureFetcher:
+    """Serves bars from <directory>/<symbol>.csv or .parquet in place of Yahoo (for tests and offline runs)."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.calls = []
+
+    def __call__(self, symbol, start, end):
+        self.calls.append((symbol, start, end))
+        for ext, reader in (('.parquet', pd.read_parquet), ('.csv', lambda p: pd.read_csv(p, index_col=0, parse_dates=True))):
+            path = os.path.join(self.directory, symbol + ext)
+            if os.path.exists(path):
+                df = normalize_ohlcv(reader(path))
+                return df[(df.index >= start) & (df.index < end)]
+        return normalize_ohlcv(None)
+
+
+class PriceStore:
+    """Per-symbol Parquet cache of daily bars.
+
+    Each symbol keeps a sidecar JSON with the [start, end) range already fetched and the
+    AUTO_ADJUST it was fetched with, so a request only goes upstream for bars before that range
+    or after its end. Today's bar may be an intraday snapshot; it is re-fetched once it is older
+    than `refresh_after`.
+    """
+
+    def __init__(self, root, fetcher=yahoo_fetch, refresh_after=timedelta(minutes=15)):
+        self.root = root
+        self.fetcher = fetcher
+        self.refresh_after = refresh_after
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol, ext):
+        return os.path.join(self.root, quote(symbol, safe='') + ext)
+
+    def read(self, symbol):
+        """Return (frame, meta) as stored, or (None, None) if the symbol was never fetched."""
+        meta_path = self._path(symbol, '.json')
+        if not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return pd.read_parquet(self._path(symbol, '.parquet')), meta
+
+    def _write(self, symbol, frame, meta):
+        # Write-then-rename so concurrent readers never see a half-written file
+        data_path = self._path(symbol, '.parquet')
+        frame.to_parquet(data_path + '.tmp')
+        os.replace(data_path + '.tmp', data_path)
+        meta_path = self._path(symbol, '.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def load(self, symbol, start, end):
+        """Bars for `symbol` with start <= date < end, fetching only what the store is missing."""
+        with _load_lock(self.root, symbol):
+            return self._load(symbol, start, end)
+
+    def _load(self, symbol, start, end):
+        start, end = _day(start), _day(end)
+        now = datetime.now()
+        today = _day(now)
+        end_cap = min(end, today + timedelta(days=1))
+
+        frame, meta = self.read(symbol)
+        if frame is None or meta.get('auto_adjust') != AUTO_ADJUST:
+            frame = normalize_ohlcv(self.fetcher(symbol, start, end_cap))
+            if frame.empty:
+                return frame
+            self._write(symbol, frame, {'start': str(start.date()), 'end': str(end_cap.date()), 'fetched_at': now.isoformat(),
+                                       'auto_adjust': AUTO_ADJUST})
+            return frame[(frame.index >= start) & (frame.index < end)]
+
+        lo, hi = _day(meta['start']), _day(meta['end'])
+        fetched_at = datetime.fromisoformat(meta['fetched_at'])
+        parts = [frame]
+        changed = False
+        if start < lo:
+            parts.insert(0, normalize_ohlcv(self.fetcher(symbol, start, lo)))
+            lo = start
+            changed = True
+        live_bar_stale = hi > today and now - fetched_at > self.refresh_after
+        if end_cap > hi or live_bar_stale:
+            # Overlap the last stored bar so a partial (intraday) bar gets replaced
+            tail_start = min(hi, frame.index[-1]) if not frame.empty else hi
+            parts.append(normalize_ohlcv(self.fetcher(symbol, tail_start, end_cap)))
+            hi = max(hi, end_cap)
+            changed = True
+
+        if changed:
+            parts = [p for p in parts if not p.empty]
+            frame = normalize_ohlcv(pd.concat(parts) if parts else None)
+            self._write(symbol, frame, {'start': str(lo.date()), 'end': str(hi.date()), 'fetched_at': now.isoformat(),
+                                       'auto_adjust': AUTO_ADJUST})
+        return frame[(frame.index >= start) & (frame.index < end)]
+
+    def load_many(self, symbols, start, end, max_workers=16, retries=2, backoff=0.5):
+        """Load a universe on a bounded thread pool.
+
+        Each symbol is retried independently, so one bad ticker never fails the batch.
+        Returns ({symbol: frame}, {symbol: error message}); symbols with no bars count as errors.
+        """
+        def load_one(symbol):
+            error = None
+            for attempt in range(retries + 1):
+                if attempt:
+                    time.sleep(backoff * attempt)
+                try:
+                    df = self.load(symbol, start, end)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    continue
+                if not df.empty:
+                    return df, None
+                error = "no data returned"
+            return None, error
+
+        symbols = list(dict.fromkeys(symbols))
+        frames, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(symbols)))) as pool:
+            for symbol, (df, error) in zip(symbols, pool.map(load_one, symbols)):
+                if error is None:
+                    frames[symbol] = df
+                else:
+                    errors[symbol] = error
+        return frames, errors
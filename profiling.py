@@ -0,0 +1,96 @@
+"""Stage instrumentation for the app: wall time, call counts and traced memory per named stage.
+
+    profiler = Profiler()
+    with profiler.stage('fetch'):
+        ...
+    profiler.report()  # a JSON-ready dict, shown and exported by the app's diagnostics panel
+
+Stages may nest and may be entered more than once (one per ticker, say); repeated entries add
+up. Memory is the peak tracemalloc saw above the allocations live when the stage was entered,
+so it counts Python and NumPy allocations but not memory held by C libraries outside them.
+Stages named in `profile` are additionally run under cProfile.
+"""
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_LINES = 40  # functions listed per cProfile capture
+
+
+class Profiler:
+    """Collects the stages of one app action (a Run Analysis or a TradeToday scan)."""
+
+    def __init__(self, name, memory=True, profile=()):
+        self.name = name
+        self.memory = memory
+        self.profile = set(profile)
+        self.started = datetime.now()
+        self.stages = {}
+        self._profiles = {}
+        self._frames = []  # [allocated at entry, highest peak seen inside] per open stage
+        self._tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._frames:
+                # reset_peak() below would forget the enclosing stage's peak so far
+                self._frames[-1][1] = max(self._frames[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._frames.append([current, current])
+        entry = self.stages.setdefault(name, {'stage': name, 'calls': 0, 'seconds': 0.0, 'peak_bytes': None})
+        capture = None
+        if name in self.profile:
+            capture = self._profiles.setdefault(name, cProfile.Profile())
+            capture.enable()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            if capture is not None:
+                capture.disable()
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            if tracing:
+                start, inner_peak = self._frames.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], inner_peak)
+                entry['peak_bytes'] = max(entry['peak_bytes'] or 0, peak - start)
+                if self._frames:
+                    self._frames[-1][1] = max(self._frames[-1][1], peak)
+
+    def close(self):
+        """Stop tracemalloc if this profiler started it."""
+        if self._tracing and not self._frames:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def profile_text(self, name, lines=PROFILE_LINES):
+        """The cProfile capture of stage `name`, top functions by cumulative time."""
+        out = io.StringIO()
+        pstats.Stats(self._profiles[name], stream=out).sort_stats('cumulative').print_stats(lines)
+        return out.getvalue()
+
+    def report(self):
+        return {
+            'name': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'memory_traced': self.memory,
+            'stages': list(self.stages.values()),
+            'profiles': {name: self.profile_text(name) for name in self._profiles},
+        }
@@ -0,0 +1,172 @@
+"""Dated cash flows of backtests and their XIRR, solved for many portfolios at once.
+
+A run's flows come straight from its ledger: every Buy, Maintenance and Sell row moves the
+ledger's cash by exactly the money that went into or came out of the security (the Final_Exit
+row included), so the strategy's flows are those cash changes, on their dates, plus whatever is
+still held at the end. Interest on idle cash is not a flow of the strategy. Buy-and-hold is the
+capital going in on the first traded day and its value coming out on the last.
+
+Flows are kept columnar ({'dates', 'amounts'}, one entry per date) and padded into a
+portfolios x flows matrix, and `xirr_many` solves NPV(rate) = 0 for every row together with
+Newton steps kept inside a sign-change bracket (bisecting when a step would leave it). Rows whose
+flows are all of one sign, whose NPV shows no sign change on the bracketing grid or that fail to
+converge get a NaN rate and a status saying which, rather than a made-up number. Day counts are
+Actual/365, as in pyxirr.
+"""
+import numpy as np
+import pandas as pd
+
+from engine import DAY_NS
+from ledger import INTEREST
+
+XIRR_STATUS = ['converged', 'one-signed flows', 'no root bracketed', 'not converged']
+CONVERGED, ONE_SIGNED, NOT_BRACKETED, NOT_CONVERGED = range(len(XIRR_STATUS))
+# Rates the NPV is first evaluated at to bracket a root: -100% is a total loss and (1 + rate) ** -t
+# blows up there, so the grid stops just short of it
+RATE_GRID = np.array([-0.999999, -0.99, -0.9, -0.75, -0.5, -0.3, -0.2, -0.1, -0.05, 0.0, 0.05, 0.1, 0.15, 0.2, 0.3,
+                      0.5, 0.75, 1.0, 2.0, 5.0, 10.0, 100.0, 1e3, 1e6, 1e9])
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-10
+
+
+def _flows(dates, amounts):
+    """{'dates', 'amounts'} with the amounts of each date added up, in date order."""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    amounts = np.asarray(amounts, dtype=float)
+    unique, inverse = np.unique(dates, return_inverse=True)
+    return {'dates': unique, 'amounts': np.bincount(inverse, weights=amounts, minlength=len(unique))}
+
+
+def strategy_flows(result, opening_cash, final_date=None):
+    """Dated flows of a run_backtest result: trade and fee cash changes, plus units still held.
+
+    `opening_cash` is the cash before the first ledger row (the initial capital of a fresh
+    run, the resumed cash of a continued one). Units left open are valued at the final price on
+    `final_date`.
+    """
+    cols = result['trade_history'].columns()
+    cash = cols['cash']
+    change = np.diff(cash, prepend=float(opening_cash))
+    traded = cols['actions'] != INTEREST
+    dates, amounts = cols['dates'][traded], change[traded]
+    units = result['portfolio']['units']
+    if units > 0 and final_date is not None:
+        dates = np.append(dates, np.datetime64(pd.Timestamp(final_date), 'ns'))
+        amounts = np.append(amounts, units * float(result['final_price']))
+    return _flows(dates, amounts)
+
+
+def buy_hold_flows(initial_capital, initial_price, initial_date, final_price, final_date):
+    """The capital into the symbol on `initial_date` and its value out on `final_date`."""
+    if not initial_price or initial_price <= 0:
+        return _flows([], [])
+    return _flows([np.datetime64(pd.Timestamp(initial_date), 'ns'), np.datetime64(pd.Timestamp(final_date), 'ns')],
+                  [-float(initial_capital), initial_capital / initial_price * final_price])
+
+
+def flow_matrix(flows):
+    """(years, amounts) matrices, one row per flows dict, years counted from each row's first flow.
+
+    Short rows are padded with zero amounts, which add nothing to any NPV.
+    """
+    width = max((len(f['amounts']) for f in flows), default=0)
+    years = np.zeros((len(flows), width))
+    amounts = np.zeros((len(flows), width))
+    for i, f in enumerate(flows):
+        k = len(f['amounts'])
+        if k:
+            ns = f['dates'].view(np.int64)
+            years[i, :k] = (ns - ns[0]) / DAY_NS / 365
+            amounts[i, :k] = f['amounts']
+    return years, amounts
+
+
+def _npv(rate, years, amounts):
+    """NPV and its derivative at `rate` for every row."""
+    with np.errstate(over='ignore', invalid='ignore'):
+        discounted = amounts * np.exp(-years * np.log1p(rate)[:, None])
+        return discounted.sum(axis=1), -(years * discounted).sum(axis=1) / (1 + rate)
+
+
+def xirr_many(flows, guess=0.1, tol=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """XIRR of every flows dict in `flows` at once.
+
+    Returns {'rate': annual rates (NaN where unsolved), 'status': XIRR_STATUS codes,
+    'iterations'}.
+    """
+    years, amounts = flow_matrix(flows)
+    rows = len(flows)
+    rate = np.full(rows, np.nan)
+    status = np.full(rows, NOT_CONVERGED, dtype=np.int8)
+    iterations = np.zeros(rows, dtype=np.int64)
+    if not rows:
+        return {'rate': rate, 'status': status, 'iterations': iterations}
+
+    # Bracket: of the grid intervals where the NPV changes sign, the one closest to the guess in
+    # log(1 + rate), so that flows with several roots settle on the most plausible one
+    npv = np.stack([_npv(np.full(rows, g), years, amounts)[0] for g in RATE_GRID], axis=1)
+    signs = np.sign(npv)
+    changes = np.isfinite(npv[:, :-1]) & np.isfinite(npv[:, 1:]) & (signs[:, :-1] * signs[:, 1:] < 0)
+    mids = (RATE_GRID[:-1] + RATE_GRID[1:]) / 2
+    distance = np.where(changes, np.abs(np.log1p(mids) - np.log1p(guess)), np.inf)
+    pick = distance.argmin(axis=1)
+    bracketed = changes.any(axis=1)
+    status[~bracketed] = NOT_BRACKETED
+    status[~((amounts > 0).any(axis=1) & (amounts < 0).any(axis=1))] = ONE_SIGNED
+    lo, hi = RATE_GRID[pick], RATE_GRID[pick + 1]
+    f_lo = npv[np.arange(rows), pick]
+
+    active = np.flatnonzero(bracketed)
+    r = np.where((guess > lo) & (guess < hi), guess, (lo + hi) / 2)
+    for _ in range(max_iterations):
+        if not len(active):
+            break
+        f, slope = _npv(r[active], years[active], amounts[active])
+        iterations[active] += 1
+        # Keep the root inside the bracket
+        low_side = np.sign(f) == np.sign(f_lo[active])
+        lo[active] = np.where(low_side, r[active], lo[active])
+        hi[active] = np.where(low_side, hi[active], r[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = r[active] - f / slope
+        inside = (step > lo[active]) & (step < hi[active])
+        new = np.where(f == 0, r[active], np.where(inside, step, (lo[active] + hi[active]) / 2))
+        done = np.abs(new - r[active]) <= tol * np.maximum(1, np.abs(r[active]))
+        r[active] = new
+        rate[active[done]] = new[done]
+        status[active[done]] = CONVERGED
+        active = active[~done]
+    return {'rate': rate, 'status': status, 'iterations': iterations}
+
+
+def cagr_many(initial_value, final_value, years):
+    """Annual growth rates from start and end values over `years` (NaN where undefined)."""
+    initial_value, final_value, years = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (initial_value, final_value, years)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = (final_value / initial_value) ** (1 / years) - 1
+    return np.where((years > 0) & (initial_value > 0) & (final_value > 0), growth, np.nan)
+
+
+def returns_table(results, initial_capitals, start_date, end_date):
+    """Strategy XIRR, buy-and-hold XIRR and CAGR of many run_backtest results, one row each.
+
+    `initial_capitals` is one capital or one per result. Both XIRRs end on the run's last bar;
+    `end_date` is exclusive, as in the app, and only sets the CAGR's span.
+    """
+    initial_capitals = np.broadcast_to(np.asarray(initial_capitals, dtype=float), len(results))
+    strategy, buy_hold, final_values = [], [], []
+    for result, capital in zip(results, initial_capitals.tolist()):
+        last_date = result['state']['last_date']
+        strategy.append(strategy_flows(result, capital, last_date))
+        buy_hold.append(buy_hold_flows(capital, result['initial_price'], result['initial_date'], result['final_price'],
+                                       last_date))
+        final_values.append(result['portfolio']['cash'] + result['portfolio']['units'] * float(result['final_price'] or 0))
+    years = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days / 365.25
+    xirr, bh_xirr = xirr_many(strategy), xirr_many(buy_hold)
+    return pd.DataFrame({
+        'xirr_pct': xirr['rate'] * 100,
+        'xirr_status': np.array(XIRR_STATUS, dtype=object)[xirr['status']],
+        'buy_hold_xirr_pct': bh_xirr['rate'] * 100,
+        'buy_hold_xirr_status': np.array(XIRR_STATUS, dtype=object)[bh_xirr['status']],
+        'cagr_pct': cagr_many(initial_capitals, final_values, years) * 100,
+    })
@@ -0,0 +1,242 @@
+"""TradeToday precomputed in the background: the universe is scanned on a schedule into a local store.
+
+    python scheduler.py                 # every weekday at RUN_AT, after the market closes
+    python scheduler.py --every 30      # every 30 minutes
+    python scheduler.py --once          # one pass now
+
+Each pass scans (checkpoints.scan) only the stale symbols and writes every symbol's result to a
+TodayStore: its recent Buy trades, last close and DMAs, last bar date and when it was scanned.
+An entry is stale when it was made for other parameters, capital, start or end date, before the
+latest market close (or the end date's close, for a window that ended earlier), or, while the
+market is open, more than REFRESH_AFTER ago. The app's TradeToday button
+renders the stored entries straight away and its refresh button rescans just the stale ones.
+Symbols the vectorised pre-screen (screen.py) rules out of buying since the cutoff are not
+simulated at all, so a pass over a window already checkpointed (the intraday passes of a day)
+costs in proportion to the symbols with a buy signal; the first pass after the lookback's start
+moves replays every symbol from the new start, as checkpoints.scan must. `--rules`
+scans a rules.py rule set instead of the built-in strategy; the pre-screen only knows the
+built-in one, so such a pass simulates every stale symbol.
+"""
+import argparse
+import json
+import os
+import sys
+import time as _time
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta
+from urllib.parse import quote
+
+import pandas as pd
+
+from checkpoints import MARKET_TZ, CheckpointStore, resumable, scan
+from engine import DEFAULT_PARAMS, WARMUP_DAYS
+from price_store import PriceStore
+from rules import compile_rules
+from screen import screen
+from tickers import ticker_options
+
+MARKET_OPEN, MARKET_CLOSE = time(9, 15), time(15, 30)
+RUN_AT = time(16, 0)  # daily pass, once the closing bars have settled on Yahoo
+REFRESH_AFTER = timedelta(minutes=15)  # intraday entries older than this are rescanned, as in PriceStore
+LOOKBACK_DAYS = 90  # the app's default start date
+RECENT_DAYS = 7  # Buy trades this close to the end date are today's trades
+# A symbol the pre-screen prunes keeps its checkpoint as it was; one this far behind is stepped
+# anyway, so its checkpoint never lags the price store by more than this
+PRUNE_MAX_AGE = timedelta(days=30)
+# TradeToday's strategy: the sidebar knobs without interest, capping or a final exit
+TODAY_PARAMS = ['profit_threshold', 'sell_pct', 'drop_threshold', 'strong_buy_allocation', 'moderate_buy_allocation',
+                'maintenance_fee']
+
+
+def scan_key(capital, params, start_date, end_date, rules=None):
+    """What an entry was computed for, its window included (the start fixes the Muhurut buy and
+    the cash, the end the buys' cutoff); a different key makes it stale."""
+    key = {'initial_capital': float(capital), **{k: float(params[k]) for k in TODAY_PARAMS},
+           'start_date': str(pd.Timestamp(start_date).date()), 'end_date': str(pd.Timestamp(end_date).date())}
+    if rules is not None:
+        key['rules'] = compile_rules(rules).spec
+    return key
+
+
+class TodayStore:
+    """One JSON TradeToday entry per symbol under `root`."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol):
+        return os.path.join(self.root, quote(symbol, safe='') + '.json')
+
+    def read(self, symbol):
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def write(self, symbol, entry):
+        path = self._path(symbol)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(entry, f)
+        os.replace(path + '.tmp', path)
+
+
+def latest_close(now):
+    """The last weekday market close at or before `now` (tz-aware)."""
+    day = now.astimezone(MARKET_TZ).date()
+    while True:
+        close = datetime.combine(day, MARKET_CLOSE, MARKET_TZ)
+        if day.weekday() < 5 and close <= now:
+            return close
+        day -= timedelta(days=1)
+
+
+def market_open(now):
+    local = now.astimezone(MARKET_TZ)
+    return local.weekday() < 5 and MARKET_OPEN <= local.time() < MARKET_CLOSE
+
+
+def is_stale(entry, key, now, max_age=None):
+    if entry is None or entry['key'] != key:
+        return True
+    scanned_at = datetime.fromisoformat(entry['scanned_at'])
+    end = datetime.combine(date.fromisoformat(key['end_date']), MARKET_CLOSE, MARKET_TZ)
+    if scanned_at < min(latest_close(now), end):
+        return True
+    if end < latest_close(now):
+        # A window that ended before the last close has no bar left to change
+        return False
+    if market_open(now) and now - scanned_at > REFRESH_AFTER:
+        return True
+    return max_age is not None and now - scanned_at > max_age
+
+
+def universe_capital(total_capital):
+    """{symbol: capital} of ticker_options, each symbol's percent of total_capital as in the app."""
+    return {info["symbol"]: total_capital * info.get("percent", 100) / 100 for info in ticker_options.values()}
+
+
+def stale_symbols(store, capitals, params, start_date, end_date, now=None, max_age=None, rules=None):
+    now = now or datetime.now(MARKET_TZ)
+    return [symbol for symbol, capital in capitals.items()
+            if is_stale(store.read(symbol), scan_key(capital, params, start_date, end_date, rules), now, max_age)]
+
+
+def scan_symbols(price_store, checkpoints, store, capitals, params, start_date, end_date, now=None, prescreen=True,
+                 rules=None, stage=None):
+    """Scan {symbol: capital} over start_date..end_date (inclusive) and store each symbol's entry.
+
+    Returns the entries by symbol. A symbol that failed to load or has too little history gets an
+    entry with its error, so it is not rescanned until it goes stale. With `prescreen`, symbols
+    with a recent checkpoint that screen.screen() rules out of buying since the cutoff are not
+    simulated; their entry has the checkpoint's buys, the screen's last close and DMAs and
+    `pruned` set. A symbol without a checkpoint for this window's start is always simulated, as
+    there are no trades to report for it otherwise. With a rules.py rule set in `rules`, which the
+    pre-screen does not know, every symbol is simulated.
+
+    `stage` (profiling.Profiler.stage, say) is entered around the fetch, the pre-screen and each
+    symbol's scan, the latter as 'ticker <symbol>'.
+    """
+    now = now or datetime.now(MARKET_TZ)
+    stage = stage or (lambda name: nullcontext())
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    with stage("fetch"):
+        frames, errors = price_store.load_many(list(capitals), start_date - timedelta(days=WARMUP_DAYS),
+                                               end_date + timedelta(days=1))
+    cutoff = end_date - timedelta(days=RECENT_DAYS)
+    knobs = {k: params[k] for k in TODAY_PARAMS}
+    closes = {symbol: frames.pop(symbol)['Close'] for symbol in capitals if symbol in frames}
+    pruned = {}
+    if prescreen and rules is None and closes:
+        with stage("prescreen"):
+            closes = {symbol: series.dropna() for symbol, series in closes.items()}
+            resumed = {symbol: resumable(checkpoints, symbol, series, capitals[symbol], knobs)
+                       for symbol, series in closes.items()}
+            screened = screen(closes, capitals, knobs, cutoff,
+                              {symbol: checkpoint['state'] for symbol, checkpoint in resumed.items() if checkpoint})
+            pruned = {symbol: resumed[symbol] for symbol in screened.index[~screened['candidate']]
+                      if resumed[symbol] and resumed[symbol]['state']['last_date'] >= end_date - PRUNE_MAX_AGE}
+    entries = {}
+    for symbol, capital in capitals.items():
+        entry = {'symbol': symbol, 'key': scan_key(capital, params, start_date, end_date, rules),
+                 'scanned_at': now.isoformat(), 'capital': capital, 'as_of': None, 'last': None, 'buys': [],
+                 'resumed': False, 'pruned': False, 'error': errors.get(symbol)}
+        with stage(f"ticker {symbol}"):
+            if symbol in pruned:
+                row = screened.loc[symbol]
+                entry.update(as_of=str(closes[symbol].index[-1].date()), resumed=True, pruned=True,
+                             last={'Close': float(row['last_close']), '30DMA': float(row['last_dma30']),
+                                   '50DMA': float(row['last_dma50']), '200DMA': float(row['last_dma200'])},
+                             buys=[[t[0].isoformat(), *t[1:]] for t in pruned[symbol]['trades'] if t[0] > cutoff and t[1] == 'Buy'])
+            elif symbol in closes:
+                scanned = scan(checkpoints, symbol, closes[symbol], capital, knobs, now, rules=rules)
+                if scanned is None:
+                    entry['error'] = 'insufficient history for the 200DMA'
+                else:
+                    entry.update(as_of=str(closes[symbol].index[-1].date()), last=scanned['last'], resumed=scanned['resumed'],
+                                 buys=[[t[0].isoformat(), *t[1:]] for t in scanned['trades'] if t[0] > cutoff and t[1] == 'Buy'])
+            store.write(symbol, entry)
+        entries[symbol] = entry
+    return entries
+
+
+def run_pass(price_store, checkpoints, store, total_capital, params, now=None, max_age=None, rules=None):
+    """Scan every stale symbol of the universe up to today; returns their entries by symbol."""
+    now = now or datetime.now(MARKET_TZ)
+    capitals = universe_capital(total_capital)
+    today = pd.Timestamp(now.astimezone(MARKET_TZ).date())
+    start = today - timedelta(days=LOOKBACK_DAYS)
+    symbols = stale_symbols(store, capitals, params, start, today, now, max_age, rules)
+    if not symbols:
+        return {}
+    return scan_symbols(price_store, checkpoints, store, {s: capitals[s] for s in symbols}, params, start, today, now,
+                        rules=rules)
+
+
+def next_run(now, every=None):
+    """When the next pass is due: `every` from now, or the next weekday's RUN_AT."""
+    if every:
+        return now + every
+    day = now.astimezone(MARKET_TZ).date()
+    while True:
+        at = datetime.combine(day, RUN_AT, MARKET_TZ)
+        if day.weekday() < 5 and at > now:
+            return at
+        day += timedelta(days=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--every', type=float, help='minutes between passes (default: daily after the close)')
+    parser.add_argument('--once', action='store_true', help='run one pass now and exit')
+    parser.add_argument('--capital', type=float, default=60000000, help='total capital, split by ticker_options percent')
+    for knob in TODAY_PARAMS:
+        parser.add_argument('--' + knob.replace('_', '-'), type=float, default=DEFAULT_PARAMS[knob],
+                            help=f"default {DEFAULT_PARAMS[knob]}")
+    parser.add_argument('--rules', help='JSON rule set (see rules.py) in place of the built-in strategy')
+    parser.add_argument('--store', default=os.environ.get("PRICE_STORE_DIR", ".price_store"), help='price store directory')
+    args = parser.parse_args(argv)
+
+    price_store = PriceStore(args.store)
+    checkpoints = CheckpointStore(os.path.join(price_store.root, "checkpoints"))
+    store = TodayStore(os.path.join(price_store.root, "today"))
+    params = {knob: getattr(args, knob) for knob in TODAY_PARAMS}
+    rules = compile_rules(args.rules) if args.rules else None
+    every = timedelta(minutes=args.every) if args.every else None
+    while True:
+        if not args.once:
+            due = next_run(datetime.now(MARKET_TZ), every)
+            print(f"next pass at {due:%Y-%m-%d %H:%M %Z}", flush=True)
+            _time.sleep(max(0.0, (due - datetime.now(MARKET_TZ)).total_seconds()))
+        started = datetime.now(MARKET_TZ)
+        entries = run_pass(price_store, checkpoints, store, args.capital, params, started, max_age=every, rules=rules)
+        print(f"{started:%Y-%m-%d %H:%M} scanned {len(entries)} stale symbols "
+              f"({sum(entry['pruned'] for entry in entries.values())} pruned by the pre-screen) in "
+              f"{(datetime.now(MARKET_TZ) - started).total_seconds():.1f}s", flush=True)
+        if args.once:
+            return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
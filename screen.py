@@ -0,0 +1,113 @@
+"""TradeToday pre-screen: which symbols could have bought since a cutoff date, for the whole universe at once.
+
+TradeToday only reports the Buy trades after its cutoff, yet a scan simulates every symbol's
+whole path. `screen` evaluates the Strong / Moderate buy conditions of engine.signal_masks on
+one bars x symbols matrix of each symbol's trailing closes (enough for the 200DMA of every bar
+after the cutoff) and only passes on the symbols that could have fired a buy there; the rest
+are pruned without a simulation.
+
+The screen must never prune a symbol the full scan would buy, so each test is the loose side of
+the engine's:
+
+- the DMA comparisons allow TOLERANCE of relative slack, as trailing windows round differently
+  from the full-history rolling means;
+- the running peak is at least every close so far (the engine leaves out the warm-up bars) and
+  the peak of the checkpoint the scan would resume;
+- a buy needs allocation / close >= 1 (TradeToday never caps allocations) and, when resuming,
+  cash: a checkpoint with no cash left stays that way unless a sell signal follows it;
+- a fresh run's one-unit Muhurut buy on its first bar counts when that bar is after the cutoff.
+"""
+import numpy as np
+import pandas as pd
+
+from indicators import DMA_WINDOWS, WARMUP_BARS
+
+TOLERANCE = 1e-9
+CANDIDATE_REASONS = ['signal', 'muhurut', 'unscreened']
+
+
+def _gt(a, b, tolerance):
+    """a > b, loosened by `tolerance` relative to b."""
+    return a > b - tolerance * np.abs(b)
+
+
+def trailing_matrix(closes, rows):
+    """(dates, values): the last `rows` bars of each {symbol: Close series}, as rows x symbols arrays.
+
+    Columns are bottom-aligned on each symbol's own last bar; shorter histories are padded at the
+    top with NaT / NaN.
+    """
+    dates = np.full((rows, len(closes)), np.datetime64('NaT'), dtype='datetime64[ns]')
+    values = np.full((rows, len(closes)), np.nan)
+    for j, series in enumerate(closes.values()):
+        tail = series.iloc[-rows:]
+        dates[rows - len(tail):, j] = tail.index.to_numpy(dtype='datetime64[ns]')
+        values[rows - len(tail):, j] = tail.to_numpy(dtype=float)
+    return dates, values
+
+
+def screen(closes, capitals, params, cutoff, states=None, tolerance=TOLERANCE):
+    """Pre-screen {symbol: Close series} (sorted, no NaN) for buys after `cutoff`.
+
+    `capitals` is {symbol: capital}, `params` the strategy knobs and `states` {symbol: the
+    checkpoints.resumable() state, or None}. Returns a frame indexed by symbol: `candidate`
+    (must be simulated), `reason` (CANDIDATE_REASONS, or 'no cash' / 'no signal' / 'history' when
+    pruned), `signals` (bars after the cutoff passing the buy test) and the last bar's
+    `last_close` and DMAs (trailing means).
+    """
+    symbols = list(closes)
+    states = states or {}
+    cutoff = np.datetime64(pd.Timestamp(cutoff), 'ns')
+    lengths = np.array([len(series) for series in closes.values()], dtype=np.int64)
+    recent = np.array([len(series) - series.index.searchsorted(cutoff, 'right') for series in closes.values()],
+                      dtype=np.int64)
+    window = max(int(recent.max(initial=0)), 1)
+    dates, values = trailing_matrix(closes, WARMUP_BARS + window)
+    frame = pd.DataFrame(values)
+    dmas = {w: frame.rolling(w).mean().to_numpy()[-window:] for w in DMA_WINDOWS}
+    dma30, dma50, dma200 = dmas[30], dmas[50], dmas[200]
+
+    # Upper bound on the running peak: every close so far and the resumed checkpoint's peak
+    prior = np.array([series.iloc[:-len(values)].max() if len(series) > len(values) else -np.inf
+                      for series in closes.values()])
+    state_peak = np.array([(states.get(s) or {}).get('peak') or -np.inf for s in symbols], dtype=float)
+    peak = np.fmax(np.fmax.accumulate(values, axis=0), np.maximum(prior, state_peak))[-window:]
+    dates, close = dates[-window:], values[-window:]
+
+    dip = close <= peak * (1 - params['drop_threshold']) * (1 + tolerance)
+    strong = _gt(dma200, dma50, tolerance) & _gt(dma50, close, tolerance) & dip
+    moderate = _gt(dma50, dma30, tolerance) & _gt(dma30, close, tolerance) & dip
+    capital = np.array([capitals[s] for s in symbols], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        buy = ((strong & (capital * params['strong_buy_allocation'] / close >= 1))
+               | (moderate & (capital * params['moderate_buy_allocation'] / close >= 1)))
+    buy &= np.arange(window)[:, None] >= window - recent  # only bars after the cutoff
+    signals = buy.sum(axis=0)
+    # A bar whose DMAs this window cannot give might be a sell
+    sell = (_gt(close, dma50, tolerance) & _gt(dma50, dma200, tolerance)) | np.isnan(dma200)
+
+    reason = np.where(signals > 0, 'signal', 'no signal').astype(object)
+    for j, symbol in enumerate(symbols):
+        state = states.get(symbol)
+        if state is not None and lengths[j] <= WARMUP_BARS + recent[j]:
+            # Resumed on the checkpoint's own tail closes, so these closes alone cannot give its DMAs
+            reason[j] = 'unscreened'
+        elif lengths[j] <= WARMUP_BARS:
+            reason[j] = 'history'
+        elif state is None and closes[symbol].index[WARMUP_BARS] > cutoff:
+            reason[j] = 'muhurut'
+        elif signals[j] and state is not None and state['cash'] <= 0:
+            # Only a sell brings cash back; one before the checkpoint's bar is already in its state
+            last = np.datetime64(pd.Timestamp(state['last_date']), 'ns')
+            covered = dates[0, j] <= last
+            if covered and not (sell[:, j] & (dates[:, j] > last)).any():
+                reason[j] = 'no cash'
+    return pd.DataFrame({
+        'candidate': np.isin(reason, CANDIDATE_REASONS),
+        'reason': reason,
+        'signals': signals,
+        'last_close': close[-1],
+        'last_dma30': dma30[-1],
+        'last_dma50': dma50[-1],
+        'last_dma200': dma200[-1],
+    }, index=pd.Index(symbols, name='symbol'))
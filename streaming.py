@@ -0,0 +1,183 @@
+"""The strategy over local bar files too big for one DataFrame, read and run a chunk at a time.
+
+    python streaming.py archive/2019.parquet archive/2020.parquet --date-column Datetime --chunk 200000
+
+`read_bars` yields (dates, closes) chunks of CSV or Parquet files, `indicator_chunks` carries the
+moving averages across chunk boundaries in an indicators.SymbolIndicators trimmed back to the
+longest window after every chunk, and `run_stream` runs each chunk through engine.run_backtest,
+passing the run's `state` on to the next one. Only one chunk, the last 200 closes and the
+current portfolio are ever held, so memory does not grow with the files; the chunk's ledger goes
+to an `on_ledger` callback (the CLI exports it) and is then dropped. The result is the same as
+one run_backtest over add_moving_averages of all the bars, except that a coalesced Interest row
+(`interest_period`) is split where a period straddles two chunks.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from engine import DEFAULT_PARAMS, close_position, run_backtest
+from export import Exporter, ledger_table
+from indicators import DMA_WINDOWS, SymbolIndicators
+from ledger import Ledger
+from returns import cagr_many
+from sweep import SWEEP_PARAMS
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # CSV only
+    pq = None
+
+CHUNK_ROWS = 100_000
+
+
+def read_bars(paths, date_column='Date', close_column='Close', chunk_rows=CHUNK_ROWS):
+    """Yield (datetime64[ns] dates, float closes) of the bars in `paths`, in order, chunk_rows at a time.
+
+    Files are CSV or Parquet (by extension) with bars in ascending date order; rows without a
+    close are skipped and time zones dropped, as in price_store.
+    """
+    last = None
+    for path in [paths] if isinstance(paths, str) else paths:
+        if path.endswith('.parquet'):
+            if pq is None:
+                raise ValueError("reading Parquet bars needs pyarrow")
+            # Without pre-buffering, since pre-buffered row groups stay allocated until the file is closed
+            batches = (batch.to_pandas() for batch in
+                       pq.ParquetFile(path, pre_buffer=False).iter_batches(batch_size=chunk_rows, columns=[date_column, close_column]))
+        else:
+            batches = pd.read_csv(path, usecols=[date_column, close_column], chunksize=chunk_rows, float_precision='round_trip')
+        for frame in batches:
+            frame = frame.dropna(subset=[close_column])
+            if frame.empty:
+                continue
+            index = pd.DatetimeIndex(pd.to_datetime(frame[date_column]))
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            dates = index.to_numpy(dtype='datetime64[ns]')
+            if (last is not None and dates[0] <= last) or (np.diff(dates.view(np.int64)) <= 0).any():
+                raise ValueError(f"bars in {path} are not in ascending date order")
+            last = dates[-1]
+            yield dates, frame[close_column].to_numpy(dtype=float)
+
+
+def indicator_chunks(chunks):
+    """Yield {'dates', 'Close', '30DMA', '50DMA', '200DMA'} arrays for each (dates, closes) chunk.
+
+    Bars still inside the 200-bar warm-up are left out, as add_moving_averages drops them.
+    """
+    series = SymbolIndicators()
+    for dates, closes in chunks:
+        series.extend(dates, closes)
+        # Views: trim() moves the kept bars to new buffers and leaves these ones alone
+        window = {name: values for name, values in series.last(len(closes)).items() if name != 'peak'}
+        series.trim(max(DMA_WINDOWS))
+        defined = ~np.isnan(window['200DMA'])
+        if not defined.all():
+            window = {name: values[defined] for name, values in window.items()}
+        if len(window['dates']):
+            yield window
+
+
+def run_stream(chunks, initial_capital, params, start_date=None, cap_allocation=True, close_out=True,
+               interest_period=None, on_ledger=None):
+    """Backtest a stream of indicator_chunks() windows under `params` (run_backtest's keywords).
+
+    Bars before `start_date` only feed the running peak, as in run_backtest. Each chunk's ledger
+    is passed to `on_ledger` (the Final_Exit row comes in a last one-row ledger). Returns
+    {'portfolio', 'state', 'initial_price', 'initial_date', 'final_price', 'last_date', 'bars',
+    'trades'}, trades counting Buy and Sell rows as engine.summarize does, or None if no bar is
+    on or after `start_date`.
+    """
+    start = None if start_date is None else np.datetime64(pd.Timestamp(start_date), 'ns')
+    peak, result, bars, trades = None, None, 0, 0
+    last_date = last_price = None
+    for window in chunks:
+        dates, closes = window['dates'], window['Close']
+        bars += len(dates)
+        last_date, last_price = dates[-1], float(closes[-1])
+        if result is None and start is not None and dates[-1] < start:
+            # Before the first traded bar only the running peak moves
+            high = float(closes.max())
+            peak = high if peak is None else max(peak, high)
+            continue
+        result = run_backtest(dates, closes, window['30DMA'], window['50DMA'], window['200DMA'], initial_capital,
+                              start_date=start_date if result is None else None, cap_allocation=cap_allocation,
+                              close_out=False, state=None if result is None else result['state'],
+                              interest_period=interest_period, initial_peak=peak, **params)
+        trades += result['trade_history'].count('Buy', 'Sell')
+        if on_ledger:
+            on_ledger(result['trade_history'])
+    if result is None:
+        return None
+    if close_out:
+        # close_position books into the run's ledger; give it a fresh one for just its own row
+        result['trade_history'] = Ledger(interest_period)
+        close_position(result, last_date, last_price)
+        trades += result['trade_history'].count('Buy', 'Sell')
+        if on_ledger and len(result['trade_history']):
+            on_ledger(result['trade_history'])
+    return {'portfolio': result['portfolio'], 'state': result['state'], 'initial_price': result['initial_price'],
+            'initial_date': result['initial_date'], 'final_price': last_price, 'last_date': last_date, 'bars': bars,
+            'trades': trades}
+
+
+def summarize_stream(result, initial_capital):
+    """Final value, return, CAGR from the first traded bar to the last, trades and buy-and-hold value."""
+    final_value = result['portfolio']['cash'] + result['portfolio']['units'] * result['final_price']
+    years = (pd.Timestamp(result['last_date']) - pd.Timestamp(result['initial_date'])).days / 365.25
+    initial_price = result['initial_price']
+    buy_hold_value = initial_capital / initial_price * result['final_price'] if initial_price and initial_price > 0 else float('nan')
+    return {
+        'bars': result['bars'],
+        'final_value': final_value,
+        'return_pct': (final_value / initial_capital - 1) * 100,
+        'cagr_pct': float(cagr_many(initial_capital, final_value, years)) * 100,
+        'trades': result['trades'],
+        'buy_hold_value': buy_hold_value,
+        'buy_hold_cagr_pct': float(cagr_many(initial_capital, buy_hold_value, years)) * 100,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='CSV or Parquet bar files, in date order')
+    parser.add_argument('--date-column', default='Date', help='column holding the bar timestamps')
+    parser.add_argument('--close-column', default='Close', help='column holding the closes')
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help='bars read per chunk')
+    parser.add_argument('--start', help='first traded date (earlier bars only feed the running peak)')
+    parser.add_argument('--capital', type=float, default=60000000, help='initial capital')
+    for knob in SWEEP_PARAMS:
+        parser.add_argument('--' + knob.replace('_', '-'), type=float, default=DEFAULT_PARAMS[knob],
+                            help=f"default {DEFAULT_PARAMS[knob]}")
+    parser.add_argument('--interest-rate-pct', type=float, default=DEFAULT_PARAMS['interest_rate_pct'],
+                        help='interest on idle cash, 0 for none')
+    parser.add_argument('--out', help='export the ledger (see export.py) to this directory')
+    args = parser.parse_args(argv)
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"No such file: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    params = {**DEFAULT_PARAMS, **{knob: getattr(args, knob) for knob in SWEEP_PARAMS},
+              'interest_rate_pct': args.interest_rate_pct or None}
+    exporter = Exporter(args.out) if args.out else None
+    try:
+        chunks = indicator_chunks(read_bars(args.paths, args.date_column, args.close_column, args.chunk))
+        result = run_stream(chunks, args.capital, params, start_date=args.start,
+                            on_ledger=(lambda ledger: exporter.write('ledger', ledger_table(ledger))) if exporter else None)
+    finally:
+        if exporter:
+            exporter.close()
+    if result is None:
+        print("No bars to trade after the 200-bar warm-up and the start date", file=sys.stderr)
+        return 1
+    for key, value in summarize_stream(result, args.capital).items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Monte Carlo stress test: the strategy on thousands of resampled price paths of one symbol.
+
+    python stress.py HDFCBANK.NS --paths 10000 --years 5 --method block --block 20
+
+Each path continues the symbol's last WARMUP_BARS closes with `years` of daily log returns drawn
+from its history, either in blocks of consecutive days (method 'block', which keeps short-range
+autocorrelation and volatility clustering) or as alternating runs of the days spent above and
+below the 200DMA (method 'regime', which keeps the length and character of up- and
+down-trends). The 30/50/200-day averages are recomputed on every path and the strategy runs on
+all paths of a chunk at once as lanes.run_lanes lanes. Chunks of CHUNK_PATHS paths bound the
+memory and are spread over a process pool; each chunk draws from its own seed, so the paths do
+not depend on the number of workers. The result is one row per path (final value, CAGR, maximum
+drawdown, trades and buy-and-hold CAGR) and `bands` gives their percentiles.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from engine import DEFAULT_PARAMS, WARMUP_DAYS
+from lanes import run_lanes
+from price_store import PriceStore
+from returns import cagr_many
+from sweep import SWEEP_PARAMS, series_columns
+
+METHODS = ['block', 'regime']
+WARMUP_BARS = 250  # history ahead of every path: the 200DMA and the running peak start from it
+TRADING_DAYS = 252
+CHUNK_PATHS = 500
+MIN_REGIME_RUNS = 5  # runs above and below the 200DMA 'regime' needs of each; fewer repeat on every path
+PERCENTILES = [5, 25, 50, 75, 95]
+RESULT_COLUMNS = ['final_value', 'return_pct', 'cagr_pct', 'max_drawdown_pct', 'trades', 'buy_hold_cagr_pct']
+
+
+def block_returns(log_returns, n_paths, length, block, rng):
+    """length x n_paths returns made of random blocks of `block` consecutive days."""
+    block = max(1, min(int(block), len(log_returns)))
+    n_blocks = -(-length // block)
+    starts = rng.integers(0, len(log_returns) - block + 1, (n_paths, n_blocks))
+    index = (starts[:, :, None] + np.arange(block)).reshape(n_paths, -1)[:, :length]
+    return log_returns[index].T
+
+
+def regimes(close, dma200):
+    """For every return (day to next day) once the 200DMA has a full window: the mask of those
+    returns, and whether each one's day started above the 200DMA."""
+    defined = ~np.isnan(dma200[:-1])
+    return defined, (close > dma200)[:-1][defined]
+
+
+def regime_runs(above):
+    """{False: [(start, end), ...], True: [...]}: the runs of `above` below and above the 200DMA."""
+    cuts = np.flatnonzero(np.diff(above.astype(np.int8))) + 1
+    starts, ends = np.r_[0, cuts], np.r_[cuts, len(above)]
+    return {label: [(a, b) for a, b in zip(starts.tolist(), ends.tolist()) if above[a] == label] for label in (False, True)}
+
+
+def regime_returns(log_returns, above, n_paths, length, rng):
+    """length x n_paths returns alternating whole historical runs above and below the 200DMA.
+
+    `above` flags, for every return, whether its day started above the 200DMA.
+    """
+    runs = regime_runs(above)
+    labels = [label for label in (False, True) if runs[label]]
+    out = np.empty((length, n_paths))
+    for path in range(n_paths):
+        label, pos = labels[int(rng.integers(len(labels)))], 0
+        while pos < length:
+            a, b = runs[label][int(rng.integers(len(runs[label])))]
+            take = min(b - a, length - pos)
+            out[pos:pos + take, path] = log_returns[a:a + take]
+            pos += take
+            if len(labels) == 2:
+                label = not label
+    return out
+
+
+def moving_average(matrix, window):
+    """Trailing `window`-bar mean down the first axis, NaN until the window is full."""
+    sums = np.cumsum(matrix, axis=0)
+    out = np.full(matrix.shape, np.nan)
+    if len(matrix) >= window:
+        out[window - 1] = sums[window - 1]
+        out[window:] = sums[window:] - sums[:-window]
+        out[window - 1:] /= window
+    return out
+
+
+def _run_chunk(chunk, n_paths, history, initial_capital, params, years, method, block, seed):
+    """RESULT_COLUMNS arrays for chunk number `chunk` of n_paths paths."""
+    dates, close, dma200 = history
+    rng = np.random.default_rng([seed, chunk])
+    log_returns = np.diff(np.log(close))
+    length = years * TRADING_DAYS
+    if method == 'block':
+        drawn = block_returns(log_returns, n_paths, length, block, rng)
+    else:
+        defined, above = regimes(close, dma200)
+        drawn = regime_returns(log_returns[defined], above, n_paths, length, rng)
+
+    warmup = close[-WARMUP_BARS:]
+    paths = np.empty((len(warmup) + length, n_paths))
+    paths[:len(warmup)] = warmup[:, None]
+    paths[len(warmup):] = warmup[-1] * np.exp(np.cumsum(drawn, axis=0))
+    path_dates = np.concatenate([dates[-WARMUP_BARS:],
+                                 pd.bdate_range(pd.Timestamp(dates[-1]) + pd.offsets.BDay(), periods=length).to_numpy()])
+    start = path_dates[len(warmup)]
+    result = run_lanes(path_dates, paths, moving_average(paths, 30), moving_average(paths, 50), moving_average(paths, 200),
+                       initial_capital, [params] * n_paths, start_date=start, drawdown=True)
+
+    span = (pd.Timestamp(path_dates[-1]) + timedelta(days=1) - pd.Timestamp(start)).days / 365.25
+    buy_hold = initial_capital / result['initial_price'] * result['final_price']
+    return {
+        'final_value': result['cash'],
+        'return_pct': (result['cash'] / initial_capital - 1) * 100,
+        'cagr_pct': cagr_many(initial_capital, result['cash'], span) * 100,
+        'max_drawdown_pct': result['max_drawdown'] * 100,
+        'trades': result['trades'],
+        'buy_hold_cagr_pct': cagr_many(initial_capital, buy_hold, span) * 100,
+    }
+
+
+def run_stress(data, initial_capital, params, n_paths=1000, years=5, method='block', block=20, seed=0,
+               workers=None, chunk_paths=CHUNK_PATHS):
+    """Run the strategy on n_paths resampled paths of `years` after the end of `data`.
+
+    `data` is an OHLCV frame, every close of which is resampled (the averages are recomputed on the
+    paths, so its warm-up rows count too), or IndicatorStore.window() arrays as for sweep.run_sweep,
+    with at least WARMUP_BARS bars; 'regime' also needs MIN_REGIME_RUNS runs above and below the
+    200DMA in it. Returns one row (RESULT_COLUMNS) per path.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown resampling method: {method}")
+    if isinstance(data, dict):
+        dates, close, _, _, dma200 = series_columns(data)
+    else:
+        dates = data.index.to_numpy(dtype='datetime64[ns]')
+        close = data['Close'].to_numpy(dtype=float)
+        dma200 = data['Close'].rolling(window=200).mean().to_numpy(dtype=float)
+    if len(close) < WARMUP_BARS:
+        raise ValueError(f"need at least {WARMUP_BARS} bars of history, got {len(close)}")
+    history = (dates, np.asarray(close, dtype=float), np.asarray(dma200, dtype=float))
+    if method == 'regime':
+        runs = regime_runs(regimes(history[1], history[2])[1])
+        if min(len(runs[False]), len(runs[True])) < MIN_REGIME_RUNS:
+            raise ValueError(f"regime resampling needs at least {MIN_REGIME_RUNS} runs above and below the 200DMA, "
+                             f"the history has {len(runs[True])} above and {len(runs[False])} below; "
+                             f"load a longer history or resample in blocks")
+    sizes = [min(chunk_paths, n_paths - i) for i in range(0, n_paths, chunk_paths)]
+    run = partial(_run_chunk, history=history, initial_capital=initial_capital, params=params, years=years,
+                  method=method, block=block, seed=seed)
+
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    if workers <= 1:
+        chunks = [run(chunk, size) for chunk, size in enumerate(sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            chunks = list(pool.map(run, range(len(sizes)), sizes))
+    return pd.DataFrame({k: np.concatenate([c[k] for c in chunks]) if chunks else [] for k in RESULT_COLUMNS})
+
+
+def bands(table, percentiles=PERCENTILES):
+    """Percentiles of every result column over the paths, one row per percentile."""
+    stats = table[RESULT_COLUMNS].quantile([q / 100 for q in percentiles])
+    stats.index = [f"p{q}" for q in percentiles]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('symbol', help='Yahoo symbol whose history is resampled')
+    parser.add_argument('--history', type=int, default=10, help='years of history to resample')
+    parser.add_argument('--paths', type=int, default=1000, help='number of price paths')
+    parser.add_argument('--years', type=int, default=5, help='length of every path in years')
+    parser.add_argument('--method', choices=METHODS, default='block', help='how returns are resampled')
+    parser.add_argument('--block', type=int, default=20, help="block length in days for --method block")
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--capital', type=float, default=60000000, help='capital for the symbol')
+    for knob in SWEEP_PARAMS:
+        parser.add_argument('--' + knob.replace('_', '-'), type=float, default=DEFAULT_PARAMS[knob],
+                            help=f"default {DEFAULT_PARAMS[knob]}")
+    parser.add_argument('--store', default=os.environ.get("PRICE_STORE_DIR", ".price_store"), help='price store directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--out', help='write one row per path to this CSV')
+    args = parser.parse_args(argv)
+
+    end_date = pd.Timestamp.today().normalize() + timedelta(days=1)
+    start = end_date - timedelta(days=math.ceil(args.history * 365.25) + WARMUP_DAYS)
+    df = PriceStore(args.store).load(args.symbol, start, end_date)
+    if df.empty:
+        print(f"No data found for ticker {args.symbol}", file=sys.stderr)
+        return 1
+
+    params = {**DEFAULT_PARAMS, **{knob: getattr(args, knob) for knob in SWEEP_PARAMS}}
+    table = run_stress(df, args.capital, params, args.paths, args.years, args.method, args.block, args.seed, args.workers)
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(f"{len(table)} paths of {args.years} years")
+    print(bands(table).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""Grid search over the strategy knobs for one symbol.
+
+    python sweep.py HDFCBANK.NS --start 2015-01-01 --profit-threshold 20:100:20 --sell-pct 0.01,0.05
+    python sweep.py HDFCBANK.NS --start 2015-01-01 --profit-threshold 20:100:20 --engine pool --workers 8
+
+Each knob takes a single value, a comma list or an inclusive start:stop:step range; knobs left out
+keep engine.DEFAULT_PARAMS. The default 'lanes' engine backtests the whole grid in one pass of
+lanes.run_lanes. The 'pool' engine runs run_backtest once per set over a process pool: the
+dates, closes and moving averages are copied once into a shared-memory block that every worker
+maps read-only, so a task carries only its parameter sets. `--rules` sweeps a rules.py rule set
+instead of the built-in strategy; lanes only know the built-in one, so such a sweep runs
+run_backtest once per set (over the pool with --engine pool).
+"""
+import argparse
+import itertools
+import math
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from engine import DEFAULT_PARAMS, WARMUP_DAYS, add_moving_averages, run_backtest, summarize
+from lanes import run_lanes, summarize_lanes
+from price_store import PriceStore
+from rules import compile_rules
+
+SWEEP_PARAMS = ['profit_threshold', 'sell_pct', 'drop_threshold', 'strong_buy_allocation', 'moderate_buy_allocation']
+SERIES_ROWS = ['dates', 'close', 'dma30', 'dma50', 'dma200']
+ENGINES = ['lanes', 'pool']
+RESULT_COLUMNS = SWEEP_PARAMS + ['cagr_pct', 'outperformance_pct', 'trades', 'return_pct', 'final_value']
+
+# Series this process sweeps over: mapped from the parent's shared block in workers, plain arrays in-process
+_series = {}
+
+
+def parse_range(text):
+    """'0.1', '0.1,0.2,0.5' or inclusive 'start:stop:step' -> list of floats."""
+    text = str(text).strip()
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        if step <= 0:
+            raise ValueError(f"range step must be positive: {text}")
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        return [round(start + i * step, 10) for i in range(max(count, 0))]
+    return [float(v) for v in text.split(',') if v.strip()]
+
+
+def param_grid(ranges, base=None):
+    """Every combination of `ranges` ({knob: values}) laid over `base` (DEFAULT_PARAMS by default)."""
+    base = dict(DEFAULT_PARAMS if base is None else base)
+    keys = [k for k in SWEEP_PARAMS if k in ranges]
+    return [{**base, **dict(zip(keys, values))} for values in itertools.product(*(ranges[k] for k in keys))]
+
+
+def series_columns(data):
+    """[dates, Close, 30DMA, 50DMA, 200DMA] arrays of an OHLCV frame or IndicatorStore.window() arrays."""
+    if not isinstance(data, dict):
+        if '200DMA' not in data:
+            data = add_moving_averages(data)
+        data = {'dates': data.index.to_numpy(dtype='datetime64[ns]'), **{c: data[c].to_numpy(dtype=float) for c in data}}
+    return [np.asarray(data['dates'], dtype='datetime64[ns]')] + [data[c] for c in ['Close', '30DMA', '50DMA', '200DMA']]
+
+
+def _set_series(dates, close, dma30, dma50, dma200):
+    _series.update(dates=dates, close=close, dma30=dma30, dma50=dma50, dma200=dma200)
+
+
+def _attach(name, n):
+    shm = SharedMemory(name=name)
+    block = np.ndarray((len(SERIES_ROWS), n), dtype=np.float64, buffer=shm.buf)
+    block.flags.writeable = False
+    _series['shm'] = shm  # keep the mapping alive for the life of the worker
+    _set_series(block[0].view('datetime64[ns]'), *block[1:])
+
+
+def _run_chunk(param_sets, initial_capital, start_date, end_date, rules=None, indicators=None):
+    rows = []
+    for params in param_sets:
+        result = run_backtest(_series['dates'], _series['close'], _series['dma30'], _series['dma50'], _series['dma200'],
+                              initial_capital, start_date=start_date, rules=rules, indicators=indicators, **params)
+        summary = summarize(result, initial_capital, start_date, end_date)
+        rows.append({**{k: params[k] for k in SWEEP_PARAMS}, **{k: summary[k] for k in RESULT_COLUMNS if k in summary}})
+    return rows
+
+
+def rank(rows, by='cagr_pct'):
+    """Results best-first by `by`, NaN last, with a 1-based rank column."""
+    table = pd.DataFrame(rows, columns=RESULT_COLUMNS).sort_values(by, ascending=False, na_position='last', kind='stable')
+    table.insert(0, 'rank', range(1, len(table) + 1))
+    return table.reset_index(drop=True)
+
+
+def _run_lanes(columns, grid, initial_capital, start_date, end_date):
+    summary = summarize_lanes(run_lanes(*columns, initial_capital, grid, start_date=start_date),
+                              initial_capital, start_date, end_date)
+    table = {k: [params[k] for params in grid] for k in SWEEP_PARAMS}
+    for k in RESULT_COLUMNS:
+        if k not in table:
+            table[k] = np.broadcast_to(summary[k], len(grid))
+    return table
+
+
+def run_sweep(data, initial_capital, grid, start_date, end_date, workers=None, chunks_per_worker=4, engine='lanes',
+              rules=None):
+    """Backtest `data` under every parameter set in `grid` and rank by CAGR.
+
+    `data` is an OHLCV frame (with or without the DMA columns) or the arrays of
+    IndicatorStore.window(). `end_date` is exclusive, as in the app. The 'lanes' engine runs the
+    whole grid in one pass; with 'pool' and more than one worker the series go into one shared
+    block and the grid is split into about chunks_per_worker tasks per worker. `rules` is a
+    rules.py rule set for every run; the lanes engine does not know rule sets, so it then runs
+    one run_backtest per set in this process.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown sweep engine: {engine}")
+    columns = series_columns(data)
+    n = len(columns[0])
+    if rules is None:
+        if engine == 'lanes':
+            return rank(_run_lanes(columns, grid, initial_capital, start_date, end_date))
+        chunk = partial(_run_chunk, initial_capital=initial_capital, start_date=start_date, end_date=end_date)
+    else:
+        # Workers get the rule set as its dict; the extra moving averages roll over the window's closes
+        rules = compile_rules(rules)
+        chunk = partial(_run_chunk, initial_capital=initial_capital, start_date=start_date, end_date=end_date,
+                        rules=rules.spec, indicators=rules.indicators(pd.Series(columns[1], index=pd.DatetimeIndex(columns[0]))))
+
+    workers = 1 if engine == 'lanes' else min(workers or os.cpu_count() or 1, len(grid))
+    if workers <= 1 or n == 0:
+        _set_series(*columns)
+        return rank(chunk(grid))
+
+    size = max(1, math.ceil(len(grid) / (workers * chunks_per_worker)))
+    chunks = [grid[i:i + size] for i in range(0, len(grid), size)]
+    shm = SharedMemory(create=True, size=len(SERIES_ROWS) * n * 8)
+    try:
+        block = np.ndarray((len(SERIES_ROWS), n), dtype=np.float64, buffer=shm.buf)
+        block[0].view(np.int64)[:] = columns[0].view(np.int64)
+        block[1:] = columns[1:]
+        del block  # the segment cannot be closed while a view into it exists
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_attach, initargs=(shm.name, n)) as pool:
+            results = pool.map(chunk, chunks)
+            rows = [row for chunk_rows in results for row in chunk_rows]
+    finally:
+        shm.close()
+        shm.unlink()
+    return rank(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('symbol', help='Yahoo symbol to sweep')
+    parser.add_argument('--start', default=str(date.today() - timedelta(days=90)), help='first trading date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=str(date.today()), help='last trading date, inclusive (YYYY-MM-DD)')
+    parser.add_argument('--capital', type=float, default=60000000, help='capital for the symbol')
+    for knob in SWEEP_PARAMS:
+        parser.add_argument('--' + knob.replace('_', '-'), default=str(DEFAULT_PARAMS[knob]),
+                            help=f"value, a,b,c or start:stop:step (default {DEFAULT_PARAMS[knob]})")
+    parser.add_argument('--store', default=os.environ.get("PRICE_STORE_DIR", ".price_store"), help='price store directory')
+    parser.add_argument('--engine', choices=ENGINES, default='lanes', help='one vectorised pass, or a process pool')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes of the 'pool' engine")
+    parser.add_argument('--rules', help='JSON rule set (see rules.py) in place of the built-in strategy')
+    parser.add_argument('--top', type=int, default=20, help='rows to print')
+    parser.add_argument('--out', help='write the full ranked table to this CSV')
+    args = parser.parse_args(argv)
+
+    grid = param_grid({knob: parse_range(getattr(args, knob)) for knob in SWEEP_PARAMS})
+    start_date = pd.Timestamp(args.start)
+    end_date = pd.Timestamp(args.end) + timedelta(days=1)
+    df = PriceStore(args.store).load(args.symbol, start_date - timedelta(days=WARMUP_DAYS), end_date)
+    if df.empty:
+        print(f"No data found for ticker {args.symbol}", file=sys.stderr)
+        return 1
+
+    table = run_sweep(df, args.capital, grid, start_date, end_date, workers=args.workers, engine=args.engine,
+                      rules=args.rules)
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(table.head(args.top).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Deterministic synthetic price universes, for benchmarks and offline runs.
+
+Each symbol gets one fixed daily series on a business-day calendar from CALENDAR_START to
+CALENDAR_END: geometric Brownian motion whose drift and volatility switch between bull, bear and
+sideways regimes of random (geometric) length. The series depends only on the symbol and the
+seed, so any date range of it is reproducible.
+"""
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from price_store import normalize_ohlcv
+
+CALENDAR_START = '2000-01-03'
+CALENDAR_END = '2025-12-31'
+
+# (daily drift, daily volatility) of each regime
+REGIMES = [
+    (0.0008, 0.012),   # bull
+    (-0.0010, 0.025),  # bear
+    (0.0000, 0.008),   # sideways
+]
+MEAN_REGIME_DAYS = 120
+
+
+def universe(n_symbols):
+    return [f"SYN{i:03d}.NS" for i in range(n_symbols)]
+
+
+def gbm_close(n, rng, start_price=100.0, regimes=REGIMES, mean_regime_days=MEAN_REGIME_DAYS):
+    """n closes of regime-switching GBM drawn from `rng`."""
+    regime = np.empty(n, dtype=np.int64)
+    i, current = 0, int(rng.integers(len(regimes)))
+    while i < n:
+        length = int(rng.geometric(1 / mean_regime_days))
+        regime[i:i + length] = current
+        i += length
+        current = (current + int(rng.integers(1, len(regimes)))) % len(regimes)
+    drift, vol = np.array(regimes, dtype=float)[regime].T
+    log_returns = drift - vol ** 2 / 2 + vol * rng.standard_normal(n)
+    return start_price * np.exp(np.cumsum(log_returns))
+
+
+@lru_cache(maxsize=256)
+def synthetic_ohlcv(symbol, seed=0):
+    """The symbol's whole OHLCV series on the fixed calendar (cached and shared: do not modify it)."""
+    rng = np.random.default_rng([zlib.crc32(symbol.encode()), seed])
+    index = pd.bdate_range(CALENDAR_START, CALENDAR_END, name='Date')
+    close = gbm_close(len(index), rng, start_price=float(rng.uniform(20, 2000)))
+    open_ = close * np.exp(rng.normal(0, 0.004, len(index)))
+    spread = np.abs(rng.normal(0, 0.01, len(index)))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(10_000, 5_000_000, len(index)).astype(float),
+    }, index=index)
+
+
+class SyntheticFetcher:
+    """PriceStore fetcher serving synthetic_ohlcv slices instead of Yahoo."""
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.calls = []
+
+    def __call__(self, symbol, start, end):
+        self.calls.append((symbol, start, end))
+        df = synthetic_ohlcv(symbol, self.seed)
+        return normalize_ohlcv(df[(df.index >= start) & (df.index < end)])
@@ -0,0 +1,116 @@
+"""Predefined universe: display name -> Yahoo symbol and its percent of total capital."""
+
+ticker_options = {
+  "Abbott India": {"symbol": "ABBOTINDIA.NS", "percent": 2},
+  "Adani Enterprises": {"symbol": "ADANIENT.NS", "percent": 0.60},
+  "Adani Ports & SEZ": {"symbol": "ADANIPORTS.NS", "percent": 0.57},
+  "Amber Enterprises India Limited": {"symbol": "AMBER.NS", "percent": 3.54},
+  "Angel One Limited": {"symbol": "ANGELONE.NS", "percent": 1.96},
+  "Apar Industries Limited": {"symbol": "APARINDS.NS", "percent": 3.21},
+  "Apollo Hospitals": {"symbol": "APOLLOHOSP.NS", "percent": 1.25},
+  "Ashok Leyland": {"symbol": "ASHOKLEY.NS", "percent": 2},
+  "Asian Paints": {"symbol": "ASIANPAINT.NS", "percent": 1.50},
+  "Axis Bank": {"symbol": "AXISBANK.NS", "percent": 2.25},
+  "Bajaj Auto": {"symbol": "BAJAJ-AUTO.NS", "percent": 1.30},
+  "Bajaj Finance": {"symbol": "BAJFINANCE.NS", "percent": 3.20},
+  "Bharat Dynamics Limited": {"symbol": "BDL.NS", "percent": 2.78},
+  "Bharat Electronics": {"symbol": "BEL.NS", "percent": 4.29},
+  "Bharti Airtel": {"symbol": "BHARTIARTL.NS", "percent": 4.61},
+  "CG Power and Industrial Solutions Limited": {"symbol": "CGPOWER.NS", "percent": 3.97},
+  "Cholamandalam Investment and Finance Company Ltd": {"symbol": "CHOLAFIN.NS", "percent": 3.29},
+  "Cipla": {"symbol": "CIPLA.NS", "percent": 1.30},
+  "Data Patterns": {"symbol": "DATAPATTNS.NS", "percent": 2},
+  "Deepak Fertilisers": {"symbol": "DEEPAKFERT.NS", "percent": 2},
+  "Dixon Technologies (India) Limited": {"symbol": "DIXON.NS", "percent": 2.32},
+  "Eicher Motors": {"symbol": "EICHERMOT.NS", "percent": 2.00},
+  "Godrej Industries": {"symbol": "GODREJIND.NS", "percent": 0.1},
+  "Grasim Industries": {"symbol": "GRASIM.NS", "percent": 1.30},
+  "Gravita": {"symbol": "GRAVITA.NS", "percent": 0.1},
+  "Gujarat Fluorochemicals Limited": {"symbol": "FLUOROCHEM.NS", "percent": 2.19},
+  "HCL Technologies": {"symbol": "HCLTECH.NS", "percent": 1.30},
+  "HDFC Bank": {"symbol": "HDFCBANK.NS", "percent": 13.07},
+  "HDFC Life Insurance": {"symbol": "HDFCLIFE.NS", "percent": 1.10},
+  "Hindustan Aeronautics Limited": {"symbol": "HAL.NS", "percent": 3.10},
+  "Hindustan Unilever": {"symbol": "HINDUNILVR.NS", "percent": 2.70},
+  "ICICI Bank": {"symbol": "ICICIBANK.NS", "percent": 9.00},
+  "Infosys": {"symbol": "INFY.NS", "percent": 4.78},
+  "Inox Wind Limited": {"symbol": "INOXWIND.NS", "percent": 2.35},
+  "ITC": {"symbol": "ITC.NS", "percent": 1.50},
+  "Jio Financial Services": {"symbol": "JIOFIN.NS", "percent": 1.50},
+  "K.P.R. Mill Limited": {"symbol": "KPRMILL.NS", "percent": 0.84},
+  "Kalyan Jewellers India Limited": {"symbol": "KALYANKJIL.NS", "percent": 1.64},
+  "Kaynes Technology India Limited": {"symbol": "KAYNES.NS", "percent": 2.52},
+  "Kirloskar Engines": {"symbol": "KIRLOSENG.NS", "percent": 0.1},
+  "Larsen & Toubro": {"symbol": "LT.NS", "percent": 2.00},
+  "Mahindra & Mahindra": {"symbol": "M&M.NS", "percent": 1.00},
+  "Maruti Suzuki India": {"symbol": "MARUTI.NS", "percent": 1.20},
+  "Max Healthcare": {"symbol": "MAXHEALTH.NS", "percent": 0.4},
+  "Motilal Oswal Midcap": {"symbol": "0P0001BAYU.BO", "percent": 100},
+  "Multi Commodity Exchange of India Limited": {"symbol": "MCX.NS", "percent": 3.45},
+  "Muthoot Finance Limited": {"symbol": "MUTHOOTFIN.NS", "percent": 2.38},
+  "Narayana Hrudayalaya": {"symbol": "NH.NS", "percent": 0.25},
+  "NBCC": {"symbol": "NBCC.NS", "percent": 0.15},
+  "Nestle India": {"symbol": "NESTLEIND.NS", "percent": 1.20},
+  "Neuland Labs": {"symbol": "NEULANDLAB.NS", "percent": 0.01},
+  "Nifty BeES": {"symbol": "^NSEI", "percent": 100},
+  "Nifty Midcap 100": {"symbol": "NIFTY_MIDCAP_100.NS", "percent": 1},
+  "Nifty50 Value 20": {"symbol": "NV20.NS", "percent": 1},
+  "Nifty Pharma": {"symbol": "^CNXPHARMA", "percent": 1},  
+  "NTPC": {"symbol": "NTPC.NS", "percent": 1.20},
+  "Onesource Specialty Pharma Limited": {"symbol": "ONESOURCE.NS", "percent": 2.99},
+  "ONGC": {"symbol": "ONGC.NS", "percent": 1.25},
+  "Parag Parikh Flexi Cap": {"symbol": "0P0000YWL0.BO", "percent": 100},
+  "PB Fintech Limited": {"symbol": "POLICYBZR.NS", "percent": 1.96},
+  "Power Grid Corporation": {"symbol": "POWERGRID.NS", "percent": 1.70},
+  "Premier Energies Limited": {"symbol": "PREMIER.NS", "percent": 2.78},
+  "Premier Explosives": {"symbol": "PREMEXPLN.NS", "percent": 1},
+  "Prestige Estates Projects Limited": {"symbol": "PRESTIGE.NS", "percent": 3.16},
+  "Reliance Industries": {"symbol": "RELIANCE.NS", "percent": 8.39},
+  "Religare Enterprises Limited": {"symbol": "RELIGARE.NS", "percent": 2.10},
+  "Samvardhana Motherson International Limited": {"symbol": "MOTHERSON.NS", "percent": 3.23},
+  "Siemens Energy India Limited": {"symbol": "ENRIN.NS", "percent": 3.71},
+  "Solar Industries": {"symbol": "SOLARINDS.NS", "percent": 1},
+  "State Bank of India": {"symbol": "SBIN.NS", "percent": 2.80},
+  "Sun Pharma": {"symbol": "SUNPHARMA.NS", "percent": 1.80},
+  "Suzlon Energy Limited": {"symbol": "SUZLON.NS", "percent": 3.21},
+  "Tata Consultancy Services": {"symbol": "TCS.NS", "percent": 3.00},
+  "Tata Consumer Products": {"symbol": "TATACONSUM.NS", "percent": 1.20},
+  "Tata Midcap 150 mom 50": {"symbol": "0P0001PTTZ.BO", "percent": 1},
+  "Tata Motors": {"symbol": "TATAMOTORS.NS", "percent": 1.10},
+  "Tata Steel": {"symbol": "TATASTEEL.NS", "percent": 1.25},
+  "Tech Mahindra": {"symbol": "TECHM.NS", "percent": 1.10},
+  "Titan Company": {"symbol": "TITAN.NS", "percent": 1.20},
+  "Trent Limited": {"symbol": "TRENT.NS", "percent": 2.63},
+  "TVS Motor Company Limited": {"symbol": "TVSMOTOR.NS", "percent": 0.54},
+  "UltraTech Cement": {"symbol": "ULTRACEMCO.NS", "percent": 1.40},
+  "V2 Retail Limited": {"symbol": "V2RETAIL.NS", "percent": 2.08},
+  "Waaree Energies Limited": {"symbol": "WAAREEENER.NS", "percent": 4.23},
+  "Wipro": {"symbol": "WIPRO.NS", "percent": 1.50},
+  "Zen Technologies Limited": {"symbol": "ZENTEC.NS", "percent": 2.43},
+  "Coal India Limited": {"symbol": "COALINDIA.NS", "percent": 1},
+  "Kotak Mahindra Bank Limited": {"symbol": "KOTAKBANK.NS", "percent": 1},
+  "Dr. Reddy's Laboratories Limited": {"symbol": "DRREDDY.NS", "percent": 1},
+  "Zydus Lifesciences Limited": {"symbol": "ZYDUSLIFE.NS", "percent": 1},
+  "Indian Energy Exchange Limited": {"symbol": "IEX.NS", "percent": 1},
+  "Balkrishna Industries Limited": {"symbol": "BALKRISIND.NS", "percent": 1},
+  "EID Parry India Limited": {"symbol": "EIDPARRY.NS", "percent": 1},
+  "Central Depository Services (India)": {"symbol": "CDSL.NS", "percent": 1},
+  "ICRA Limited": {"symbol": "ICRA.NS", "percent": 1},
+  "Maharashtra Scooters Limited": {"symbol": "MAHSCOOTER.NS", "percent": 1},
+  "IPCA Laboratories Limited": {"symbol": "IPCALAB.NS", "percent": 1},
+  "Nesco Limited": {"symbol": "NESCO.NS", "percent": 1},
+  "Swaraj Engines Limited": {"symbol": "SWARAJENG.NS", "percent": 1},
+   "Solar Industries": {"symbol": "SOLARINDS.NS", "percent": 1},
+   "Mazagon Dock Shipbuilders": {"symbol": "MAZDOCK.NS", "percent": 1},
+   "Cochin Shipyard Limited": {"symbol": "COCHINSHIP.NS", "percent": 1},
+   "Astra Microwave": {"symbol": "ASTRAMICRO.NS", "percent": 1},
+   "BEML": {"symbol": "BEML.BO", "percent": 1},
+   "Garden Reach": {"symbol": "GRSE.BO", "percent": 1},
+   "MTAR": {"symbol": "MTARTECH.BO", "percent": 1},
+   "DYNAMTEC": {"symbol": "DYNAMATECH.NS", "percent": 1},
+    "Paras Defence and Space Technologies": {"symbol": "PARAS.BO", "percent": 1},
+    "Mishra Dhatu Nigam Limited": {"symbol": "MIDHANI.NS", "percent": 1},
+    "Cyient Dlm Ltd": {"symbol": "CYIENT.BO", "percent": 1},
+    "DCX India": {"symbol": "DCXINDIA.NS", "percent": 1},
+    "UNIMECH": {"symbol": "UNIMECH.BO", "percent": 1}
+}
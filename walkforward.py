@@ -0,0 +1,93 @@
+"""Start-date sensitivity: one backtest per start date in a range, all run together.
+
+    python walkforward.py HDFCBANK.NS --first 2012-01-01 --last 2022-12-31 --every 5
+
+The Muhurut buy and everything after it depend on the first bar, so the strategy is run from
+every (or every Nth) trading date between --first and --last up to the same end date, and the
+spread of CAGR and outperformance over those starts is reported. The bars and indicators are
+loaded once; every start is a lane of lanes.run_lanes, so the runs share the signal masks and
+step through the bars in one pass instead of one backtest each. Each start keeps its own running
+peak over the bars from WARMUP_DAYS before it, as Run Analysis loads them, so a row matches the
+app's backtest from that date.
+"""
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from engine import DEFAULT_PARAMS, WARMUP_DAYS
+from lanes import run_lanes, summarize_lanes
+from price_store import PriceStore
+from sweep import SWEEP_PARAMS, series_columns
+
+RESULT_COLUMNS = ['start_date', 'cagr_pct', 'buy_hold_cagr_pct', 'outperformance_pct', 'trades', 'return_pct', 'final_value']
+DISTRIBUTION_COLUMNS = ['cagr_pct', 'buy_hold_cagr_pct', 'outperformance_pct']
+
+
+def start_dates(dates, first, last, every=1):
+    """Every `every`th trading date of `dates` from `first` to `last`, inclusive."""
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(first)), 'left')
+    hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(last)), 'right')
+    return dates[lo:hi:max(int(every), 1)]
+
+
+def walk_forward(data, initial_capital, params, first, last, end_date, every=1):
+    """Backtest `data` under `params` from each start date between `first` and `last`.
+
+    `data` is an OHLCV frame or IndicatorStore.window() arrays, as for sweep.run_sweep, and
+    must reach back WARMUP_DAYS before `first` for the moving averages. `end_date` is exclusive,
+    as in the app. Returns one row per start date.
+    """
+    columns = series_columns(data)
+    starts = start_dates(columns[0], first, last, every)
+    lanes = run_lanes(*columns, initial_capital, [params] * len(starts), start_date=starts, peak_days=WARMUP_DAYS)
+    summary = summarize_lanes(lanes, initial_capital, starts, end_date)
+    table = pd.DataFrame({k: summary[k] for k in RESULT_COLUMNS if k in summary})
+    table.insert(0, 'start_date', pd.DatetimeIndex(starts))
+    return table[RESULT_COLUMNS]
+
+
+def distribution(table):
+    """Percentiles of CAGR, buy-and-hold CAGR and outperformance over the start dates."""
+    stats = table[DISTRIBUTION_COLUMNS].describe(percentiles=[0.05, 0.25, 0.5, 0.75, 0.95])
+    stats.loc['beats buy & hold'] = [np.nan, np.nan, (table['outperformance_pct'] > 0).mean()]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('symbol', help='Yahoo symbol')
+    parser.add_argument('--first', required=True, help='earliest start date (YYYY-MM-DD)')
+    parser.add_argument('--last', required=True, help='latest start date, inclusive (YYYY-MM-DD)')
+    parser.add_argument('--end', default=str(pd.Timestamp.today().date()), help='last trading date, inclusive (YYYY-MM-DD)')
+    parser.add_argument('--every', type=int, default=1, help='use every Nth trading date as a start')
+    parser.add_argument('--capital', type=float, default=60000000, help='capital for the symbol')
+    for knob in SWEEP_PARAMS:
+        parser.add_argument('--' + knob.replace('_', '-'), type=float, default=DEFAULT_PARAMS[knob],
+                            help=f"default {DEFAULT_PARAMS[knob]}")
+    parser.add_argument('--store', default=os.environ.get("PRICE_STORE_DIR", ".price_store"), help='price store directory')
+    parser.add_argument('--out', help='write one row per start date to this CSV')
+    args = parser.parse_args(argv)
+
+    params = {**DEFAULT_PARAMS, **{knob: getattr(args, knob) for knob in SWEEP_PARAMS}}
+    first = pd.Timestamp(args.first)
+    end_date = pd.Timestamp(args.end) + timedelta(days=1)
+    df = PriceStore(args.store).load(args.symbol, first - timedelta(days=WARMUP_DAYS), end_date)
+    if df.empty:
+        print(f"No data found for ticker {args.symbol}", file=sys.stderr)
+        return 1
+
+    table = walk_forward(df, args.capital, params, first, args.last, end_date, every=args.every)
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(f"{len(table)} start dates")
+    print(distribution(table).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())